@@ -0,0 +1,174 @@
+import threading
+import time
+from collections import deque
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops calling an upstream that is failing or too slow, and probes for recovery.
+
+    Outcomes of the last `window` calls are kept. Once at least `min_calls`
+    are in, the breaker opens when the failure share reaches `error_rate` or
+    the share of calls slower than `slow_call_seconds` reaches `slow_rate`.
+    While open, `allow()` is False and callers go straight to their fallback.
+    After `open_seconds` it turns half-open and lets `half_open_probes` calls
+    through: if they all succeed it closes again, any failure reopens it.
+    A probe that hasn't reported within `probe_timeout` (its caller was
+    cancelled or died) counts as failed, so the breaker can't stay
+    half-open with no probe left to send.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        window: int = 20,
+        min_calls: int = 5,
+        error_rate: float = 0.5,
+        slow_call_seconds: float = None,
+        slow_rate: float = 0.5,
+        open_seconds: float = 30,
+        half_open_probes: int = 1,
+        probe_timeout: float = None,
+        clock=time.monotonic,
+    ):
+        self.name = name
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_rate = slow_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.probe_timeout = open_seconds if probe_timeout is None else probe_timeout
+        self._clock = clock
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.times_opened = 0
+        self.short_circuited = 0
+        self._outcomes = deque(maxlen=window)     # (failed, slow) per call
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go out now. Every allowed call must be recorded."""
+        with self._lock:
+            if (self.state == HALF_OPEN and self._probes_in_flight
+                    and self._clock() - self._probe_started_at >= self.probe_timeout):
+                self._trip()
+            if self.state == OPEN and self._clock() - self.opened_at >= self.open_seconds:
+                self.state = HALF_OPEN
+                self._probes_in_flight = 0
+                self._probe_successes = 0
+
+            if self.state == CLOSED:
+                return True
+            if self.state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                self._probe_started_at = self._clock()
+                return True
+
+            self.short_circuited += 1
+            return False
+
+    def rejects(self) -> bool:
+        """Whether allow() would refuse a call now, without taking a half-open probe.
+
+        For callers whose call another party makes and records, e.g. texts
+        queued for one batched upstream call. A True counts as short-circuited.
+        """
+        with self._lock:
+            if self.state == OPEN and self._clock() - self.opened_at < self.open_seconds:
+                self.short_circuited += 1
+                return True
+            return False
+
+    def record_success(self, seconds: float = 0.0):
+        slow = self.slow_call_seconds is not None and seconds >= self.slow_call_seconds
+        with self._lock:
+            if self.state == HALF_OPEN:
+                # A slow probe is no sign of recovery
+                if slow:
+                    self._trip()
+                    return
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self.state = CLOSED
+                    self._outcomes.clear()
+                return
+            self._outcomes.append((False, slow))
+            self._check()
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append((True, False))
+            self._check()
+
+    def call(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        start = self._clock()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success(self._clock() - start)
+        return result
+
+    async def call_async(self, fn, *args, **kwargs):
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        start = self._clock()
+        try:
+            result = await fn(*args, **kwargs)
+        except BaseException:
+            # Cancelled and timed-out calls count against the upstream too
+            self.record_failure()
+            raise
+        self.record_success(self._clock() - start)
+        return result
+
+    def status(self) -> dict:
+        with self._lock:
+            calls = len(self._outcomes)
+            failures = sum(failed for failed, _ in self._outcomes)
+            slow = sum(is_slow for _, is_slow in self._outcomes)
+            retry_in = None
+            if self.state == OPEN:
+                retry_in = round(max(0.0, self.open_seconds - (self._clock() - self.opened_at)), 1)
+            return {
+                "state": self.state,
+                "window_calls": calls,
+                "error_rate": round(failures / calls, 3) if calls else 0.0,
+                "slow_rate": round(slow / calls, 3) if calls else 0.0,
+                "times_opened": self.times_opened,
+                "short_circuited": self.short_circuited,
+                "retry_in_seconds": retry_in,
+            }
+
+    def _check(self):
+        calls = len(self._outcomes)
+        if calls < self.min_calls:
+            return
+        failures = sum(failed for failed, _ in self._outcomes)
+        slow = sum(is_slow for _, is_slow in self._outcomes)
+        if failures / calls >= self.error_rate or slow / calls >= self.slow_rate:
+            self._trip()
+
+    def _trip(self):
+        self.state = OPEN
+        self.opened_at = self._clock()
+        self.times_opened += 1
+        self._outcomes.clear()
@@ -36,29 +36,143 @@ FEATURE_NAMES =[
 
 #Model Loading 
 BASE_DIR = Path(__file__).resolve().parent.parent
-MODEL_PATH = BASE_DIR / "Models" / "Model_1" / "habit_model.pkl"
+MODELS_DIR = BASE_DIR / "Models"
+MODEL_FILENAME = "habit_model.pkl"
+FLAT_MODEL_DIRNAME = "habit_model.flat"
+MODEL_PATH = MODELS_DIR / "Model_1" / MODEL_FILENAME
+FLAT_MODEL_PATH = MODELS_DIR / "Model_1" / FLAT_MODEL_DIRNAME
+
+#Model Registry: every Models/<version>/ folder is a version. The newest one is active
+#unless pinned, and a candidate can take a slice of traffic
+ACTIVE_MODEL_VERSION = os.getenv("ACTIVE_MODEL_VERSION") or None
+CANDIDATE_MODEL_VERSION = os.getenv("CANDIDATE_MODEL_VERSION") or None
+CANDIDATE_TRAFFIC_PERCENT = float(os.getenv("CANDIDATE_TRAFFIC_PERCENT", "0"))
+MODEL_WATCH_INTERVAL = float(os.getenv("MODEL_WATCH_INTERVAL", "30"))   # seconds, 0 turns hot reload off
+
+#Model Artifact Format: "pickle" unpickles MODEL_PATH, "flat" memory-maps FLAT_MODEL_PATH
+#(build it with `python -m App.flat_forest`; it always runs on the flat engine)
+MODEL_FORMAT = os.getenv("MODEL_FORMAT", "pickle")
+
+#Inference Engine: "sklearn" runs the pickled forest, "flat" runs the compiled array copy
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "sklearn")
+
+#Prediction Cache (size 0 turns it off, TTL in seconds)
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = float(os.getenv("PREDICTION_CACHE_TTL", "3600"))
+
+#Batch Prediction Limit
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
+#Prediction from Completion History: habits per request, the longest history accepted
+#(days from start_date to the first day predicted), and the most days forecast ahead
+MAX_HISTORY_HABITS = int(os.getenv("MAX_HISTORY_HABITS", "10000"))
+MAX_HABIT_DAYS = int(os.getenv("MAX_HABIT_DAYS", "3660"))
+FORECAST_DAYS = 7
 
 #Hugging Face Token and Model Used
 HF_TOKEN = os.getenv("HF_TOKEN")
 HF_MODEL = "cardiffnlp/twitter-roberta-base-sentiment-latest"
-
-if not HF_TOKEN:
-    raise RuntimeError("HF_TOKEN nor fount in .env file")
+HF_INFERENCE_URL = os.getenv("HF_INFERENCE_URL", "https://router.huggingface.co/hf-inference/models")
 
 #Sentiment Setting 
 CONFIDENCE_THRESHOLS = 0.85
 ROBERTA_RETRIES = 3
-RETRY_DELAY = 2
+RETRY_DELAY = 2                 # base backoff in seconds, doubled per retry with jitter
+ROBERTA_TIMEOUT = float(os.getenv("ROBERTA_TIMEOUT", "10"))          # per call, seconds
+ROBERTA_BACKOFF_MAX = float(os.getenv("ROBERTA_BACKOFF_MAX", "8"))
+ROBERTA_CONCURRENCY = int(os.getenv("ROBERTA_CONCURRENCY", "8"))     # in-flight calls per worker
+
+#RoBERTa Micro-Batching: uncertain texts wait up to the window (or until the batch
+#is full) and go out as one classification. A window of 0 turns batching off
+ROBERTA_BATCH_WINDOW_MS = float(os.getenv("ROBERTA_BATCH_WINDOW_MS", "5"))
+ROBERTA_MAX_BATCH = int(os.getenv("ROBERTA_MAX_BATCH", "16"))
+
+#RoBERTa Backend: "hf_api" calls the Hugging Face API, "local" runs the model on CPU
+#from LOCAL_SENTIMENT_MODEL_DIR (see `python -m App.sentiment_backends`)
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "hf_api")
+LOCAL_SENTIMENT_MODEL_DIR = Path(os.getenv("LOCAL_SENTIMENT_MODEL_DIR", BASE_DIR / "Models" / "sentiment_roberta"))
+LOCAL_SENTIMENT_RUNTIME = os.getenv("LOCAL_SENTIMENT_RUNTIME", "auto")     # auto | onnx | torch
+LOCAL_SENTIMENT_THREADS = int(os.getenv("LOCAL_SENTIMENT_THREADS", "1"))
+LOCAL_SENTIMENT_MAX_LENGTH = 512
+
+#Sentiment Cache: results keyed on the normalized text + model/threshold/backend.
+#Size 0 turns it off; SENTIMENT_CACHE_DB adds a SQLite file that survives restarts
+SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "5000"))
+SENTIMENT_CACHE_TTL = float(os.getenv("SENTIMENT_CACHE_TTL", "86400"))
+SENTIMENT_CACHE_DB = os.getenv("SENTIMENT_CACHE_DB") or None
+
+#Circuit Breakers for the Hugging Face and Groq upstreams: over the last CIRCUIT_WINDOW
+#calls, trip when the error rate or the share of slow calls reaches its limit, fail
+#fast for CIRCUIT_OPEN_SECONDS, then let one probe call through
+CIRCUIT_WINDOW = int(os.getenv("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.getenv("CIRCUIT_MIN_CALLS", "5"))
+CIRCUIT_ERROR_RATE = float(os.getenv("CIRCUIT_ERROR_RATE", "0.5"))
+CIRCUIT_SLOW_RATE = float(os.getenv("CIRCUIT_SLOW_RATE", "0.5"))
+CIRCUIT_OPEN_SECONDS = float(os.getenv("CIRCUIT_OPEN_SECONDS", "30"))
+ROBERTA_SLOW_SECONDS = float(os.getenv("ROBERTA_SLOW_SECONDS", "3"))
+GROQ_SLOW_SECONDS = float(os.getenv("GROQ_SLOW_SECONDS", "10"))
+
+#End-to-end Deadlines per route, in seconds; past them the fallback answer is returned
+SENTIMENT_DEADLINE = float(os.getenv("SENTIMENT_DEADLINE", "8"))
+GOAL_DEADLINE = float(os.getenv("GOAL_DEADLINE", "25"))
 
 #Behavioral Pattern Minimum Cnfiguration 
 MIN_DAYS = 14
 THRESHOLD = 0.35
 
+#Time-series Insights: trailing windows checked for recent patterns, and the days a recent
+#pattern must have held
+RECENT_WINDOWS = (14, 30, 90)
+RECENT_STEADY_DAYS = 7
+
+#Bulk Insights: users per request, users per padded chunk, and an optional process
+#pool (INSIGHTS_WORKERS > 0) used once a request has INSIGHTS_POOL_MIN_USERS users
+MAX_BULK_USERS = int(os.getenv("MAX_BULK_USERS", "10000"))
+INSIGHTS_CHUNK_USERS = int(os.getenv("INSIGHTS_CHUNK_USERS", "512"))
+INSIGHTS_WORKERS = int(os.getenv("INSIGHTS_WORKERS", "0"))
+INSIGHTS_POOL_MIN_USERS = int(os.getenv("INSIGHTS_POOL_MIN_USERS", "4096"))
+
+#NDJSON Insights: days parsed per block, and the longest line accepted (one log)
+NDJSON_BLOCK_DAYS = int(os.getenv("NDJSON_BLOCK_DAYS", "1024"))
+NDJSON_MAX_LINE_BYTES = int(os.getenv("NDJSON_MAX_LINE_BYTES", "65536"))
+
 # Groq Configuration
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 GROQ_MODEL = "llama-3.3-70b-versatile"
 GROQ_TEMPERATURE = 0.3
 GROQ_MAX_TOKENS = 1000
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "15"))     # per call, seconds
+#Async client: stream completions and validate the plan as it arrives (0 waits for the whole reply)
+GROQ_STREAM = os.getenv("GROQ_STREAM", "1") == "1"
+GROQ_MAX_CONNECTIONS = int(os.getenv("GROQ_MAX_CONNECTIONS", "20"))          # pooled, per worker
+GROQ_KEEPALIVE_SECONDS = float(os.getenv("GROQ_KEEPALIVE_SECONDS", "60"))
+
+#Goal Plan Cache: exact match on the normalized goal. Opt-in with GOAL_CACHE_SIMILARITY > 0
+#(e.g. 0.75): then the nearest validated plan with the same numbers whose whole-goal and
+#title cosine similarity reach the thresholds. Near-duplicates can still differ in what
+#matters ("learn guitar" / "learn bass guitar"), hence off by default.
+#Size 0 turns it off; GOAL_CACHE_PATH keeps plans in a JSON file across restarts
+GOAL_CACHE_SIZE = int(os.getenv("GOAL_CACHE_SIZE", "1000"))
+GOAL_CACHE_TTL = float(os.getenv("GOAL_CACHE_TTL", str(7 * 24 * 3600)))
+GOAL_CACHE_SIMILARITY = float(os.getenv("GOAL_CACHE_SIMILARITY", "0"))
+GOAL_CACHE_TITLE_SIMILARITY = float(os.getenv("GOAL_CACHE_TITLE_SIMILARITY", "0.8"))
+GOAL_CACHE_PATH = os.getenv("GOAL_CACHE_PATH") or None
+
+#Serving under gunicorn (gunicorn.conf.py): web workers per host (0 sizes them from the
+#CPUs this process may use), and a process pool per worker for the CPU-bound routes
+#(/v1/predict, /v1/insights_weekly); 0 runs them on the threadpool as under plain uvicorn
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "0"))
+CPU_POOL_WORKERS = int(os.getenv("CPU_POOL_WORKERS", "0"))
+
+#Logging: DEBUG adds the per-request sentiment and Groq lines; "json" writes one object per line
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")     # text | json
+
 
-if not GROQ_API_KEY:
-    raise RuntimeError("GROQ_API_KEY not found in .env file")
\ No newline at end of file
+def check_api_keys():
+    """Raise if a key the app needs is missing. Called at startup, not at import,
+    so tools and benchmarks can import the App without any keys."""
+    if not HF_TOKEN and SENTIMENT_BACKEND == "hf_api":
+        raise RuntimeError("HF_TOKEN nor fount in .env file")
+    if not GROQ_API_KEY:
+        raise RuntimeError("GROQ_API_KEY not found in .env file")
\ No newline at end of file
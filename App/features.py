@@ -0,0 +1,161 @@
+"""Habit model features from raw completion history, for all habits of a request at once.
+
+A habit's history is a uint8 array with one entry per day from its
+start_date up to the first day predicted, 1 where the habit was done.
+Histories are concatenated into one flat array: streaks are the run of 1s
+ending each history, found from where the last 0 falls, and the 7- and
+30-day rates are differences of a running sum over the last
+COMPLETION_WINDOW days, right-aligned in a habits x days matrix.
+"""
+from datetime import date
+import numpy as np
+from App.config import FEATURE_NAMES, MAX_HABIT_DAYS
+from App.metrics import stage
+
+FREQUENCIES = {"daily": 0, "weekly": 1, "monthly": 2, "twice_weekly": 3}
+RATE_DAYS = {"completion_rate_7d": 7, "completion_rate_30d": 30}
+COMPLETION_WINDOW = max(RATE_DAYS.values())
+_BITMAP_ERROR = "completions Input should be a string of 0s and 1s"
+
+
+def parse_habit(habit: dict, today: date = None) -> tuple[np.ndarray, int, int, int]:
+    """One habit as (history, start day, first day predicted, frequency_encoded), days as ordinals.
+
+    `completions` has one "0"/"1" per day from start_date; `completed_dates`
+    lists the days the habit was done instead. The first day predicted is
+    `as_of`, else the day after `completions` ends, else today. Days after
+    the bitmap or not in the list count as missed. Raises ValueError naming
+    the first bad field, e.g. "start_date Field required".
+    """
+    start = _parse_day(habit.get("start_date"), "start_date")
+    as_of = habit.get("as_of")
+    end = None if as_of is None else _parse_day(as_of, "as_of")
+
+    frequency = habit.get("frequency", "daily")
+    if not isinstance(frequency, str) or frequency not in FREQUENCIES:
+        raise ValueError(f"frequency Input should be one of {', '.join(FREQUENCIES)}")
+
+    completions, dates = habit.get("completions"), habit.get("completed_dates")
+    if (completions is None) == (dates is None):
+        raise ValueError("Send either completions or completed_dates")
+
+    if completions is not None:
+        if not isinstance(completions, str) or not completions.isascii():
+            raise ValueError(_BITMAP_ERROR)
+        # "0"/"1" become 0/1; anything else wraps around to more than 1
+        bits = np.frombuffer(completions.encode("ascii"), dtype=np.uint8) - ord("0")
+        if (bits > 1).any():
+            raise ValueError(_BITMAP_ERROR)
+        end = start + len(bits) if end is None else end
+        if end < start + len(bits):
+            raise ValueError("as_of Input should not fall within completions")
+    else:
+        if not isinstance(dates, list):
+            raise ValueError("completed_dates Input should be a list of dates")
+        done = np.array([_parse_day(d, f"completed_dates.{i}") for i, d in enumerate(dates)], dtype=np.int64)
+        end = (today or date.today()).toordinal() if end is None else end
+        if done.size and (done.min() < start or done.max() >= end):
+            raise ValueError("completed_dates Input should fall on or after start_date and before as_of")
+
+    if end < start:
+        raise ValueError("as_of Input should be on or after start_date")
+    if end - start > MAX_HABIT_DAYS:
+        raise ValueError(f"start_date Input should be at most {MAX_HABIT_DAYS} days before as_of")
+
+    history = np.zeros(end - start, dtype=np.uint8)
+    if completions is not None:
+        history[:len(bits)] = bits
+    else:
+        history[done - start] = 1
+    return history, start, end, FREQUENCIES[frequency]
+
+
+def _parse_day(value, field: str) -> int:
+    if value is None:
+        raise ValueError(f"{field} Field required")
+    try:
+        return date.fromisoformat(value).toordinal()
+    except (TypeError, ValueError):
+        raise ValueError(f"{field} Input should be a date as YYYY-MM-DD") from None
+
+
+def pack_histories(histories: list) -> tuple[np.ndarray, np.ndarray]:
+    """The last COMPLETION_WINDOW days of every history and the current streak of each.
+
+    Days before a habit's start are 0 in the window; the rates divide by the
+    days the habit existed, so they don't count against it.
+    """
+    lengths = np.fromiter(map(len, histories), dtype=np.int64, count=len(histories))
+    flat = np.concatenate(histories)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+
+    # Streak: days since the last miss before each history's end, or since its start
+    missed = np.flatnonzero(flat == 0)
+    last_missed = np.concatenate(([-1], missed))[np.searchsorted(missed, ends)]
+    streak = ends - np.maximum(last_missed + 1, starts)
+
+    # Window: one gather over the flat array; `offset` counts 0..k-1 within each habit
+    k = np.minimum(lengths, COMPLETION_WINDOW)
+    rows = np.repeat(np.arange(len(histories)), k)
+    offset = np.arange(k.sum()) - np.repeat(np.cumsum(k) - k, k)
+    recent = np.zeros((len(histories), COMPLETION_WINDOW), dtype=np.uint8)
+    recent[rows, COMPLETION_WINDOW - np.repeat(k, k) + offset] = flat[np.repeat(ends - k, k) + offset]
+    return recent, streak
+
+
+def forecast(predictor, histories: list, days: int = 1) -> list:
+    """Features and a prediction for every habit on each of the next `days` days.
+
+    `histories` come from parse_habit. Each day is one forest pass over all
+    habits through predictor.predict_array. From the second day on, every
+    habit's predicted outcome is added to the shared arrays as if it had
+    happened, so streaks and rates carry the forecast forward.
+    Returns per habit a list of {"date", "features", "result"}.
+    """
+    n = len(histories)
+    if n == 0:
+        return []
+
+    with stage("features"):
+        recent, streak = pack_histories([h[0] for h in histories])
+        first = np.fromiter((h[2] for h in histories), dtype=np.int64, count=n)
+        age = first - np.fromiter((h[1] for h in histories), dtype=np.int64, count=n)
+        frequency = np.fromiter((h[3] for h in histories), dtype=np.int64, count=n)
+
+        # done[:, j] = completions on the window's first j days; forecast days extend it
+        done = np.zeros((n, COMPLETION_WINDOW + days), dtype=np.int64)
+        np.cumsum(recent, axis=1, out=done[:, 1:COMPLETION_WINDOW + 1])
+
+    out, first_days = [[] for _ in range(n)], first.tolist()
+    for step in range(days):
+        col = COMPLETION_WINDOW + step
+        weekday = (first + step - 1) % 7       # ordinal 1 (0001-01-01) is a Monday
+        columns = {
+            "day_of_week": weekday,
+            "is_weekend": (weekday >= 5).astype(np.int64),
+            "current_streak": streak,
+            "days_since_start": age,
+            "frequency_encoded": frequency,
+        }
+        for name, window in RATE_DAYS.items():
+            existed = np.minimum(age, window)
+            columns[name] = (done[:, col] - done[:, col - window]) / np.maximum(existed, 1)
+
+        X = np.column_stack([columns[name] for name in FEATURE_NAMES]).astype(np.float64)
+        predictions = predictor.predict_array(X)
+
+        values = zip(*(columns[name].tolist() for name in FEATURE_NAMES))
+        for i, (row, prediction) in enumerate(zip(values, predictions)):
+            out[i].append({
+                "date": date.fromordinal(first_days[i] + step).isoformat(),
+                "features": dict(zip(FEATURE_NAMES, row)),
+                "result": prediction,
+            })
+
+        if step + 1 < days:
+            completed = np.fromiter((p.prediction == "complete" for p in predictions), dtype=np.int64, count=n)
+            done[:, col + 1] = done[:, col] + completed
+            streak = (streak + 1) * completed
+            age = age + 1
+    return out
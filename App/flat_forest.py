@@ -0,0 +1,232 @@
+import hashlib
+import json
+from pathlib import Path
+import numpy as np
+from App.config import FEATURE_NAMES
+
+# Bump when the on-disk layout of a flat artifact changes
+SCHEMA_VERSION = 1
+ARTIFACT_FORMAT = "rhythme-flat-forest"
+ARRAYS = ("feature", "threshold", "left", "right", "value", "roots")
+
+
+class FlatForest:
+    """The habit RandomForest compiled into contiguous node arrays.
+
+    Every tree's nodes live in one set of arrays, with `roots` pointing at
+    each tree's first node. Nodes are renumbered so a node's right child
+    always sits right after its left child, and leaves point at themselves
+    with a +inf threshold, so walking every tree `max_depth` steps always
+    ends on a leaf. Exposes `classes_` and `predict_proba` like the sklearn
+    model, so HabitPredictor can use either.
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, classes, max_depth):
+        self.feature = feature          # intp (n_nodes,)
+        self.threshold = threshold      # float64 (n_nodes,)
+        self.left = left                # intp (n_nodes,)
+        self.right = right              # intp (n_nodes,), always left + 1 on split nodes
+        self.value = value              # float64 (n_classes, n_nodes), class fractions
+        self.roots = roots              # intp (n_trees,)
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf index reached in every tree, shape (n_trees, n_rows)."""
+        # sklearn compares float32 features against float64 thresholds; do the same
+        X = np.asarray(X, dtype=np.float32)
+        if not np.isfinite(X).all():
+            raise ValueError("Input contains NaN or infinity")
+
+        n_rows = len(X)
+        by_feature = X.T.ravel()
+        row = np.arange(n_rows)
+        node = np.repeat(self.roots, n_rows).reshape(self.n_trees, n_rows)
+
+        for _ in range(self.max_depth):
+            go_right = by_feature[self.feature[node] * n_rows + row] > self.threshold[node]
+            node = self.left[node] + go_right
+        return node
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        leaves = self.apply(X)
+        # Add the trees up one after another, then average, like the forest does
+        proba = np.stack([values[leaves].sum(axis=0) for values in self.value], axis=1)
+        return proba / self.n_trees
+
+
+def compile_forest(model) -> FlatForest:
+    """Export a fitted RandomForestClassifier's trees into one FlatForest."""
+    trees = [est.tree_ for est in model.estimators_]
+    n_classes = len(model.classes_)
+    feature, threshold, left, value, roots = [], [], [], [], []
+
+    offset = 0
+    for t in trees:
+        # Breadth-first renumbering that hands out child ids in pairs
+        order, first_child = [0], {}
+        for node in order:
+            if t.children_left[node] != -1:
+                first_child[node] = len(order)
+                order += [t.children_left[node], t.children_right[node]]
+
+        order = np.array(order)
+        own = np.arange(len(order))
+        is_leaf = t.children_left[order] == -1
+
+        roots.append(offset)
+        feature.append(np.where(is_leaf, 0, t.feature[order]))
+        threshold.append(np.where(is_leaf, np.inf, t.threshold[order]))
+        left.append(offset + np.array([first_child.get(n, i) for i, n in enumerate(order)]))
+        # Classifier trees store class fractions per node, which is what
+        # DecisionTreeClassifier.predict_proba returns for a leaf
+        value.append(t.value[order, 0, :n_classes].T)
+
+        offset += len(order)
+
+    left = np.concatenate(left).astype(np.intp)
+    is_leaf = left == np.arange(len(left))
+
+    return FlatForest(
+        feature=np.concatenate(feature).astype(np.intp),
+        threshold=np.concatenate(threshold).astype(np.float64),
+        left=left,
+        right=np.where(is_leaf, left, left + 1),
+        value=np.ascontiguousarray(np.concatenate(value, axis=1), dtype=np.float64),
+        roots=np.array(roots, dtype=np.intp),
+        classes=np.asarray(model.classes_),
+        max_depth=max(t.max_depth for t in trees),
+    )
+
+
+def save_flat_forest(forest: FlatForest, path: Path, source: str = None):
+    """Write a forest as one .npy per array plus a manifest with checksums."""
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    arrays = {}
+    for name in ARRAYS:
+        array = getattr(forest, name)
+        # Fixed-width dtypes so an artifact reads the same on any platform
+        array = array.astype(np.int64 if array.dtype.kind == "i" else np.float64)
+        np.save(path / f"{name}.npy", array)
+        arrays[name] = {
+            "file": f"{name}.npy",
+            "dtype": str(array.dtype),
+            "shape": list(array.shape),
+            "sha256": file_sha256(path / f"{name}.npy"),
+        }
+
+    manifest = {
+        "format": ARTIFACT_FORMAT,
+        "schema_version": SCHEMA_VERSION,
+        "feature_names": FEATURE_NAMES,
+        "classes": forest.classes_.tolist(),
+        "max_depth": forest.max_depth,
+        "source": source,
+        "arrays": arrays,
+    }
+    (path / "manifest.json").write_text(json.dumps(manifest, indent=2))
+
+
+def load_flat_forest(path: Path, mmap: bool = True, verify: bool = True) -> FlatForest:
+    """Read a flat artifact, memory-mapped read-only by default.
+
+    Memory-mapped arrays live in the OS page cache, so every worker on the
+    host shares one copy instead of unpickling its own.
+    """
+    path = Path(path)
+    manifest = json.loads((path / "manifest.json").read_text())
+
+    if manifest.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a flat forest artifact")
+    if manifest.get("schema_version") != SCHEMA_VERSION:
+        raise ValueError(
+            f"Flat artifact schema {manifest.get('schema_version')} is not supported (expected {SCHEMA_VERSION})"
+        )
+    if manifest["feature_names"] != FEATURE_NAMES:
+        raise ValueError(f"Artifact features {manifest['feature_names']} do not match FEATURE_NAMES")
+
+    arrays = {}
+    for name in ARRAYS:
+        entry = manifest["arrays"][name]
+        file = path / entry["file"]
+        if verify and file_sha256(file) != entry["sha256"]:
+            raise ValueError(f"Checksum mismatch for {file}")
+        array = np.load(file, mmap_mode="r" if mmap else None, allow_pickle=False)
+        if list(array.shape) != entry["shape"]:
+            raise ValueError(f"Shape mismatch for {file}")
+        # Plain ndarray view over the mapping; the memmap subclass slows indexing
+        arrays[name] = array.view(np.ndarray)
+
+    return FlatForest(
+        classes=np.array(manifest["classes"]),
+        max_depth=manifest["max_depth"],
+        **arrays,
+    )
+
+
+def file_sha256(file: Path) -> str:
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def random_feature_rows(n_rows: int, forest: FlatForest = None, seed: int = 0) -> np.ndarray:
+    """Random habit feature rows in FEATURE_NAMES order.
+
+    When a forest is given, half the rows are snapped onto its split
+    thresholds so the `<=` boundary is exercised too.
+    """
+    rng = np.random.default_rng(seed)
+    day = rng.integers(0, 7, n_rows)
+    X = np.column_stack([
+        day,
+        (day >= 5).astype(np.int64),
+        rng.integers(0, 100, n_rows),
+        rng.random(n_rows),
+        rng.random(n_rows),
+        rng.integers(0, 400, n_rows),
+        rng.integers(0, 4, n_rows),
+    ]).astype(np.float64)
+
+    if forest is not None:
+        split = forest.left != np.arange(len(forest.left))
+        for j in range(len(FEATURE_NAMES)):
+            splits = forest.threshold[split & (forest.feature == j)]
+            if len(splits):
+                snap = rng.random(n_rows) < 0.5
+                X[snap, j] = rng.choice(splits, snap.sum())
+    return X
+
+
+def check_parity(model, forest: FlatForest, n_rows: int = 2000, seed: int = 0) -> float:
+    """Largest absolute predict_proba gap between the forest and its flat copy."""
+    X = random_feature_rows(n_rows, forest, seed)
+    return float(np.max(np.abs(model.predict_proba(X) - forest.predict_proba(X))))
+
+
+if __name__ == "__main__":
+    # python -m App.flat_forest [version]: compile Models/<version>/habit_model.pkl
+    # into Models/<version>/habit_model.flat (Model_1 by default)
+    import sys
+    from App.config import MODELS_DIR, MODEL_FILENAME, FLAT_MODEL_DIRNAME
+    from App.model import HabitPredictor
+
+    version_dir = MODELS_DIR / (sys.argv[1] if len(sys.argv) > 1 else "Model_1")
+    predictor = HabitPredictor(engine="sklearn", model_format="pickle", model_path=version_dir / MODEL_FILENAME)
+    predictor.load_model()
+
+    forest = compile_forest(predictor.model)
+    gap = check_parity(predictor.model, forest)
+    if gap > 1e-9:
+        raise SystemExit(f"Compiled forest disagrees with the model (max gap {gap:.2e})")
+
+    save_flat_forest(forest, version_dir / FLAT_MODEL_DIRNAME, source=MODEL_FILENAME)
+    print(f"Flat forest written to {version_dir / FLAT_MODEL_DIRNAME} ({forest.n_trees} trees, {len(forest.feature)} nodes)")
@@ -0,0 +1,271 @@
+import copy
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+from App.log import get_logger
+
+logger = get_logger(__name__)
+
+# Hashed feature space for the similarity tier; goal texts are a few dozen words
+DIM = 1 << 10
+STOPWORDS = {
+    "a", "an", "and", "the", "to", "of", "for", "in", "on", "my", "i", "be",
+    "want", "would", "like", "get", "how", "with", "at", "is", "it", "me",
+}
+
+
+class GoalPlanCache:
+    """Validated goal plans keyed on the normalized goal text.
+
+    Exact tier: a SHA-256 of the normalized title and description.
+    Similarity tier (off unless `similarity` > 0): every entry also keeps
+    hashed word and character trigram vectors of its title and of the
+    whole goal. A miss on the exact key reuses the nearest plan whose
+    whole-goal cosine reaches `similarity`, whose title cosine reaches
+    `title_similarity` and whose numbers are the same, so "Learn to play
+    the guitar" can reuse "learn guitar" while "learn spanish" and
+    "Save 10000" (for "Save 1000") can't. Entries are kept in LRU order
+    with a TTL. With a `path`, inserts are written to that JSON file by a
+    timer thread at most every `save_delay` seconds, and by flush().
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float = None,
+        similarity: float = 0.0,
+        title_similarity: float = 0.8,
+        path: Path = None,
+        save_delay: float = 1.0,
+        clock=time.time,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.similarity = similarity
+        self.title_similarity = title_similarity
+        self.path = Path(path) if path else None
+        self.save_delay = save_delay
+        self._clock = clock     # wall clock: expiry times are persisted
+
+        self._entries = OrderedDict()       # key -> {"slot", "title", "description", "numbers", "plan", "expires_at"}
+        self._free = list(range(max(maxsize, 0)))[::-1]
+        self._full = np.zeros((max(maxsize, 0), DIM), dtype=np.float32)
+        self._titles = np.zeros((max(maxsize, 0), DIM), dtype=np.float32)
+        self._expires = np.full(max(maxsize, 0), -np.inf)   # -inf marks a free slot
+        self._slot_keys = [None] * max(maxsize, 0)
+        self._lock = threading.Lock()
+        self._save_timer = None
+        self._save_lock = threading.Lock()     # one write at a time, and flush() waits for it
+
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # A disabled cache leaves a file written with a bigger GOAL_CACHE_SIZE alone
+        if self.enabled and self.path is not None and self.path.exists():
+            self.load()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def get(self, goal_title: str, goal_description: str = ""):
+        if not self.enabled:
+            return None
+        title, description = normalize(goal_title), normalize(goal_description)
+        key = _key(title, description)
+        now = self._clock()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] is not None and entry["expires_at"] <= now:
+                self._drop(key)
+                self.expirations += 1
+                entry = None
+
+            if entry is None and self.similarity > 0:
+                entry = self._nearest(title, description, now)
+                if entry is not None:
+                    self.similar_hits += 1
+            elif entry is not None:
+                self.exact_hits += 1
+
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(_key(entry["title"], entry["description"]))
+            return copy.deepcopy(entry["plan"])
+
+    def set(self, goal_title: str, goal_description: str, plan: dict):
+        """Store a plan. Only call this with plans that passed validate()."""
+        if not self.enabled or plan.get("fallback_used"):
+            return
+        expires_at = self._clock() + self.ttl if self.ttl else None
+        with self._lock:
+            self._insert(normalize(goal_title), normalize(goal_description), copy.deepcopy(plan), expires_at)
+            self._schedule_save()
+
+    def load(self):
+        """Read entries persisted at `path`, skipping expired ones.
+
+        A truncated or corrupt file is logged and the cache starts empty; the
+        next insert overwrites it.
+        """
+        now = self._clock()
+        try:
+            items = [
+                (item["title"], item["description"], item["plan"], item["expires_at"])
+                for item in json.loads(self.path.read_text()).get("entries", [])
+                if item["expires_at"] is None or item["expires_at"] > now
+            ]
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.warning("Goal plan cache: can't read %s, starting empty: %r", self.path, e)
+            return
+        with self._lock:
+            for title, description, plan, expires_at in items:
+                self._insert(title, description, plan, expires_at)
+        logger.info("Goal plan cache: %d plans loaded from %s", len(self._entries), self.path)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._schedule_save()
+
+    def flush(self):
+        """Write any inserts not saved yet to `path` now. Called by the save timer and on shutdown."""
+        with self._save_lock:
+            with self._lock:
+                timer, self._save_timer = self._save_timer, None
+                if timer is None:
+                    return
+                timer.cancel()
+                entries = [
+                    {k: e[k] for k in ("title", "description", "plan", "expires_at")}
+                    for e in self._entries.values()
+                ]
+            self._save(entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        hits = self.exact_hits + self.similar_hits
+        lookups = hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "similarity": self.similarity,
+            "title_similarity": self.title_similarity,
+            "exact_hits": self.exact_hits,
+            "similar_hits": self.similar_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            # Every hit is a Groq call that did not happen
+            "llm_calls_saved": hits,
+            "path": str(self.path) if self.path else None,
+        }
+
+    def _nearest(self, title: str, description: str, now: float):
+        live = self._expires > now
+        if not live.any():
+            return None
+        full = self._full @ embed(f"{title} {description}")
+        titles = self._titles @ embed(title)
+        ok = live & (full >= self.similarity) & (titles >= self.title_similarity)
+        # Trigrams put "1000" close to "10000"; a plan for a different amount is a different plan
+        numbers = _numbers(f"{title} {description}")
+        for slot in np.flatnonzero(ok)[np.argsort(-full[ok], kind="stable")]:
+            entry = self._entries[self._slot_keys[slot]]
+            if entry["numbers"] == numbers:
+                return entry
+        return None
+
+    def _insert(self, title: str, description: str, plan: dict, expires_at):
+        if not self.enabled:
+            return
+        key = _key(title, description)
+        if key in self._entries:
+            self._drop(key)
+        while len(self._entries) >= self.maxsize:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+
+        slot = self._free.pop()
+        self._full[slot] = embed(f"{title} {description}")
+        self._titles[slot] = embed(title)
+        self._expires[slot] = np.inf if expires_at is None else expires_at
+        self._slot_keys[slot] = key
+        self._entries[key] = {
+            "slot": slot, "title": title, "description": description,
+            "numbers": _numbers(f"{title} {description}"), "plan": plan, "expires_at": expires_at,
+        }
+
+    def _drop(self, key: str):
+        entry = self._entries.pop(key)
+        self._expires[entry["slot"]] = -np.inf
+        self._free.append(entry["slot"])
+
+    def _schedule_save(self):
+        # Called under self._lock. A burst of inserts becomes one write, made off the
+        # caller's thread: the async goal route calls set() on the event loop
+        if self.path is None or self._save_timer is not None:
+            return
+        self._save_timer = threading.Timer(self.save_delay, self.flush)
+        self._save_timer.daemon = True
+        self._save_timer.start()
+
+    def _save(self, entries: list):
+        # Write then rename, so a crash never leaves half a file behind. The tmp name is
+        # per process: gunicorn workers share `path` and would otherwise clobber each other's
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps({"entries": entries}))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning("Goal plan cache: can't write %s: %r", self.path, e)
+
+
+def normalize(text: str) -> str:
+    # Goals differ in case and punctuation far more than in meaning
+    return " ".join(re.findall(r"\w+", (text or "").lower()))
+
+
+def embed(text: str) -> np.ndarray:
+    """L2-normalized hashed bag of words and character trigrams (stopwords left out)."""
+    vector = np.zeros(DIM, dtype=np.float32)
+    for word in text.split():
+        if word in STOPWORDS:
+            continue
+        vector[_bucket(word)] += 1.0
+        padded = f"#{word}#"
+        for i in range(len(padded) - 2):
+            vector[_bucket(padded[i:i + 3])] += 0.5
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def _numbers(text: str) -> tuple:
+    # Every word with a digit in it ("12", "5k", "2024"), in order; normalize() has split them out
+    return tuple(word for word in text.split() if any(c.isdigit() for c in word))
+
+
+def _bucket(feature: str) -> int:
+    # Stable across processes, unlike hash(), so persisted entries embed the same way
+    return int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=4).digest(), "little") % DIM
+
+
+def _key(title: str, description: str) -> str:
+    return hashlib.sha256(f"{title}\0{description}".encode()).hexdigest()
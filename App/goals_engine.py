@@ -1,11 +1,88 @@
+import asyncio
 import json
-from groq import Groq
-from App.config import GROQ_API_KEY, GROQ_MODEL, GROQ_TEMPERATURE, GROQ_MAX_TOKENS
+import time
+from collections import deque
+from App.config import (
+    GROQ_API_KEY, GROQ_MODEL, GROQ_TEMPERATURE, GROQ_MAX_TOKENS, GROQ_TIMEOUT, GOAL_DEADLINE,
+    GROQ_STREAM, GROQ_MAX_CONNECTIONS, GROQ_KEEPALIVE_SECONDS,
+    GOAL_CACHE_SIZE, GOAL_CACHE_TTL, GOAL_CACHE_SIMILARITY, GOAL_CACHE_TITLE_SIMILARITY, GOAL_CACHE_PATH,
+    CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_ERROR_RATE, CIRCUIT_SLOW_RATE,
+    CIRCUIT_OPEN_SECONDS, GROQ_SLOW_SECONDS
+)
+from App.circuit_breaker import CircuitBreaker, CircuitOpenError
+from App.goal_cache import GoalPlanCache
+from App.log import get_logger
+from App.metrics import stage, STAGE_SECONDS, GROQ_ATTEMPTS, GROQ_RETRIES, GOAL_PLANS
 
-client = Groq(api_key=GROQ_API_KEY)
+logger = get_logger(__name__)
+
+#Groq clients, built by get_client() / get_async_client() on first use: the
+#groq and httpx imports and the TLS setup are most of this module's import time
+_client = None
+_async_client = None
+
+#Repeated and near-duplicate goals reuse a validated plan instead of calling Groq
+plan_cache = GoalPlanCache(
+    GOAL_CACHE_SIZE,
+    ttl=GOAL_CACHE_TTL,
+    similarity=GOAL_CACHE_SIMILARITY,
+    title_similarity=GOAL_CACHE_TITLE_SIMILARITY,
+    path=GOAL_CACHE_PATH
+)
+
+#Fails fast to FALLBACK while Groq is erroring or slow
+groq_breaker = CircuitBreaker(
+    "groq",
+    window=CIRCUIT_WINDOW,
+    min_calls=CIRCUIT_MIN_CALLS,
+    error_rate=CIRCUIT_ERROR_RATE,
+    slow_call_seconds=GROQ_SLOW_SECONDS,
+    slow_rate=CIRCUIT_SLOW_RATE,
+    open_seconds=CIRCUIT_OPEN_SECONDS,
+    probe_timeout=GOAL_DEADLINE
+)
+
+def get_client():
+    global _client
+    if _client is None:
+        from groq import Groq
+        # generate_goal_plan does its own retry; the SDK's hidden ones would hide failures from the breaker
+        _client = Groq(api_key=GROQ_API_KEY, max_retries=0)
+    return _client
+
+def get_async_client():
+    global _async_client
+    if _async_client is None:
+        import httpx
+        from groq import AsyncGroq, DefaultAsyncHttpxClient
+        # Keep-alive pool shared by every request in the worker, so attempts skip the TLS handshake
+        _async_client = AsyncGroq(
+            api_key=GROQ_API_KEY,
+            max_retries=0,
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=GROQ_MAX_CONNECTIONS,
+                    max_keepalive_connections=GROQ_MAX_CONNECTIONS,
+                    keepalive_expiry=GROQ_KEEPALIVE_SECONDS
+                )
+            )
+        )
+    return _async_client
+
+async def close_clients():
+    global _client, _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
+    if _client is not None:
+        _client.close()
+        _client = None
 
 VALID_FREQUENCIES = {"daily", "2x per week", "3x per week", "once per week"}
 
+# Allowed number of tasks / habits after clean()
+PLAN_LIMITS = {"tasks": (3, 5), "habits": (2, 4)}
+
 SYSTEM_PROMPT = """You are a goal structuring engine. Convert the user's goal into tasks and habits.
 
 RULES:
@@ -94,9 +171,11 @@ def validate(data: dict) -> bool:
     tasks = data.get("tasks", [])
     habits = data.get("habits", [])
 
-    if not (3 <= len(tasks) <= 5):
+    low, high = PLAN_LIMITS["tasks"]
+    if not (low <= len(tasks) <= high):
         return False
-    if not (2 <= len(habits) <= 4):
+    low, high = PLAN_LIMITS["habits"]
+    if not (low <= len(habits) <= high):
         return False
     for habit in habits:
         if habit.get("frequency") not in VALID_FREQUENCIES:
@@ -117,29 +196,55 @@ def clean(data: dict) -> dict:
     return data
 
 
-def call_groq(goal_title: str, goal_description: str) -> dict | None:
+def call_groq(goal_title: str, goal_description: str, timeout: float = GROQ_TIMEOUT) -> dict | None:
     user_prompt = f"goal_title: {goal_title}\ngoal_description: {goal_description}"
 
     try:
-        response = client.chat.completions.create(
-            model=GROQ_MODEL,
-            temperature=GROQ_TEMPERATURE,
-            max_tokens=GROQ_MAX_TOKENS,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ]
-        )
+        with stage("groq_attempt"):
+            response = groq_breaker.call(
+                get_client().chat.completions.create,
+                timeout=timeout,
+                model=GROQ_MODEL,
+                temperature=GROQ_TEMPERATURE,
+                max_tokens=GROQ_MAX_TOKENS,
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt}
+                ]
+            )
         raw = response.choices[0].message.content
-        return json.loads(raw)
-    except Exception:
+        data = json.loads(raw)
+        GROQ_ATTEMPTS.inc("ok")
+        return data
+    except CircuitOpenError:
+        raise
+    except ValueError:
+        GROQ_ATTEMPTS.inc("invalid_json")
+        return None
+    except Exception as e:
+        GROQ_ATTEMPTS.inc("error")
+        logger.warning("Groq call failed: %r", e)
         return None
 
 
 def generate_goal_plan(goal_title: str, goal_description: str) -> dict:
-    for _ in range(2):
-        data = call_groq(goal_title, goal_description)
+    cached = plan_cache.get(goal_title, goal_description)
+    if cached is not None:
+        GOAL_PLANS.inc("cache")
+        return cached
+
+    deadline = time.monotonic() + GOAL_DEADLINE
+    for attempt in range(1, 3):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        if attempt > 1:
+            GROQ_RETRIES.inc()
+        try:
+            data = call_groq(goal_title, goal_description, timeout=min(GROQ_TIMEOUT, remaining))
+        except CircuitOpenError:
+            break
 
         if data is None:
             continue
@@ -149,6 +254,258 @@ def generate_goal_plan(goal_title: str, goal_description: str) -> dict:
         if validate(data):
             data["generated"] = True
             data["fallback_used"] = False
+            plan_cache.set(goal_title, goal_description, data)
+            GOAL_PLANS.inc("generated")
             return data
 
-    return FALLBACK
\ No newline at end of file
+    GOAL_PLANS.inc("fallback")
+    return FALLBACK
+
+
+class PlanRejected(ValueError):
+    """The streamed plan can already be seen to fail validate()."""
+
+
+class PlanStreamParser:
+    """Incremental JSON scanner for a goal plan arriving in chunks.
+
+    Every task or habit object is parsed as soon as its closing brace
+    arrives and checked against what validate() will require after clean(),
+    so a plan that cannot pass (a sixth task, a bad frequency, too few
+    habits) is rejected mid-stream. Text before the first "{" is skipped,
+    and `complete` turns True once the top-level object closes.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.complete = False
+        self.counts = {key: 0 for key in PLAN_LIMITS}
+        self._pos = 0
+        self._start = None          # index of the top-level "{"
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._last_string = None    # most recent string at the top level, the key once ":" follows
+        self._key = None
+        self._item_start = None
+
+    def feed(self, chunk: str):
+        if self.complete:
+            return
+        self.text += chunk
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        self._last_string = text[self._string_start + 1:i]
+                continue
+
+            if self._start is None:
+                if ch == "{":
+                    self._start = i
+                    self._stack.append(ch)
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                self._string_start = i
+            elif ch == ":" and len(self._stack) == 1:
+                self._key = self._last_string
+            elif ch in "{[":
+                self._stack.append(ch)
+                if ch == "{" and self._stack[1:] == ["[", "{"]:
+                    self._item_start = i
+            elif ch in "}]":
+                if not self._stack or self._stack.pop() != ("{" if ch == "}" else "["):
+                    raise PlanRejected("unbalanced JSON")
+                if ch == "}" and len(self._stack) == 2 and self._item_start is not None:
+                    self._check_item(json.loads(text[self._item_start:i + 1]))
+                    self._item_start = None
+                elif ch == "]" and len(self._stack) == 1:
+                    self._check_count(self._key)
+                elif not self._stack:
+                    # Whatever follows the object is not part of the plan
+                    self.text = text[:i + 1]
+                    self.complete = True
+                    break
+        self._pos = len(self.text)
+
+    def result(self) -> dict:
+        if self._start is None:
+            raise ValueError("No JSON object in the response")
+        return json.loads(self.text[self._start:])
+
+    def _check_item(self, item):
+        key = self._key
+        if key not in PLAN_LIMITS or not isinstance(item, dict):
+            return
+        title = item.get("title", "")
+        # clean() drops these, so they don't count either way
+        if not isinstance(title, str) or len(title.split()) < 3:
+            return
+        self.counts[key] += 1
+        if key == "habits" and item.get("frequency") not in VALID_FREQUENCIES:
+            raise PlanRejected(f"habit frequency {item.get('frequency')!r}")
+        if self.counts[key] > PLAN_LIMITS[key][1]:
+            raise PlanRejected(f"more than {PLAN_LIMITS[key][1]} {key}")
+
+    def _check_count(self, key):
+        if key in PLAN_LIMITS and self.counts[key] < PLAN_LIMITS[key][0]:
+            raise PlanRejected(f"only {self.counts[key]} usable {key}")
+
+
+class AttemptMetrics:
+    """Timings of recent Groq attempts: time to first token and total, by outcome."""
+
+    def __init__(self, keep: int = 200):
+        self.recent = deque(maxlen=keep)
+        self.outcomes = {}
+
+    def record(self, outcome: str, first_token_seconds: float, total_seconds: float):
+        self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+        self.recent.append({
+            "outcome": outcome,
+            "ttfb_ms": round(first_token_seconds * 1000, 1) if first_token_seconds is not None else None,
+            "total_ms": round(total_seconds * 1000, 1),
+        })
+
+    def stats(self) -> dict:
+        return {
+            "attempts": sum(self.outcomes.values()),
+            "outcomes": dict(self.outcomes),
+            "ttfb_ms": _summary([a["ttfb_ms"] for a in self.recent if a["ttfb_ms"] is not None]),
+            "total_ms": _summary([a["total_ms"] for a in self.recent]),
+            "last": list(self.recent)[-5:],
+        }
+
+
+def _summary(values: list) -> dict:
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    values = sorted(values)
+    return {
+        "p50": values[len(values) // 2],
+        "p95": values[min(len(values) - 1, int(len(values) * 0.95))],
+        "max": values[-1],
+    }
+
+
+# Global instance
+groq_metrics = AttemptMetrics()
+
+
+async def generate_goal_plan_async(goal_title: str, goal_description: str, stream: bool = GROQ_STREAM) -> dict:
+    """Same contract as generate_goal_plan, streamed on the pooled async client."""
+    cached = plan_cache.get(goal_title, goal_description)
+    if cached is not None:
+        GOAL_PLANS.inc("cache")
+        return cached
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + GOAL_DEADLINE
+    for attempt in range(1, 3):
+        remaining = deadline - loop.time()
+        if remaining <= 0 or not groq_breaker.allow():
+            break
+        if attempt > 1:
+            GROQ_RETRIES.inc()
+
+        data = await _attempt_async(goal_title, goal_description, min(GROQ_TIMEOUT, remaining), attempt, stream)
+        if data is not None:
+            data["generated"] = True
+            data["fallback_used"] = False
+            plan_cache.set(goal_title, goal_description, data)
+            GOAL_PLANS.inc("generated")
+            return data
+
+    GOAL_PLANS.inc("fallback")
+    return FALLBACK
+
+
+async def _attempt_async(goal_title: str, goal_description: str, timeout: float, attempt: int, stream: bool):
+    """One Groq call, already let through by the breaker. Returns a validated plan or None."""
+    user_prompt = f"goal_title: {goal_title}\ngoal_description: {goal_description}"
+    start = time.perf_counter()
+    first_token = [None]
+    data, outcome = None, "ok"
+
+    try:
+        data = await asyncio.wait_for(_read_plan(user_prompt, start, first_token, stream), timeout=timeout)
+        groq_breaker.record_success(time.perf_counter() - start)
+    except PlanRejected as e:
+        # Groq answered fine, the plan just can't pass
+        groq_breaker.record_success(time.perf_counter() - start)
+        outcome = "rejected_early"
+        logger.info("Groq attempt %d rejected mid-stream: %s", attempt, e)
+    except ValueError:
+        groq_breaker.record_success(time.perf_counter() - start)
+        outcome = "invalid_json"
+    except asyncio.TimeoutError:
+        groq_breaker.record_failure()
+        outcome = "timeout"
+    except asyncio.CancelledError:
+        # As in CircuitBreaker.call_async: an allowed call must be recorded, or a
+        # cancelled half-open probe would hold the only probe slot
+        groq_breaker.record_failure()
+        raise
+    except Exception as e:
+        groq_breaker.record_failure()
+        outcome = "error"
+        logger.warning("Groq attempt %d failed: %r", attempt, e)
+
+    if data is not None:
+        data = clean(data)
+        if not validate(data):
+            data, outcome = None, "invalid"
+
+    total = time.perf_counter() - start
+    groq_metrics.record(outcome, first_token[0], total)
+    GROQ_ATTEMPTS.inc(outcome)
+    STAGE_SECONDS.observe(total, "groq_attempt")
+    logger.debug(
+        "Groq attempt %d: %s", attempt, outcome,
+        extra={"first_token_ms": None if first_token[0] is None else round(first_token[0] * 1000), "total_ms": round(total * 1000)},
+    )
+    return data
+
+
+async def _read_plan(user_prompt: str, start: float, first_token: list, stream: bool) -> dict:
+    parser = PlanStreamParser()
+    request = dict(
+        model=GROQ_MODEL,
+        temperature=GROQ_TEMPERATURE,
+        max_tokens=GROQ_MAX_TOKENS,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+    )
+
+    if not stream:
+        response = await get_async_client().chat.completions.create(response_format={"type": "json_object"}, **request)
+        first_token[0] = time.perf_counter() - start
+        parser.feed(response.choices[0].message.content)
+        return parser.result()
+
+    # JSON mode can't be streamed; the prompt already asks for a bare object and
+    # the parser skips anything around it
+    response = await get_async_client().chat.completions.create(stream=True, **request)
+    async with response:
+        async for chunk in response:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            if first_token[0] is None:
+                first_token[0] = time.perf_counter() - start
+            parser.feed(delta)
+            if parser.complete:
+                break
+    return parser.result()
@@ -1,6 +1,19 @@
-from scipy import stats 
-from typing import Optional
-from App.config import MIN_DAYS, THRESHOLD
+import asyncio
+import base64
+import binascii
+import json
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import date
+import numpy as np
+from App.config import (
+    MIN_DAYS, THRESHOLD, INSIGHTS_CHUNK_USERS, INSIGHTS_WORKERS, INSIGHTS_POOL_MIN_USERS,
+    NDJSON_BLOCK_DAYS, NDJSON_MAX_LINE_BYTES, RECENT_WINDOWS, RECENT_STEADY_DAYS
+)
+from App.log import get_logger
+from App.metrics import stage
 
 
 TEMPLATES = {
@@ -22,59 +35,619 @@ TEMPLATES = {
     ("sentiment_confidence", "tasks_done", "negative"):  "Lower journal confidence often lines up with fewer tasks completed.",
     ("sentiment_confidence", "focus_mins", "positive"):  "You seem to focus longer on days your journal tone is more certain.",
     ("sentiment_confidence", "focus_mins", "negative"):  "Lower confidence in your journal tone tends to shorten focus sessions.",
+
+    # Lag-1: the first signal on one day against the second on the next day
+    ("journaled", "next_day_mood", "positive"):          "Your mood tends to be better the day after you journal.",
+    ("journaled", "next_day_mood", "negative"):          "Your mood tends to dip the day after you journal.",
+    ("journaled", "next_day_focus_mins", "positive"):    "Journaling today tends to mean more focus tomorrow.",
+    ("journaled", "next_day_focus_mins", "negative"):    "You tend to focus less the day after you journal.",
+    ("journaled", "next_day_tasks_done", "positive"):    "You tend to get more done the day after you journal.",
+    ("journaled", "next_day_tasks_done", "negative"):    "You tend to get less done the day after you journal.",
+    ("mood", "next_day_tasks_done", "positive"):         "A good mood today tends to mean more tasks done tomorrow.",
+    ("mood", "next_day_tasks_done", "negative"):         "You tend to get less done the day after a high mood day.",
+    ("mood", "next_day_focus_mins", "positive"):         "A good mood today tends to mean longer focus tomorrow.",
+    ("mood", "next_day_focus_mins", "negative"):         "High mood days tend to be followed by shorter focus sessions.",
+    ("focus_mins", "next_day_mood", "positive"):         "Long focus days tend to be followed by better moods.",
+    ("focus_mins", "next_day_mood", "negative"):         "Long focus days tend to be followed by lower moods.",
+    ("tasks_done", "next_day_mood", "positive"):         "Getting a lot done tends to lift your mood the next day.",
+    ("tasks_done", "next_day_mood", "negative"):         "Busy days tend to be followed by lower moods.",
 }
 
 
+# Columns of the packed log array; sentiment_confidence is missing on days without a journal
+COLUMNS = ("journaled", "tasks_done", "mood", "focus_mins", "sentiment_confidence")
+COL = {name: i for i, name in enumerate(COLUMNS)}
+
+# Pairs checked for insights, in the order they are ranked on ties. journaled is
+# binary, so Pearson on it is the point-biserial correlation
+PAIRS = [
+    ("journaled",  "tasks_done"),
+    ("journaled",  "mood"),
+    ("journaled",  "focus_mins"),
+    ("mood",       "tasks_done"),
+    ("mood",       "focus_mins"),
+    ("tasks_done", "focus_mins"),
+    ("sentiment_confidence", "mood"),
+    ("sentiment_confidence", "tasks_done"),
+    ("sentiment_confidence", "focus_mins"),
+]
+PAIR_ROWS = np.array([COLUMNS.index(a) for a, _ in PAIRS])
+PAIR_COLS = np.array([COLUMNS.index(b) for _, b in PAIRS])
+
+# Today's signal against tomorrow's, reported as (a, "next_day_<b>")
+LAG_PAIRS = [
+    ("journaled",  "mood"),
+    ("journaled",  "focus_mins"),
+    ("journaled",  "tasks_done"),
+    ("mood",       "tasks_done"),
+    ("mood",       "focus_mins"),
+    ("focus_mins", "mood"),
+    ("tasks_done", "mood"),
+]
+
+# Patterns of the last few weeks, reported as ("recent_<a>", "recent_<b>") with the
+# same sentences prefixed "Lately, "
+TEMPLATES.update({
+    (f"recent_{a}", f"recent_{b}", direction): "Lately, " + text[0].lower() + text[1:]
+    for (a, b, direction), text in list(TEMPLATES.items())
+    if (a, b) in PAIRS
+})
+
+logger = get_logger(__name__)
+
+# The worker's CPU pool, or one forked by start_pool() itself; _own_pool when it's the latter
+_pool = None
+_own_pool = False
+
+# Recent patterns look at most this many days back from the last one
+TAIL_DAYS = max(RECENT_WINDOWS) + RECENT_STEADY_DAYS - 1
+
+# Serialized LogStats: version, days seen, decay, whether time-series sums follow, then the
+# arrays as little-endian float64. The time-series part adds its own header (calendar or
+# list order, first and last day, rows kept) and a variable number of tail rows.
+# Bump the version whenever COLUMNS or the layout change, so old blobs are refused
+STATE_VERSION = 2
+_STATE_HEADER = struct.Struct("<BIdB")
+_STATE_FLOATS = len(COLUMNS) + 4 * len(COLUMNS) ** 2
+_SERIES_HEADER = struct.Struct("<BqqH")
+_SERIES_FLOATS = len(COLUMNS) + 2 * 6 * len(COLUMNS) ** 2
+
+
 def _direction(r: float) -> str:
     return "positive" if r > 0 else "negative"
 
 
-def _pearson(x: list, y: list) -> Optional[float]:
-    if len(x) < MIN_DAYS:
-        return None
-    r, _ = stats.pearsonr(x, y)
-    return r
+def pack_logs(logs: list) -> tuple[np.ndarray, np.ndarray]:
+    """Logs as one (n_days, len(COLUMNS)) float array and a mask of which values are present."""
+    X = np.array([
+        (
+            log.journaled, log.tasks_done, log.mood, log.focus_mins,
+            log.sentiment.confidence if log.sentiment is not None else np.nan
+        )
+        for log in logs
+    ], dtype=np.float64).reshape(len(logs), len(COLUMNS))
+    return X, ~np.isnan(X)
 
-def _point_biserial(binary: list, continuous: list) -> Optional[float]:
-    if len(binary) < MIN_DAYS:
-        return None
-    r, _ = stats.pointbiserialr(binary, continuous)
-    return r
 
-def generate_insights(logs: list) -> dict:
-    if len(logs) < MIN_DAYS:
-        return {
-            "insights": [],
-            "days_analyzed": len(logs),
-            "message": f"Need at least {MIN_DAYS} days of data. You sent {len(logs)}."
-        }
- 
-    journaled  = [log.journaled   for log in logs]
-    tasks_done = [log.tasks_done  for log in logs]
-    mood       = [log.mood        for log in logs]
-    focus_mins = [log.focus_mins  for log in logs]
- 
-    pairs = [
-        ("journaled",  "tasks_done", _point_biserial(journaled, tasks_done)),
-        ("journaled",  "mood",       _point_biserial(journaled, mood)),
-        ("journaled",  "focus_mins", _point_biserial(journaled, focus_mins)),
-        ("mood",       "tasks_done", _pearson(mood, tasks_done)),
-        ("mood",       "focus_mins", _pearson(mood, focus_mins)),
-        ("tasks_done", "focus_mins", _pearson(tasks_done, focus_mins)),
+def pack_log_dicts(logs: list, start: int = 0) -> tuple[np.ndarray, np.ndarray]:
+    """pack_logs for raw JSON log dicts, checking them the way DailyLog would.
+
+    Building a DailyLog per day dominates large bulk requests, so the
+    values go straight into the array and are checked column-wise.
+    Raises ValueError naming the first bad field, e.g. "logs.3.mood ...";
+    `start` is added to the index when `logs` is a slice of a longer stream.
+    """
+    rows = []
+    for i, log in enumerate(logs, start):
+        try:
+            sentiment = log.get("sentiment")
+            confidence = np.nan if sentiment is None else float(sentiment["confidence"])
+            if sentiment is not None and not isinstance(sentiment["sentiment"], str):
+                raise ValueError("sentiment.sentiment should be a string")
+            rows.append((log["journaled"], log["tasks_done"], log["mood"], log["focus_mins"], confidence))
+        except KeyError as e:
+            raise ValueError(f"logs.{i}.{e.args[0]} Field required") from None
+        except (AttributeError, TypeError, ValueError) as e:
+            raise ValueError(f"logs.{i} Invalid log: {e}") from None
+
+    try:
+        X = np.array(rows, dtype=np.float64).reshape(len(logs), len(COLUMNS))
+    except (TypeError, ValueError):
+        raise ValueError("logs Input should be numbers") from None
+
+    mood = X[:, COL["mood"]]
+    checks = [
+        (name, ~np.isfinite(X[:, j]) | (X[:, j] != np.round(X[:, j])), "Input should be a valid integer")
+        for j, name in enumerate(COLUMNS[:4])
     ]
- 
-    sentiment_logs = [log for log in logs if log.sentiment is not None]
-    if len(sentiment_logs) >= MIN_DAYS:
-        s_conf  = [log.sentiment.confidence for log in sentiment_logs]
-        s_mood  = [log.mood       for log in sentiment_logs]
-        s_tasks = [log.tasks_done for log in sentiment_logs]
-        s_focus = [log.focus_mins for log in sentiment_logs]
-        pairs += [
-            ("sentiment_confidence", "mood",       _pearson(s_conf, s_mood)),
-            ("sentiment_confidence", "tasks_done", _pearson(s_conf, s_tasks)),
-            ("sentiment_confidence", "focus_mins", _pearson(s_conf, s_focus)),
-        ]
- 
+    checks += [
+        ("mood", mood < 1, "Input should be greater than or equal to 1"),
+        ("mood", mood > 10, "Input should be less than or equal to 10"),
+    ]
+    for field, bad, message in checks:
+        if bad.any():
+            raise ValueError(f"logs.{start + int(bad.argmax())}.{field} {message}")
+    return X, ~np.isnan(X)
+
+
+def log_dates(logs: list, start: int = 0) -> list:
+    """The `date` of each raw JSON log dict, None where it has none, checked the way DailyLog would."""
+    dates = [log.get("date") for log in logs]
+    for i, d in enumerate(dates, start):
+        if d is not None and not isinstance(d, str):
+            raise ValueError(f"logs.{i}.date Input should be a valid string")
+    return dates
+
+
+def correlation_matrix(X: np.ndarray, present: np.ndarray) -> np.ndarray:
+    """Pearson r for every pair of columns, each over the days both columns are present.
+
+    All pairs come out of a handful of matrix products over the packed array.
+    Entries are NaN where a pair has fewer than MIN_DAYS shared days or one
+    side is constant over them, i.e. there is no signal to report. Leading
+    axes are batch axes: a (users, days, columns) array padded with absent
+    days gives one matrix per user.
+    """
+    W = present.astype(np.float64)
+    # Shifting a column doesn't change r. Shifting by its first value keeps the sums
+    # small, and makes a constant column exactly zero, so its variance is exactly 0
+    first = np.take_along_axis(X, present.argmax(axis=-2)[..., None, :], axis=-2)
+    Xs = np.where(present, X - np.nan_to_num(first), 0.0)
+
+    return _correlations_from_sums(*_shifted_sums(Xs, W))
+
+
+def _shifted_sums(Xs: np.ndarray, W: np.ndarray, weights: np.ndarray = None) -> tuple:
+    # Sufficient statistics of every column pair over the days both are present.
+    # Xs is shifted and zeroed where absent, W is the presence mask as floats,
+    # and `weights` (one per day) turns every count and sum into a weighted one
+    Xw, Ww = (Xs, W) if weights is None else (Xs * weights[..., None], W * weights[..., None])
+    Wt, Xt = np.swapaxes(Ww, -1, -2), np.swapaxes(Xw, -1, -2)
+    n = Wt @ W                      # shared days per pair
+    sx = Xt @ W                     # sx[a, b]: sum of a over the days shared with b
+    sxx = np.swapaxes(Xw * Xs, -1, -2) @ W
+    sxy = Xt @ Xs
+    return n, sx, sxx, sxy
+
+
+def _correlations_from_sums(n, sx, sxx, sxy) -> np.ndarray:
+    return _pearson_from_sums(n, sx, np.swapaxes(sx, -1, -2), sxx, np.swapaxes(sxx, -1, -2), sxy)
+
+
+def _pearson_from_sums(n, sx, sy, sxx, syy, sxy) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sy / n
+        var_x = sxx - sx * sx / n
+        var_y = syy - sy * sy / n
+        r = cov / np.sqrt(var_x * var_y)
+    # A column that is constant over a pair's days should have variance exactly 0, but
+    # with weighted days round-off can leave a sliver of its sum of squares instead
+    no_signal = (n < MIN_DAYS) | (var_x <= 1e-12 * sxx) | (var_y <= 1e-12 * syy)
+    return np.where(no_signal, np.nan, np.clip(r, -1.0, 1.0))
+
+
+def pair_correlations(r: np.ndarray) -> list:
+    """(a, b, r) for every pair in PAIRS, r None when there is no signal."""
+    values = r[..., PAIR_ROWS, PAIR_COLS]
+    return [(a, b, _value(value)) for (a, b), value in zip(PAIRS, values)]
+
+
+def _value(r: float):
+    return None if np.isnan(r) else float(r)
+
+class LogStats:
+    """Running sufficient statistics for the insight pairs, fed a block of days at a time.
+
+    Keeps n, sum x, sum y, sum xy, sum x^2 and sum y^2 for every pair of
+    COLUMNS as 5x5 matrices, so memory stays the same however many days
+    go through. Each column is shifted by its first present value, as in
+    correlation_matrix, and the result matches generate_insights on the
+    same logs. With `time_series`, a TimeSeriesStats alongside adds the
+    next-day and recent patterns, as generate_insights does by default.
+
+    With `decay` below 1, every new day multiplies the weight of all the
+    days before it by `decay`, so old behaviour fades out. n is then the
+    effective number of days, and a pair needs MIN_DAYS of it to count.
+    to_state() and from_state() carry the sums between requests, so a
+    week's update costs O(new days).
+    """
+
+    def __init__(self, decay: float = 1.0, time_series: bool = True):
+        k = len(COLUMNS)
+        self.decay = decay
+        self.days = 0
+        self.shift = np.full(k, np.nan)
+        self.n = np.zeros((k, k))
+        self.sx = np.zeros((k, k))
+        self.sxx = np.zeros((k, k))
+        self.sxy = np.zeros((k, k))
+        self.series = TimeSeriesStats(decay) if time_series else None
+
+    def add(self, X: np.ndarray, present: np.ndarray = None, dates: list = None):
+        """Fold in packed days from pack_logs or pack_log_dicts, oldest first, with their dates."""
+        with stage("insights_update"):
+            self._add(X, present)
+            if self.series is not None:
+                self.series.add(X, present, dates)
+
+    def _add(self, X: np.ndarray, present: np.ndarray):
+        if present is None:
+            present = ~np.isnan(X)
+        first_seen = np.isnan(self.shift) & present.any(axis=0)
+        if first_seen.any():
+            cols = np.flatnonzero(first_seen)
+            self.shift[cols] = X[present[:, cols].argmax(axis=0), cols]
+
+        weights = None
+        if self.decay < 1.0 and len(X):
+            fade = self.decay ** len(X)
+            for sums in (self.n, self.sx, self.sxx, self.sxy):
+                sums *= fade
+            weights = self.decay ** np.arange(len(X) - 1, -1, -1, dtype=np.float64)
+
+        Xs = np.where(present, X - np.nan_to_num(self.shift), 0.0)
+        n, sx, sxx, sxy = _shifted_sums(Xs, present.astype(np.float64), weights)
+        self.n += n
+        self.sx += sx
+        self.sxx += sxx
+        self.sxy += sxy
+        self.days += len(X)
+
+    def correlations(self) -> np.ndarray:
+        return _correlations_from_sums(self.n, self.sx, self.sxx, self.sxy)
+
+    def insights(self) -> dict:
+        if self.days < MIN_DAYS:
+            return _too_few_days(self.days)
+        pairs = pair_correlations(self.correlations())
+        if self.series is not None:
+            pairs += self.series.pairs(pairs)
+        return insights_from_pairs(pairs, self.days)
+
+    def to_state(self) -> str:
+        """The sums as a URL-safe base64 blob for the client to keep.
+
+        About 1.1 KB for the same-day sums, and up to about 8 KB more with
+        the time-series sums and the last TAIL_DAYS days they need.
+        """
+        values = np.concatenate([self.shift] + [m.ravel() for m in (self.n, self.sx, self.sxx, self.sxy)])
+        raw = _STATE_HEADER.pack(STATE_VERSION, self.days, self.decay, self.series is not None)
+        raw += values.astype("<f8").tobytes()
+        if self.series is not None:
+            raw += self.series.to_bytes()
+        return base64.urlsafe_b64encode(raw).decode()
+
+    @classmethod
+    def from_state(cls, blob: str) -> "LogStats":
+        """Rebuild from to_state(). Raises ValueError for a damaged or outdated blob."""
+        try:
+            raw = base64.urlsafe_b64decode(blob.encode())
+        except (binascii.Error, ValueError):
+            raise ValueError("state is not a valid insight state") from None
+        if len(raw) < _STATE_HEADER.size + 8 * _STATE_FLOATS:
+            raise ValueError("state is not a valid insight state")
+        version, days, decay, time_series = _STATE_HEADER.unpack_from(raw)
+        if version != STATE_VERSION:
+            raise ValueError("state was made by an older version, send the full history instead")
+
+        offset = _STATE_HEADER.size + 8 * _STATE_FLOATS
+        values = np.frombuffer(raw[:offset], dtype="<f8", offset=_STATE_HEADER.size).astype(np.float64)
+        k = len(COLUMNS)
+        shift, sums = values[:k], values[k:].reshape(4, k, k)
+        if not (0.0 < decay <= 1.0) or not np.isfinite(sums).all() or np.isinf(shift).any():
+            raise ValueError("state is not a valid insight state")
+
+        stats = cls(decay, time_series=False)
+        stats.days = days
+        stats.shift = shift
+        stats.n, stats.sx, stats.sxx, stats.sxy = (m.copy() for m in sums)
+        if time_series:
+            stats.series = TimeSeriesStats.from_bytes(raw[offset:], days, decay)
+        elif len(raw) != offset:
+            raise ValueError("state is not a valid insight state")
+        return stats
+
+
+class TimeSeriesStats:
+    """Running sums for the next-day pairs and the last TAIL_DAYS days, for the time-series insights.
+
+    Days go on the calendar while every date parses and each is later than
+    the one before: only logs one calendar day apart pair up for next-day r,
+    and days not logged are gaps in the recent windows. The first log that
+    breaks this turns the history into consecutive days in list order, for
+    good, so the list-order sums are kept alongside until then. Either way
+    it is the same as generate_insights on the same logs, fed all at once
+    or a block at a time; memory stays the same however many days go in.
+    """
+
+    def __init__(self, decay: float = 1.0):
+        k = len(COLUMNS)
+        self.decay = decay
+        self.days = 0
+        self.calendar = True
+        self.first_day = self.last_day = -1
+        self.shift = np.full(k, np.nan)
+        # n, sum x, sum y, sum x^2, sum y^2, sum xy of (today's a, tomorrow's b), a/b over COLUMNS
+        self.list_sums = np.zeros((6, k, k))
+        self.calendar_sums = np.zeros((6, k, k))
+        self.tail = np.empty((0, k))
+        self.tail_days = np.empty(0, dtype=np.int64)
+
+    def add(self, X: np.ndarray, present: np.ndarray = None, dates: list = None):
+        """Fold in packed days, oldest first. `dates` are ISO strings; None or a bad one means undated."""
+        if not len(X):
+            return
+        if present is None:
+            present = ~np.isnan(X)
+        days = _day_numbers(dates, len(X))
+        first_seen = np.isnan(self.shift) & present.any(axis=0)
+        if first_seen.any():
+            cols = np.flatnonzero(first_seen)
+            self.shift[cols] = X[present[:, cols].argmax(axis=0), cols]
+
+        # Every row of this block against the row before it, the previous block's last one included
+        rows = np.concatenate([self.tail[-1:], X])
+        before = np.concatenate([self.tail_days[-1:], days])
+        Xs = np.where(np.isnan(rows), 0.0, rows - np.nan_to_num(self.shift))
+        W = (~np.isnan(rows)).astype(np.float64)
+        today, tomorrow = slice(0, -1), slice(1, None)
+        weights = self.decay ** np.arange(len(rows) - 2, -1, -1, dtype=np.float64) if self.decay < 1.0 else None
+
+        if self.decay < 1.0:
+            fade = self.decay ** len(X)
+            self.list_sums *= fade
+            self.calendar_sums *= fade
+        self.list_sums += _cross_sums(Xs[today], W[today], Xs[tomorrow], W[tomorrow], weights)
+
+        if self.calendar and ((days < 0).any() or (np.diff(before) <= 0).any()):
+            self.calendar = False
+        if self.calendar:
+            next_day = np.diff(before) == 1
+            self.calendar_sums += _cross_sums(
+                Xs[today][next_day], W[today][next_day], Xs[tomorrow][next_day], W[tomorrow][next_day],
+                None if weights is None else weights[next_day],
+            )
+            if self.first_day < 0:
+                self.first_day = int(days[0])
+            self.last_day = int(days[-1])
+
+        self.tail = np.concatenate([self.tail, X])[-TAIL_DAYS:]
+        self.tail_days = np.concatenate([self.tail_days, days])[-TAIL_DAYS:]
+        self.days += len(X)
+
+    def lagged_pairs(self) -> list:
+        """(a, "next_day_<b>", r) for LAG_PAIRS."""
+        r = _pearson_from_sums(*(self.calendar_sums if self.calendar else self.list_sums))
+        return [(a, f"next_day_{b}", _value(r[COL[a], COL[b]])) for a, b in LAG_PAIRS]
+
+    def recent_days(self) -> tuple[np.ndarray, int]:
+        """The last days as rows (on the calendar: one per day, NaN where not logged), and the whole history's length."""
+        if not self.calendar:
+            return self.tail, self.days
+        span = self.last_day - self.first_day + 1
+        start = self.last_day - min(span, TAIL_DAYS) + 1
+        grid = np.full((self.last_day - start + 1, len(COLUMNS)), np.nan)
+        keep = self.tail_days >= start
+        grid[self.tail_days[keep] - start] = self.tail[keep]
+        return grid, span
+
+    def pairs(self, same_day: list) -> list:
+        """Next-day and recent pairs, to rank alongside the `same_day` ones."""
+        lagged = self.lagged_pairs()
+        with stage("insights_recent"):
+            recent = recent_pair_correlations(*self.recent_days(), same_day)
+        return lagged + recent
+
+    def to_bytes(self) -> bytes:
+        values = np.concatenate([self.shift, self.list_sums.ravel(), self.calendar_sums.ravel(),
+                                 self.tail.ravel(), self.tail_days.astype(np.float64)])
+        header = _SERIES_HEADER.pack(self.calendar, self.first_day, self.last_day, len(self.tail))
+        return header + values.astype("<f8").tobytes()
+
+    @classmethod
+    def from_bytes(cls, raw: bytes, days: int, decay: float) -> "TimeSeriesStats":
+        k = len(COLUMNS)
+        if len(raw) < _SERIES_HEADER.size:
+            raise ValueError("state is not a valid insight state")
+        calendar, first_day, last_day, rows = _SERIES_HEADER.unpack_from(raw)
+        if rows != min(days, TAIL_DAYS) or len(raw) != _SERIES_HEADER.size + 8 * (_SERIES_FLOATS + rows * (k + 1)):
+            raise ValueError("state is not a valid insight state")
+        values = np.frombuffer(raw, dtype="<f8", offset=_SERIES_HEADER.size).astype(np.float64)
+        shift, values = values[:k], values[k:]
+        sums, values = values[:12 * k * k].reshape(2, 6, k, k), values[12 * k * k:]
+        tail, tail_days = values[:rows * k].reshape(rows, k), values[rows * k:]
+        if (not np.isfinite(sums).all() or np.isinf(shift).any() or np.isinf(tail).any()
+                or not np.isfinite(tail_days).all() or (calendar and not first_day <= last_day)):
+            raise ValueError("state is not a valid insight state")
+
+        series = cls(decay)
+        series.days = days
+        series.calendar = bool(calendar)
+        series.first_day, series.last_day = first_day, last_day
+        series.shift = shift
+        series.list_sums, series.calendar_sums = sums[0].copy(), sums[1].copy()
+        series.tail, series.tail_days = tail.copy(), tail_days.astype(np.int64)
+        return series
+
+
+def _cross_sums(A: np.ndarray, P: np.ndarray, B: np.ndarray, Q: np.ndarray, weights: np.ndarray = None) -> np.ndarray:
+    # Sums of every (a, b) pair over the rows where A's column a and B's column b are both
+    # present, stacked as n, sum a, sum b, sum a^2, sum b^2, sum ab. A and B are shifted
+    # and zeroed where absent, P and Q their presence masks as floats
+    Aw, Pw = (A, P) if weights is None else (A * weights[:, None], P * weights[:, None])
+    return np.stack([Pw.T @ Q, Aw.T @ Q, Pw.T @ B, (Aw * A).T @ Q, Pw.T @ (B * B), Aw.T @ B])
+
+
+def _day_numbers(dates: list, n: int) -> np.ndarray:
+    # Ordinals of ISO dates, -1 where there is none or it doesn't parse
+    days = np.full(n, -1, dtype=np.int64)
+    if dates is not None:
+        for i, d in enumerate(dates):
+            try:
+                days[i] = date.fromisoformat(d[:10]).toordinal()
+            except (TypeError, ValueError):
+                pass
+    return days
+
+
+def decay_for_half_life(half_life_days: float) -> float:
+    """Per-day decay under which a day's weight halves every `half_life_days` days."""
+    return 0.5 ** (1.0 / half_life_days)
+
+
+async def accumulate_ndjson(chunks) -> LogStats:
+    """LogStats for an NDJSON body of one DailyLog object per line.
+
+    `chunks` is an async iterable of bytes, e.g. request.stream(). Lines are
+    gathered into blocks of NDJSON_BLOCK_DAYS, then parsed, checked and
+    folded in off the event loop, so only one block is ever held. Raises
+    ValueError naming the first bad line, counted from 0 like logs.N.
+    """
+    stats = LogStats()
+    block, buffer = [], b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        if len(buffer) > NDJSON_MAX_LINE_BYTES:
+            raise ValueError(f"logs.{stats.days + len(block)} Line is longer than {NDJSON_MAX_LINE_BYTES} bytes")
+        for line in lines:
+            if line.strip():
+                block.append(line)
+            if len(block) >= NDJSON_BLOCK_DAYS:
+                await asyncio.to_thread(_add_ndjson_block, stats, block)
+                block = []
+    if buffer.strip():
+        block.append(buffer)
+    if block:
+        await asyncio.to_thread(_add_ndjson_block, stats, block)
+    return stats
+
+
+def _add_ndjson_block(stats: LogStats, lines: list):
+    logs = []
+    for i, line in enumerate(lines, stats.days):
+        try:
+            log = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"logs.{i} Invalid JSON: {e}") from None
+        if not isinstance(log, dict):
+            raise ValueError(f"logs.{i} Input should be a JSON object")
+        logs.append(log)
+    X, present = pack_log_dicts(logs, start=stats.days)
+    stats.add(X, present, log_dates(logs, start=stats.days))
+
+
+def rolling_correlations(X: np.ndarray, window: int) -> np.ndarray:
+    """Pearson r of every column pair in every run of `window` rows, (rows - window + 1, k, k).
+
+    The windows are strided views of X, so they share its memory until
+    correlation_matrix computes all of them as one batch. NaN rows are
+    days not logged; a window needs MIN_DAYS shared days for a pair to count.
+    """
+    views = np.swapaxes(np.lib.stride_tricks.sliding_window_view(X, window, axis=0), -1, -2)
+    return correlation_matrix(views, ~np.isnan(views))
+
+
+def recent_pair_correlations(X: np.ndarray, days: int, pairs: list) -> list:
+    """("recent_<a>", "recent_<b>", r) for patterns of the last weeks that the full history lacks.
+
+    X is the end of a history `days` long, at least its last TAIL_DAYS rows.
+    For each window in RECENT_WINDOWS shorter than the history, a pair counts
+    when its r is past THRESHOLD with the same sign in every window ending
+    in the last RECENT_STEADY_DAYS days, so one odd day can't make it. Its r
+    is the weakest of those. The longest window that qualifies wins, and a
+    pattern the whole history already shows in the same direction is dropped.
+    """
+    already = {(a, b, _direction(r)) for a, b, r in pairs if r is not None and abs(r) >= THRESHOLD}
+    found = {}
+    for window in sorted(RECENT_WINDOWS):
+        if window + RECENT_STEADY_DAYS > days:
+            break
+        series = rolling_correlations(X[-(window + RECENT_STEADY_DAYS - 1):], window)[:, PAIR_ROWS, PAIR_COLS]
+        steady = (np.abs(series) >= THRESHOLD).all(axis=0) & (np.abs(np.sign(series).sum(axis=0)) == len(series))
+        weakest = np.sign(series[0]) * np.abs(series).min(axis=0)
+        for (a, b), ok, r in zip(PAIRS, steady, weakest):
+            if ok and (a, b, _direction(r)) not in already:
+                found[(a, b)] = float(r)
+    return [(f"recent_{a}", f"recent_{b}", r) for (a, b), r in found.items()]
+
+
+def generate_insights(logs: list, time_series: bool = True) -> dict:
+    """Insights from same-day correlations over the whole history.
+
+    With `time_series`, next-day effects and patterns of the last weeks
+    compete for the same five places. They need the logs in day order, so
+    they are computed on the dated calendar (see TimeSeriesStats).
+    """
+    if len(logs) < MIN_DAYS:
+        return _too_few_days(len(logs))
+    return generate_insights_packed(pack_logs(logs)[0], [log.date for log in logs], time_series)
+
+def generate_insights_packed(X: np.ndarray, dates: list, time_series: bool = True) -> dict:
+    """generate_insights for logs already packed by pack_logs, with their dates.
+
+    Arrays and strings are cheap to send to another process, so this is
+    what the CPU pool runs.
+    """
+    if len(X) < MIN_DAYS:
+        return _too_few_days(len(X))
+
+    present = ~np.isnan(X)
+    with stage("insights_same_day"):
+        pairs = pair_correlations(correlation_matrix(X, present))
+    if time_series:
+        pairs += _time_series_pairs(X, present, dates, pairs)
+    return insights_from_pairs(pairs, len(X))
+
+def _time_series_pairs(X: np.ndarray, present: np.ndarray, dates: list, same_day: list) -> list:
+    # The same TimeSeriesStats the stream and incremental routes keep, fed in one go
+    series = TimeSeriesStats()
+    with stage("insights_next_day"):
+        series.add(X, present, dates)
+    return series.pairs(same_day)
+
+def generate_insights_bulk(histories: list, dates: list = None) -> list:
+    """generate_insights for many users at once, results in input order.
+
+    Each history is one user's packed (days, columns) array from pack_logs
+    or pack_log_dicts, NaN where a value is missing. Users are sorted by
+    history length and cut into chunks of INSIGHTS_CHUNK_USERS, so each
+    chunk pads to a similar length. Each chunk is one (users, days, columns)
+    array with absent padding days, and its correlations are one batched
+    correlation_matrix call. Very large requests spread the chunks over
+    the INSIGHTS_WORKERS processes of start_pool(), once it has run.
+    With `dates` (each user's log dates, as for generate_insights_packed),
+    next-day and recent patterns are added per user, in the same process
+    as the chunk's correlations: they cost more than the batched same-day
+    ones, so on the pool they are spread over its processes too.
+    """
+    results = [None] * len(histories)
+    eligible = []
+    for i, X in enumerate(histories):
+        if len(X) < MIN_DAYS:
+            results[i] = _too_few_days(len(X))
+        else:
+            eligible.append(i)
+
+    eligible.sort(key=lambda i: len(histories[i]))
+    chunks = [eligible[k:k + INSIGHTS_CHUNK_USERS] for k in range(0, len(eligible), INSIGHTS_CHUNK_USERS)]
+    padded = [_pad_chunk([histories[i] for i in chunk]) for chunk in chunks]
+    chunk_dates = [None if dates is None else [dates[i] for i in chunk] for chunk in chunks]
+
+    with stage("insights_bulk"):
+        chunk_pairs = None
+        pool = _pool
+        if pool is not None and len(eligible) >= INSIGHTS_POOL_MIN_USERS and len(chunks) > 1:
+            chunk_pairs = _map_on_pool(pool, padded, chunk_dates)
+        if chunk_pairs is None:
+            chunk_pairs = [_chunk_pairs(X, d) for X, d in zip(padded, chunk_dates)]
+
+    for chunk, user_pairs in zip(chunks, chunk_pairs):
+        for i, pairs in zip(chunk, user_pairs):
+            results[i] = insights_from_pairs(pairs, len(histories[i]))
+    return results
+
+def insights_from_pairs(pairs: list, days_analyzed: int) -> dict:
     strong = sorted(
         [(a, b, r) for a, b, r in pairs if r is not None and abs(r) >= THRESHOLD],
         key=lambda x: abs(x[2]),
@@ -90,13 +663,80 @@ def generate_insights(logs: list) -> dict:
     if not sentences:
         return {
             "insights": [],
-            "days_analyzed": len(logs),
+            "days_analyzed": days_analyzed,
             "message": "No strong patterns found yet. Keep logging more days."
         }
  
     return {
         "insights": sentences,
-        "days_analyzed": len(logs),
+        "days_analyzed": days_analyzed,
         "message": None
     }
 
+def _too_few_days(days: int) -> dict:
+    return {
+        "insights": [],
+        "days_analyzed": days,
+        "message": f"Need at least {MIN_DAYS} days of data. You sent {days}."
+    }
+
+def _pad_chunk(histories: list) -> np.ndarray:
+    """Several users' packed logs as (users, longest history, columns), padded with NaN days."""
+    X = np.full((len(histories), max(len(h) for h in histories), len(COLUMNS)), np.nan)
+    for u, history in enumerate(histories):
+        X[u, :len(history)] = history
+    return X
+
+def _chunk_pairs(X: np.ndarray, dates: list = None) -> list:
+    # Module-level so a process pool can run it. Each user's pairs, plus next-day and
+    # recent ones when the chunk comes with its users' dates (a user's history is
+    # as long as its dates; the rest of its rows are padding)
+    present = ~np.isnan(X)
+    values = correlation_matrix(X, present)[..., PAIR_ROWS, PAIR_COLS]
+    chunk_pairs = []
+    for u, row in enumerate(values):
+        pairs = [(a, b, None if np.isnan(v) else float(v)) for (a, b), v in zip(PAIRS, row)]
+        if dates is not None:
+            days = len(dates[u])
+            pairs += _time_series_pairs(X[u, :days], present[u, :days], dates[u], pairs)
+        chunk_pairs.append(pairs)
+    return chunk_pairs
+
+def _map_on_pool(pool: ProcessPoolExecutor, padded: list, chunk_dates: list):
+    global _pool
+    try:
+        return list(pool.map(_chunk_pairs, padded, chunk_dates))
+    except BrokenProcessPool:
+        # As in serving: a pool process died, and forking a new one from a threaded
+        # worker could deadlock it, so bulk requests go on in the request thread
+        if _pool is pool:
+            logger.error("Bulk insights pool broken, worker %d computes in the request thread", os.getpid())
+            _pool = None
+        return None
+
+def start_pool(pool: ProcessPoolExecutor = None):
+    """Give large bulk requests a process pool if INSIGHTS_WORKERS > 0.
+
+    The lifespan passes the worker's CPU pool when it has one, which
+    serving sizes for INSIGHTS_WORKERS too. A second executor would fork
+    after the first one's manager thread had started, copying a process
+    whose other threads may hold locks the child then waits on. Without
+    a pool, this forks INSIGHTS_WORKERS processes of its own, so it must
+    run before any thread starts, never from a bulk request's thread.
+    """
+    global _pool, _own_pool
+    if INSIGHTS_WORKERS <= 0 or _pool is not None:
+        return
+    _own_pool = pool is None
+    if _own_pool:
+        pool = ProcessPoolExecutor(max_workers=INSIGHTS_WORKERS)
+        # The first submit forks every process
+        pool.submit(os.getpid).result()
+    _pool = pool
+
+def shutdown_pool():
+    """Stop using the pool, and shut it down if start_pool() forked it."""
+    global _pool, _own_pool
+    if _pool is not None and _own_pool:
+        _pool.shutdown(cancel_futures=True)
+    _pool, _own_pool = None, False
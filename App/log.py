@@ -0,0 +1,60 @@
+import json
+import logging
+import sys
+import time
+from App.config import LOG_LEVEL, LOG_FORMAT
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class TextFormatter(logging.Formatter):
+    """`2026-01-01T12:00:00 INFO App.model Model loaded version=v1 load_ms=3.2`"""
+
+    def format(self, record):
+        line = (
+            f"{time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(record.created))} "
+            f"{record.levelname} {record.name} {record.getMessage()}"
+        )
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, for log collectors."""
+
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extra_fields(record),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def _extra_fields(record) -> dict:
+    return {k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS}
+
+
+def get_logger(name: str) -> logging.Logger:
+    """A logger under "App", which writes to stderr at LOG_LEVEL in LOG_FORMAT.
+
+    Call with __name__. Messages take %-style arguments or `extra=` fields
+    so nothing is formatted when the level is off.
+    """
+    root = logging.getLogger("App")
+    if not root.handlers:
+        handler = logging.StreamHandler(sys.stderr)
+        handler.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return logging.getLogger(name)
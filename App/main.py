@@ -1,33 +1,68 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
-from App.config import APP_TITLE, APP_VERSION, APP_DESCRIPTION
-from App.model import predictor
+from pydantic import ValidationError
+from App.config import (
+    APP_TITLE, APP_VERSION, APP_DESCRIPTION, MAX_BATCH_SIZE, MAX_HISTORY_HABITS, MAX_BULK_USERS, MIN_DAYS, check_api_keys
+)
+from App.model import resident_memory_mb
+from App.registry import registry
 from App.schemas import (
     HabitInput, PredictionResponse,
+    BatchPredictionRequest, BatchPredictionResponse,
+    HabitHistoryRequest, HabitHistoryResponse,
     JournalInput, JournalResponse, SentimentResult,
     WeeklyInsightRequest, WeeklyInsightResponse,
+    IncrementalInsightRequest, IncrementalInsightResponse,
+    BulkInsightRequest, BulkInsightResponse,
     GoalGenerateRequest, GoalGenerateResponse
 )
-from App.insight_engine import generate_insights
-from App.goals_engine import generate_goal_plan
+from App.insight_engine import (
+    generate_insights_bulk, pack_logs, pack_log_dicts, log_dates, accumulate_ndjson,
+    LogStats, decay_for_half_life, start_pool, shutdown_pool
+)
+from App.features import parse_habit, forecast
+from App.goals_engine import generate_goal_plan_async, groq_breaker, groq_metrics, plan_cache, close_clients as close_groq_clients
 from App.dependencies import verify_api_secret
+from App.log import get_logger
+from App.metrics import MetricsMiddleware, registry as metrics_registry
+from App.serving import run_predict, run_weekly_insights, start_cpu_pool, shutdown_cpu_pool
 from . import sentiment
 from datetime import datetime
+import math
+import os
+
+logger = get_logger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app:FastAPI):
-    print("API starting...")
-    predictor.load_model()
+    logger.info("API starting, worker %d", os.getpid())
+    check_api_keys()
+    # Under gunicorn the master has loaded it already, and this worker shares its pages
+    if registry.active is None:
+        registry.load()
+    # One pool per worker, forked before the watcher thread starts. Bulk insights use the
+    # CPU pool when there is one; otherwise start_pool() forks its own, still thread-free
+    start_pool(start_cpu_pool())
+    registry.start_watching()
+    sentiment.load()
     yield
-    print("Shutting down...")
+    registry.stop_watching()
+    await close_groq_clients()
+    shutdown_pool()
+    shutdown_cpu_pool()
+    sentiment.cache.flush()
+    plan_cache.flush()
+    logger.info("Shutting down, worker %d", os.getpid())
     
 app = FastAPI(
     title=APP_TITLE,
     version=APP_VERSION,
     description=APP_DESCRIPTION,
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 origins = [
@@ -47,6 +82,8 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the time includes CORS and every response, errors too
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 def home():
@@ -62,67 +99,295 @@ def home():
     
 @app.get("/v1/health")
 def health_check():
+    active = registry.active
+    loaded = active is not None and active.model is not None
     return {
-        "status" : "healthy" if predictor.model is not None else "Unhealthy",
-        "habit-model-loaded" : predictor.model is not None,
+        "status" : "healthy" if loaded else "Unhealthy",
+        "habit-model-loaded" : loaded,
+        **registry.status(),
+        "model_format" : registry.model_format,
+        "inference_engine" : active.engine if active else None,
+        "model_load_ms" : round(active.load_seconds * 1000, 1) if loaded else None,
+        "worker_pid" : os.getpid(),
+        "worker_rss_mb" : round(resident_memory_mb(), 1),
         "api_version" : APP_VERSION,
         "vader" : "active",
-        "roberta": "huggingface_api"
+        "roberta": sentiment.backend.name,
+        # Open breakers mean degraded answers (fallbacks), not an unhealthy worker
+        "circuit_breakers": {
+            "roberta": sentiment.roberta_breaker.status(),
+            "groq": groq_breaker.status()
+        }
     }
     
+@app.get("/v1/stats", dependencies=[Depends(verify_api_secret)])
+def stats():
+    return {
+        "models": {
+            p.version: {
+                "fingerprint": p.fingerprint,
+                "prediction_cache": p.cache.stats(),
+            }
+            for p in registry.predictors()
+        },
+        "roberta_batcher": sentiment.batcher.stats() if sentiment.batcher else None,
+        "sentiment_cache": sentiment.cache.stats(),
+        "groq": groq_metrics.stats(),
+        "goal_plan_cache": plan_cache.stats(),
+    }
+
+# Scraped by Prometheus; open like /v1/health. Each worker reports its own numbers
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/v1/predict", response_model=PredictionResponse, dependencies=[Depends(verify_api_secret)])
-def predict_habit(data : HabitInput):
+async def predict_habit(data : HabitInput):
     try:
         input_dict = data.model_dump()
-        result = predictor.predict(input_dict)
-        return result
+        result = await run_predict(registry.route(), input_dict)
+        return ORJSONResponse(result)
     except Exception as e:
         raise HTTPException(status_code = 500 , detail = str(e))
 
+@app.post("/v1/predict/batch", response_model=BatchPredictionResponse, dependencies=[Depends(verify_api_secret)])
+def predict_habit_batch(data: BatchPredictionRequest):
+    if not data.rows:
+        raise HTTPException(status_code=400, detail="No rows provided.")
+    if len(data.rows) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch too large. Max {MAX_BATCH_SIZE} rows.")
+
+    # Validate each row on its own so one bad row doesn't fail the whole batch
+    results = [{"index": i, "result": None, "error": None} for i in range(len(data.rows))]
+    valid_index, valid_rows = [], []
+    for i, row in enumerate(data.rows):
+        if not isinstance(row, dict):
+            results[i]["error"] = "Validation error: Input should be an object"
+            continue
+        try:
+            features = HabitInput.model_validate(row).model_dump()
+        except ValidationError as e:
+            results[i]["error"] = f"Validation error: {_first_error(e)}"
+            continue
+        problem = _non_finite_feature(features)
+        if problem:
+            results[i]["error"] = f"Validation error: {problem} Input should be a finite number"
+            continue
+        valid_rows.append(features)
+        valid_index.append(i)
+
+    try:
+        # The whole batch goes to one model version
+        predictor = registry.route()
+        try:
+            predictions = predictor.predict_many(valid_rows)
+        except (ValueError, TypeError, OverflowError):
+            # A row the forest can't take got through; find it row by row instead of failing all
+            predictions = []
+            for i, row in zip(valid_index, valid_rows):
+                try:
+                    predictions.append(predictor.predict(row))
+                except (ValueError, TypeError, OverflowError) as e:
+                    predictions.append(None)
+                    results[i]["error"] = f"Prediction error: {e}"
+    except Exception as e:
+        raise HTTPException(status_code = 500 , detail = str(e))
+
+    for i, prediction in zip(valid_index, predictions):
+        results[i]["result"] = prediction
+
+    # Built here from trusted parts, so it goes straight to orjson; validating and
+    # encoding it against BatchPredictionResponse took longer than the predictions
+    return ORJSONResponse({
+        "results": results,
+        "predicted": sum(result["result"] is not None for result in results),
+        "failed": sum(result["result"] is None for result in results)
+    })
+
+@app.post("/v1/predict/history", response_model=HabitHistoryResponse, dependencies=[Depends(verify_api_secret)])
+def predict_habit_history(data: HabitHistoryRequest):
+    # The features are computed here from each habit's raw completions, the same way for every client
+    if not data.habits:
+        raise HTTPException(status_code=400, detail="No habits provided.")
+    if len(data.habits) > MAX_HISTORY_HABITS:
+        raise HTTPException(status_code=413, detail=f"Too many habits. Max {MAX_HISTORY_HABITS} per request.")
+
+    results = [{"index": i, "habit_id": None, "days": None, "error": None} for i in range(len(data.habits))]
+    valid_index, histories = [], []
+    for i, habit in enumerate(data.habits):
+        habit_id = habit.get("habit_id")
+        results[i]["habit_id"] = habit_id if isinstance(habit_id, str) else None
+        try:
+            histories.append(parse_habit(habit))
+            valid_index.append(i)
+        except ValueError as e:
+            results[i]["error"] = f"Validation error: {e}"
+
+    try:
+        # All habits, and every forecast day, go to one model version
+        forecasts = forecast(registry.route(), histories, data.days)
+    except Exception as e:
+        raise HTTPException(status_code = 500 , detail = str(e))
+
+    for i, days in zip(valid_index, forecasts):
+        results[i]["days"] = days
+
+    return ORJSONResponse({
+        "results": results,
+        "predicted": len(histories),
+        "failed": len(data.habits) - len(histories)
+    })
+
+def _non_finite_feature(features: dict):
+    # HabitInput takes inf/nan and ints too big for a float; the forest takes neither
+    for name, value in features.items():
+        try:
+            if not math.isfinite(value):
+                return name
+        except OverflowError:
+            return name
+    return None
+
+def _first_error(e: ValidationError) -> str:
+    err = e.errors()[0]
+    field = ".".join(str(part) for part in err["loc"])
+    return f"{field} {err['msg']}" if field else err["msg"]
+
 @app.post("/v1/analyze", response_model=SentimentResult, dependencies=[Depends(verify_api_secret)])
-def analyze_text(data = JournalInput):
+async def analyze_text(data = JournalInput):
     if not data or not data.strip():
         raise  HTTPException(400, "Text can not be empty")
     
-    result = sentiment.analyze(data)
+    result = await sentiment.analyze_async(data)
 
-    return SentimentResult(
-        sentiment=result["sentiment"],
-        confidence=result["confidence"],
-        model_used=result["model_used"],
-        emotions=result["emotions"]
+    return SentimentResult.model_construct(
+        sentiment=result.sentiment,
+        confidence=result.confidence,
+        model_used=result.model_used,
+        emotions=list(result.emotions)
     )
 
 @app.post("/v1/journal",response_model=JournalResponse, dependencies=[Depends(verify_api_secret)])
-def create_journal(data : JournalInput):
+async def create_journal(data : JournalInput):
     if not data.text or not data.text.strip():
         raise  HTTPException(400, "Text can not be empty")
     
-    result = sentiment.analyze(data.text)
+    result = await sentiment.analyze_async(data.text)
 
-    return JournalResponse(
+    return JournalResponse.model_construct(
         text=data.text,
         title=data.title or "Untitled", 
-        sentiment=result["sentiment"],
-        confidence=result["confidence"],
-        emotions=result["emotions"],
-        model_used=result["model_used"],
+        sentiment=result.sentiment,
+        confidence=result.confidence,
+        emotions=list(result.emotions),
+        model_used=result.model_used,
         created_at=datetime.now().isoformat()
     )
 
 @app.post("/v1/insights_weekly", response_model=WeeklyInsightResponse, dependencies=[Depends(verify_api_secret)])
-def weekly_insights(data: WeeklyInsightRequest):
+async def weekly_insights(data: WeeklyInsightRequest):
     if not data.logs:
         raise HTTPException(status_code=400, detail="No logs provided.")
  
-    result = generate_insights(data.logs)
-    return WeeklyInsightResponse(
+    result = await run_weekly_insights(data.logs)
+    return WeeklyInsightResponse.model_construct(
+        insights=result["insights"],
+        days_analyzed=result["days_analyzed"],
+        message=result["message"]
+    )
+
+@app.post("/v1/insights_weekly/incremental", response_model=IncrementalInsightResponse, dependencies=[Depends(verify_api_secret)])
+def weekly_insights_incremental(data: IncrementalInsightRequest):
+    # The client keeps the returned state and sends it back with only the new days
+    if not data.logs and not data.state:
+        raise HTTPException(status_code=400, detail="No logs provided.")
+    if data.half_life_days is not None and data.half_life_days < MIN_DAYS:
+        raise HTTPException(status_code=422, detail=f"Validation error: half_life_days must be at least {MIN_DAYS}")
+
+    decay = decay_for_half_life(data.half_life_days) if data.half_life_days else 1.0
+    if data.state:
+        try:
+            stats = LogStats.from_state(data.state)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=f"Validation error: {e}")
+        if data.half_life_days is not None and not math.isclose(stats.decay, decay):
+            raise HTTPException(status_code=422, detail="Validation error: half_life_days differs from the one the state was made with")
+    else:
+        stats = LogStats(decay)
+
+    if data.logs:
+        stats.add(*pack_logs(data.logs), [log.date for log in data.logs])
+    result = stats.insights()
+    return IncrementalInsightResponse.model_construct(
+        insights=result["insights"],
+        days_analyzed=result["days_analyzed"],
+        message=result["message"],
+        state=stats.to_state()
+    )
+
+@app.post("/v1/insights_weekly/stream", response_model=WeeklyInsightResponse, dependencies=[Depends(verify_api_secret)])
+async def weekly_insights_stream(request: Request):
+    # One DailyLog per line, folded into running sums as it arrives, so long
+    # histories never sit in memory as a list of models
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    if content_type != "application/x-ndjson":
+        raise HTTPException(status_code=415, detail="Send logs as application/x-ndjson, one log per line.")
+
+    try:
+        stats = await accumulate_ndjson(request.stream())
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=f"Validation error: {e}")
+    if not stats.days:
+        raise HTTPException(status_code=400, detail="No logs provided.")
+
+    result = stats.insights()
+    return WeeklyInsightResponse.model_construct(
         insights=result["insights"],
         days_analyzed=result["days_analyzed"],
         message=result["message"]
     )
+
+@app.post("/v1/insights_weekly/bulk", response_model=BulkInsightResponse, dependencies=[Depends(verify_api_secret)])
+def weekly_insights_bulk(data: BulkInsightRequest):
+    if not data.users:
+        raise HTTPException(status_code=400, detail="No users provided.")
+    if len(data.users) > MAX_BULK_USERS:
+        raise HTTPException(status_code=413, detail=f"Too many users. Max {MAX_BULK_USERS} per request.")
+
+    # Check each user on its own so one bad log doesn't fail the whole batch. Logs skip
+    # DailyLog and go straight into arrays; at bulk sizes the models cost more than the math
+    results = [{"index": i, "user_id": None, "result": None, "error": None} for i in range(len(data.users))]
+    valid_index, histories, dates = [], [], []
+    for i, user in enumerate(data.users):
+        user_id = user.get("user_id")
+        results[i]["user_id"] = user_id if isinstance(user_id, str) else None
+        if results[i]["user_id"] is None:
+            results[i]["error"] = "Validation error: user_id is required and must be a string"
+            continue
+        if not isinstance(user.get("logs"), list):
+            results[i]["error"] = "Validation error: logs must be a list"
+            continue
+        try:
+            X = pack_log_dicts(user["logs"])[0]
+            if data.time_series:
+                dates.append(log_dates(user["logs"]))
+            histories.append(X)
+            valid_index.append(i)
+        except ValueError as e:
+            results[i]["error"] = f"Validation error: {e}"
+
+    for i, result in zip(valid_index, generate_insights_bulk(histories, dates if data.time_series else None)):
+        results[i]["result"] = result
+
+    return ORJSONResponse({
+        "results": results,
+        "analyzed": len(histories),
+        "failed": len(data.users) - len(histories)
+    })
  
 @app.post("/api/v1/onboarding/generate", dependencies=[Depends(verify_api_secret)])
-def generate_goal(request: GoalGenerateRequest) -> GoalGenerateResponse:
-    result = generate_goal_plan(request.goal_title, request.goal_description)
+async def generate_goal(request: GoalGenerateRequest) -> GoalGenerateResponse:
+    # Still validated against GoalGenerateResponse: the plan is the LLM's JSON, checked
+    # by validate() only for counts and frequencies
+    result = await generate_goal_plan_async(request.goal_title, request.goal_description)
     return result
\ No newline at end of file
@@ -0,0 +1,263 @@
+import bisect
+import threading
+import time
+
+# Histogram upper bounds in seconds (+Inf is implied), from a cached VADER answer to a slow Groq plan
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+# Texts per RoBERTa batch, the same powers of two /v1/stats buckets them in
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Counter:
+    """A monotonic count per combination of label values."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+
+class Gauge:
+    """A value that goes up and down, per combination of label values."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, *label_values):
+        with self._lock:
+            self._values[label_values] = value
+
+    def value(self, *label_values) -> float:
+        return self._values.get(label_values, 0.0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+
+class Histogram:
+    """Observation counts in fixed buckets plus their sum, per combination of label values."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._counts = {}       # label values -> [count per bucket..., count above the last]
+        self._sums = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(label_values)
+            if counts is None:
+                counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+                self._sums[label_values] = 0.0
+            counts[i] += 1
+            self._sums[label_values] += value
+
+    def time(self, *label_values) -> "_Timer":
+        """`with histogram.time(labels...):` observes how long the block took."""
+        return _Timer(self, label_values)
+
+    def count(self, *label_values) -> int:
+        return sum(self._counts.get(label_values, ()))
+
+    def snapshot(self) -> dict:
+        """Bucket counts and sum per label values, to take since() from later."""
+        with self._lock:
+            return {k: (list(v), self._sums[k]) for k, v in self._counts.items()}
+
+    def since(self, snapshot: dict) -> dict:
+        """What was observed after `snapshot`, as merge() takes it."""
+        delta = {}
+        for label_values, (counts, total) in self.snapshot().items():
+            before, before_total = snapshot.get(label_values, ((0,) * len(counts), 0.0))
+            added = [now - then for now, then in zip(counts, before)]
+            if any(added):
+                delta[label_values] = (added, total - before_total)
+        return delta
+
+    def merge(self, delta: dict):
+        """Add observations made in another process, e.g. a CPU pool process's since()."""
+        with self._lock:
+            for label_values, (added, total) in delta.items():
+                counts = self._counts.get(label_values)
+                if counts is None:
+                    counts = self._counts[label_values] = [0] * (len(self.buckets) + 1)
+                    self._sums[label_values] = 0.0
+                for i, n in enumerate(added):
+                    counts[i] += n
+                self._sums[label_values] += total
+
+    def samples(self):
+        with self._lock:
+            series = [(k, list(v), self._sums[k]) for k, v in self._counts.items()]
+        for label_values, counts, total in series:
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+
+class _Timer:
+    # A class, not @contextmanager: this sits on every request and a generator costs several times more
+    __slots__ = ("histogram", "label_values", "start")
+
+    def __init__(self, histogram: Histogram, label_values: tuple):
+        self.histogram = histogram
+        self.label_values = label_values
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.label_values)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request into REQUEST_SECONDS, labelled by route template.
+
+    A plain ASGI middleware, so streamed bodies pass straight through and
+    the time covers the whole response. The route label is the matched
+    path ("/v1/predict", never the raw URL), or "unmatched" for 404s.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, scope["method"], route, str(status[0]))
+
+
+def stage(name: str):
+    """Time a block of work into STAGE_SECONDS: `with stage("vader"): ...`."""
+    return STAGE_SECONDS.time(name)
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+# Global instance; every worker process keeps its own
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "rhythme_request_duration_seconds", "HTTP request latency.", ("method", "route", "status")
+))
+STAGE_SECONDS = registry.register(Histogram(
+    "rhythme_stage_duration_seconds", "Time spent in one stage of a request.", ("stage",)
+))
+SENTIMENT_RESULTS = registry.register(Counter(
+    "rhythme_sentiment_results_total", "Sentiment answers by where they came from (vader, roberta, vader-fallback, cache).", ("model_used",)
+))
+ROBERTA_CALLS = registry.register(Counter(
+    "rhythme_roberta_calls_total", "RoBERTa calls by outcome (ok, error, short_circuited).", ("outcome",)
+))
+ROBERTA_RETRIES = registry.register(Counter(
+    "rhythme_roberta_retries_total", "RoBERTa calls retried after a failed attempt."
+))
+GROQ_ATTEMPTS = registry.register(Counter(
+    "rhythme_groq_attempts_total", "Groq attempts by outcome.", ("outcome",)
+))
+GROQ_RETRIES = registry.register(Counter(
+    "rhythme_groq_retries_total", "Groq attempts after the first for the same goal."
+))
+GOAL_PLANS = registry.register(Counter(
+    "rhythme_goal_plans_total", "Goal plans returned by source (generated, cache, fallback).", ("source",)
+))
+ROBERTA_BATCH_SIZE = registry.register(Histogram(
+    "rhythme_roberta_batch_size", "Texts per micro-batched RoBERTa call.", buckets=BATCH_SIZE_BUCKETS
+))
+ROBERTA_BATCHED_TEXTS = registry.register(Counter(
+    "rhythme_roberta_batched_texts_total", "Texts sent to RoBERTa through the micro-batcher."
+))
+ROBERTA_QUEUE_DEPTH = registry.register(Gauge(
+    "rhythme_roberta_queue_depth", "Texts waiting in the micro-batcher for their batch to be sent."
+))
+ROBERTA_BATCHES_IN_FLIGHT = registry.register(Gauge(
+    "rhythme_roberta_batches_in_flight", "Micro-batched RoBERTa calls sent and not yet answered."
+))
+ROBERTA_BATCH_WAIT = registry.register(Counter(
+    "rhythme_roberta_batch_wait_seconds_total", "Time texts spent queued in the micro-batcher, summed over texts."
+))
@@ -1,50 +1,208 @@
+import os
 import pickle
-import pandas as pd
-from App.config import MODEL_PATH, FEATURE_NAMES
+import resource
+import sys
+import threading
+import time
+from pathlib import Path
+import numpy as np
+from App.config import (
+    MODEL_PATH, FLAT_MODEL_PATH, FEATURE_NAMES, INFERENCE_ENGINE, MODEL_FORMAT,
+    PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL
+)
+from App.cache import LRUCache
+from App.flat_forest import compile_forest, check_parity, load_flat_forest, file_sha256
+from App.log import get_logger
+from App.metrics import stage
+from App.schemas import Prediction
+
+logger = get_logger(__name__)
+
+ENGINES = ("sklearn", "flat")
+FORMATS = ("pickle", "flat")
 
 
 class HabitPredictor:
-    def __init__(self):
+    def __init__(
+        self,
+        engine: str = INFERENCE_ENGINE,
+        model_format: str = MODEL_FORMAT,
+        model_path: Path = MODEL_PATH,
+        flat_model_path: Path = FLAT_MODEL_PATH,
+        version: str = None,
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown inference engine '{engine}', use one of {ENGINES}")
+        if model_format not in FORMATS:
+            raise ValueError(f"Unknown model format '{model_format}', use one of {FORMATS}")
+        # A flat artifact has no sklearn forest to fall back on
+        self.engine = "flat" if model_format == "flat" else engine
+        self.model_format = model_format
+        self.model_path = Path(model_path)
+        self.flat_model_path = Path(flat_model_path)
+        self.version = version or self.model_path.parent.name
         self.model = None
+        self.load_seconds = None
+        self.rss_mb = None
+        self.fingerprint = None
+        # Results keyed on the feature vector; emptied whenever a different artifact is loaded
+        self.cache = LRUCache(PREDICTION_CACHE_SIZE, ttl=PREDICTION_CACHE_TTL)
+        # One reusable feature row per worker thread
+        self._local = threading.local()
 
     def load_model(self):
         try:
-            with open(MODEL_PATH, "rb") as f:
-                self.model = pickle.load(f)
-            print(f"Model loaded from {MODEL_PATH}")
+            start = time.perf_counter()
+
+            if self.model_format == "flat":
+                path = self.flat_model_path
+                model = load_flat_forest(path, mmap=True)
+                # The manifest holds every array's checksum, so it identifies the artifact
+                fingerprint = file_sha256(path / "manifest.json")
+            else:
+                path = self.model_path
+                fingerprint = file_sha256(path)
+                with open(path, "rb") as f:
+                    model = _prepare_for_arrays(pickle.load(f))
+
+                if self.engine == "flat":
+                    flat = compile_forest(model)
+                    gap = check_parity(model, flat)
+                    if gap > 1e-9:
+                        raise ValueError(f"Compiled forest disagrees with the model (max gap {gap:.2e})")
+                    model = flat
+
+            if fingerprint != self.fingerprint:
+                self.cache.clear()
+            self.model = model
+            self.fingerprint = fingerprint
+            self.load_seconds = time.perf_counter() - start
+            self.rss_mb = resident_memory_mb()
+            logger.info(
+                "Model %s loaded from %s", self.version, path,
+                extra={
+                    "model_format": self.model_format, "engine": self.engine,
+                    "load_ms": round(self.load_seconds * 1000, 1), "worker": os.getpid(), "rss_mb": round(self.rss_mb, 1),
+                },
+            )
         except Exception as e:
-            print(f"Error! Loading Model: {e}")
+            logger.error("Error loading model %s: %s", self.version, e)
             raise
 
-    def predict(self, input_data: dict):
+    def predict(self, input_data: dict, use_cache: bool = True) -> Prediction:
+        """One row's prediction. A CPU pool process passes use_cache=False: its worker keeps the cache."""
+        if self.model is None:
+            raise ValueError("Model not loaded")
+
+        row = self._features(input_data)
+        key = _cache_key(row[0]) if use_cache else None
+        if use_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+
+        # One forest pass; the label is derived the same way model.predict does it
+        with stage("predict"):
+            proba = self.model.predict_proba(row)[0]
+        prediction = self.model.classes_[proba.argmax()]
+
+        result = _format_result(prediction, proba[1], self.version)
+        if use_cache:
+            self.cache.set(key, result)
+        return result
+
+    def cache_key(self, input_data: dict) -> bytes:
+        """The prediction cache's key for one row, as predict() looks it up."""
+        return _cache_key(self._features(input_data)[0])
+
+    def predict_many(self, rows: list[dict]) -> list[Prediction]:
+        """Predict a batch of rows with a single forest pass, keeping input order."""
+        if self.model is None:
+            raise ValueError("Model not loaded")
+        if not rows:
+            return []
+
+        # One feature matrix for the whole batch, columns in FEATURE_NAMES order
+        X = np.empty((len(rows), len(FEATURE_NAMES)), dtype=np.float64)
+        for i, row in enumerate(rows):
+            X[i] = [row[name] for name in FEATURE_NAMES]
+        return self.predict_array(X)
+
+    def predict_array(self, X: np.ndarray) -> list[Prediction]:
+        """predict_many for a float64 feature matrix already in FEATURE_NAMES order."""
         if self.model is None:
             raise ValueError("Model not loaded")
-    
-        mapped_data = {
-            "day_of_week": input_data["day_of_week"],
-            "is_weekend": input_data["is_weekend"],
-            "current_streak": input_data["current_streak"],
-            "completion_rate_7d": input_data["completion_rate_7d"],
-            "completion_rate_30d": input_data["completion_rate_30d"],
-            "days_since_start": input_data["days_since_start"],
-            "frequency_encoded": input_data["frequency_encoded"],
-        }
-
-        df = pd.DataFrame([mapped_data], columns=FEATURE_NAMES)
-
-        
-        prediction = self.model.predict(df)[0]  
-        probability = self.model.predict_proba(df)[0][1]
-
-        result = "complete" if prediction == 1 else "Skip"
-        prob_percent = round(probability * 100, 1)
-
-        return {
-            "prediction": result, 
-            "probability": round(probability, 3),  
-            "probability_percent": f"{prob_percent}%",  
-            "message": f"User will likely {result} the habit ({prob_percent}%)",  
-        }
-
-# Global instance
-predictor = HabitPredictor()
+
+        results = [None] * len(X)
+        keys = [_cache_key(x) for x in X]
+        for i, key in enumerate(keys):
+            results[i] = self.cache.get(key)
+        misses = [i for i, result in enumerate(results) if result is None]
+
+        if misses:
+            with stage("predict_batch"):
+                proba = self.model.predict_proba(X[misses])
+
+            # Same label rule as model.predict: the class with the highest probability
+            labels = self.model.classes_.take(np.argmax(proba, axis=1))
+            positive = proba[:, 1]
+
+            for j, i in enumerate(misses):
+                results[i] = _format_result(labels[j], positive[j], self.version)
+                self.cache.set(keys[i], results[i])
+
+        return results
+
+    def _features(self, input_data: dict) -> np.ndarray:
+        # One reused (1, features) buffer per thread
+        row = getattr(self._local, "row", None)
+        if row is None:
+            row = self._local.row = np.empty((1, len(FEATURE_NAMES)), dtype=np.float64)
+        for j, name in enumerate(FEATURE_NAMES):
+            row[0, j] = input_data[name]
+        return row
+
+
+def _cache_key(features: np.ndarray) -> bytes:
+    # The trees compare features as float32, so rows that agree in float32 always
+    # get the same prediction; quantizing the key there keeps cached results exact
+    return features.astype(np.float32).tobytes()
+
+
+def _prepare_for_arrays(model):
+    """Let the forest take plain float64 arrays in FEATURE_NAMES order."""
+    fitted_names = getattr(model, "feature_names_in_", None)
+    if fitted_names is not None:
+        if list(fitted_names) != FEATURE_NAMES:
+            raise ValueError(f"Model features {list(fitted_names)} do not match FEATURE_NAMES")
+        # The notebook fit on a DataFrame. With the column order checked once here,
+        # dropping the names skips sklearn's per-call name check (and its warning)
+        del model.feature_names_in_
+    return model
+
+
+def resident_memory_mb() -> float:
+    """Resident memory of this process in MB (peak RSS where /proc is missing)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _format_result(prediction, probability, version: str = None) -> Prediction:
+    result = "complete" if prediction == 1 else "Skip"
+    prob_percent = round(float(probability) * 100, 1)
+
+    return Prediction(
+        prediction=result,
+        probability=round(float(probability), 3),
+        probability_percent=f"{prob_percent}%",
+        message=f"User will likely {result} the habit ({prob_percent}%)",
+        model_version=version,
+    )
@@ -0,0 +1,175 @@
+import random
+import re
+import threading
+from pathlib import Path
+from App.config import (
+    MODELS_DIR, MODEL_FILENAME, FLAT_MODEL_DIRNAME, MODEL_FORMAT,
+    ACTIVE_MODEL_VERSION, CANDIDATE_MODEL_VERSION, CANDIDATE_TRAFFIC_PERCENT, MODEL_WATCH_INTERVAL
+)
+from App.log import get_logger
+from App.model import HabitPredictor
+
+logger = get_logger(__name__)
+
+
+class ModelRegistry:
+    """Versioned habit models under Models/ with hot reload and canary routing.
+
+    Every Models/<version>/ folder that holds an artifact in MODEL_FORMAT is a
+    version. A new or changed artifact is loaded into a fresh HabitPredictor
+    off to the side and then swapped in with one assignment, so requests that
+    already picked the old predictor finish on it and nothing is dropped.
+    """
+
+    def __init__(
+        self,
+        models_dir: Path = MODELS_DIR,
+        model_format: str = MODEL_FORMAT,
+        active_version: str = ACTIVE_MODEL_VERSION,
+        candidate_version: str = CANDIDATE_MODEL_VERSION,
+        candidate_percent: float = CANDIDATE_TRAFFIC_PERCENT,
+        watch_interval: float = MODEL_WATCH_INTERVAL,
+    ):
+        self.models_dir = Path(models_dir)
+        self.model_format = model_format
+        self.pinned_version = active_version
+        self.candidate_version = candidate_version
+        self.candidate_percent = candidate_percent
+        self.watch_interval = watch_interval
+
+        self.active = None
+        self.candidate = None
+        self.reloads = 0
+        self.reload_errors = 0
+
+        self._stamps = {}                   # version -> artifact stamp it was loaded from
+        self._lock = threading.Lock()       # serializes loads and swaps, never taken by requests
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def artifact_path(self, version: str) -> Path:
+        name = FLAT_MODEL_DIRNAME if self.model_format == "flat" else MODEL_FILENAME
+        return self.models_dir / version / name
+
+    def versions(self) -> list[str]:
+        """Versions with an artifact in the configured format, oldest first."""
+        found = [
+            d.name for d in self.models_dir.iterdir()
+            if d.is_dir() and self.artifact_path(d.name).exists()
+        ]
+        return sorted(found, key=_natural_key)
+
+    def load(self):
+        """Load the active and candidate models at startup. Failures are fatal here."""
+        with self._lock:
+            self.active = self._load(self._wanted_active())
+            if self.candidate_version:
+                self.candidate = self._load(self.candidate_version)
+
+    def refresh(self) -> bool:
+        """Swap in new versions or changed artifacts. Returns True if anything changed.
+
+        A failed load (for example an artifact still being copied) keeps the
+        current model serving and is retried on the next refresh.
+        """
+        changed = False
+        with self._lock:
+            try:
+                wanted = self._wanted_active()
+                if self._is_stale(self.active, wanted):
+                    self.active = self._load(wanted)
+                    changed = True
+
+                if self.candidate_version and self._is_stale(self.candidate, self.candidate_version):
+                    self.candidate = self._load(self.candidate_version)
+                    changed = True
+            except Exception as e:
+                self.reload_errors += 1
+                logger.warning("Model reload failed, keeping current model: %s", e)
+
+        if changed:
+            self.reloads += 1
+        return changed
+
+    def route(self) -> HabitPredictor:
+        """The predictor for one request: the candidate for its traffic share, else the active one."""
+        active, candidate = self.active, self.candidate
+        if candidate is not None and random.random() * 100 < self.candidate_percent:
+            return candidate
+        if active is None:
+            raise ValueError("Model not loaded")
+        return active
+
+    def start_watching(self):
+        if self.watch_interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
+
+    def predictors(self) -> list[HabitPredictor]:
+        return [p for p in (self.active, self.candidate) if p is not None]
+
+    def status(self) -> dict:
+        return {
+            "active_version": self.active.version if self.active else None,
+            "candidate_version": self.candidate.version if self.candidate else None,
+            "candidate_traffic_percent": self.candidate_percent if self.candidate else 0.0,
+            "available_versions": self.versions(),
+            "hot_reload": self._watcher is not None,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+        }
+
+    def _watch(self):
+        while not self._stop.wait(self.watch_interval):
+            self.refresh()
+
+    def _wanted_active(self) -> str:
+        if self.pinned_version:
+            return self.pinned_version
+        versions = self.versions()
+        if not versions:
+            raise FileNotFoundError(f"No {self.model_format} model artifacts found under {self.models_dir}")
+        return versions[-1]
+
+    def _is_stale(self, predictor: HabitPredictor, version: str) -> bool:
+        if predictor is None or predictor.version != version:
+            return True
+        return self._stamp(version) != self._stamps.get(version)
+
+    def _stamp(self, version: str):
+        path = self.artifact_path(version)
+        if self.model_format == "flat":
+            path = path / "manifest.json"
+        stat = path.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load(self, version: str) -> HabitPredictor:
+        # Stamp first: if the file changes mid-load, the next refresh loads it again
+        stamp = self._stamp(version)
+        version_dir = self.models_dir / version
+        predictor = HabitPredictor(
+            model_format=self.model_format,
+            model_path=version_dir / MODEL_FILENAME,
+            flat_model_path=version_dir / FLAT_MODEL_DIRNAME,
+            version=version,
+        )
+        predictor.load_model()
+        self._stamps[version] = stamp
+        return predictor
+
+
+def _natural_key(name: str):
+    # Model_10 sorts after Model_9
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+# Global instance
+registry = ModelRegistry()
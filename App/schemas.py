@@ -1,5 +1,7 @@
+from dataclasses import dataclass
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, List, Optional
+from App.config import FORECAST_DAYS
 
 
 #Habit Model Input
@@ -37,6 +39,66 @@ class PredictionResponse(BaseModel):
     probability: float
     probability_percent: str
     message: str
+    model_version: Optional[str] = None
+
+
+#Habit Prediction as the App holds it: up to PREDICTION_CACHE_SIZE of these stay in
+#memory and go out as they are, so no dict per entry and nothing to copy on a hit
+@dataclass(slots=True, frozen=True)
+class Prediction:
+    prediction: str
+    probability: float
+    probability_percent: str
+    message: str
+    model_version: Optional[str] = None
+
+
+#Batch Prediction Input (rows are validated one by one in the route, so any row is accepted here)
+class BatchPredictionRequest(BaseModel):
+    rows: List[Any]
+
+
+#One Row of a Batch Prediction
+class BatchPredictionItem(BaseModel):
+    index: int
+    result: Optional[PredictionResponse] = None
+    error: Optional[str] = None
+
+
+#Batch Prediction Output
+class BatchPredictionResponse(BaseModel):
+    results: List[BatchPredictionItem]
+    predicted: int
+    failed: int
+
+
+#Prediction from Completion History Input: each habit is checked on its own. A habit is
+#{"habit_id", "start_date", "frequency", "completions": "0110..." or "completed_dates": [...], "as_of"}
+class HabitHistoryRequest(BaseModel):
+    habits: List[dict]
+    days: int = Field(1, ge=1, le=FORECAST_DAYS)     # days predicted, from as_of on
+
+
+#One Day of a Habit's Forecast: the features computed for it and their prediction
+class HabitDayForecast(BaseModel):
+    date: str
+    features: HabitInput
+    result: PredictionResponse
+
+
+#One Habit's History Prediction
+class HabitHistoryItem(BaseModel):
+    index: int
+    habit_id: Optional[str] = None
+    days: Optional[List[HabitDayForecast]] = None
+    error: Optional[str] = None
+
+
+#Prediction from Completion History Output
+class HabitHistoryResponse(BaseModel):
+    results: List[HabitHistoryItem]
+    predicted: int
+    failed: int
 
 
 #Journal Input
@@ -53,6 +115,16 @@ class SentimentResult(BaseModel):
     emotions : List[str]
 
 
+#Sentiment as the App holds it: up to SENTIMENT_CACHE_SIZE of these stay in memory and
+#go out as they are, like Prediction. Emotions are a tuple, so a hit needs no copy
+@dataclass(slots=True, frozen=True)
+class Sentiment:
+    sentiment: str
+    confidence: float
+    model_used: str
+    emotions: tuple
+
+
 #Journal Output
 class JournalResponse(BaseModel):
     text : str
@@ -92,6 +164,39 @@ class WeeklyInsightResponse(BaseModel):
     message: Optional[str] = None
 
 
+#Incremental Insight Input: the state from the last response plus only the days since
+class IncrementalInsightRequest(BaseModel):
+    logs: List[DailyLog] = []
+    state: Optional[str] = None
+    half_life_days: Optional[float] = Field(None, gt=0)    # fade old days out, None keeps them all
+
+
+#Incremental Insight Output: send `state` back with next week's days
+class IncrementalInsightResponse(WeeklyInsightResponse):
+    state: str
+
+
+#Bulk Insight Input: {"user_id": ..., "logs": [DailyLog, ...]} per user, each checked on its own
+class BulkInsightRequest(BaseModel):
+    users: List[dict]
+    time_series: bool = True        # next-day and recent patterns; off is several times faster
+
+
+#One User's Bulk Insight Result
+class BulkInsightItem(BaseModel):
+    index: int
+    user_id: Optional[str] = None
+    result: Optional[WeeklyInsightResponse] = None
+    error: Optional[str] = None
+
+
+#Bulk Insight Output
+class BulkInsightResponse(BaseModel):
+    results: List[BulkInsightItem]
+    analyzed: int
+    failed: int
+
+
 #Goal Generation Input
 class GoalGenerateRequest(BaseModel):
     goal_title: str
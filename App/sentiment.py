@@ -1,24 +1,204 @@
-from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
-from huggingface_hub import InferenceClient
-from App.config import HF_TOKEN, HF_MODEL, CONFIDENCE_THRESHOLS, ROBERTA_RETRIES, RETRY_DELAY
+from App.config import (
+    CONFIDENCE_THRESHOLS, RETRY_DELAY,
+    ROBERTA_TIMEOUT, ROBERTA_BACKOFF_MAX, ROBERTA_CONCURRENCY,
+    ROBERTA_BATCH_WINDOW_MS, ROBERTA_MAX_BATCH, HF_MODEL,
+    SENTIMENT_CACHE_SIZE, SENTIMENT_CACHE_TTL, SENTIMENT_CACHE_DB, SENTIMENT_DEADLINE,
+    CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_ERROR_RATE, CIRCUIT_SLOW_RATE,
+    CIRCUIT_OPEN_SECONDS, ROBERTA_SLOW_SECONDS
+)
+from App.circuit_breaker import CircuitBreaker, CircuitOpenError
+from App.log import get_logger
+from App.metrics import (
+    stage, SENTIMENT_RESULTS, ROBERTA_CALLS, ROBERTA_RETRIES,
+    ROBERTA_BATCH_SIZE, ROBERTA_BATCHED_TEXTS, ROBERTA_BATCH_WAIT,
+    ROBERTA_QUEUE_DEPTH, ROBERTA_BATCHES_IN_FLIGHT,
+)
+from App.sentiment_backends import get_backend
+from App.sentiment_cache import SentimentCache
+from App.schemas import Sentiment
+import asyncio
+import random
 import time
 import re
 
+logger = get_logger(__name__)
+
 LABEL_MAP = {
     "LABEL_0": "negative",
     "LABEL_1": "neutral",
     "LABEL_2": "positive"
 }
 
-#Initialize vader model
-vader = SentimentIntensityAnalyzer()
+#VADER model, built by get_vader() on first use (its lexicon takes a while to read)
+_vader = None
+
+#RoBERTa backend: Hugging Face API or a local CPU model (SENTIMENT_BACKEND)
+backend = get_backend()
+
+#Repeat texts skip VADER and RoBERTa; any config change below means a new key
+cache = SentimentCache(
+    SENTIMENT_CACHE_SIZE,
+    ttl=SENTIMENT_CACHE_TTL,
+    db_path=SENTIMENT_CACHE_DB,
+    config=f"{HF_MODEL}|{CONFIDENCE_THRESHOLS}|{backend.name}"
+)
+
+#Fails fast to vader-fallback while RoBERTa is erroring or slow
+roberta_breaker = CircuitBreaker(
+    "roberta",
+    window=CIRCUIT_WINDOW,
+    min_calls=CIRCUIT_MIN_CALLS,
+    error_rate=CIRCUIT_ERROR_RATE,
+    slow_call_seconds=ROBERTA_SLOW_SECONDS,
+    slow_rate=CIRCUIT_SLOW_RATE,
+    open_seconds=CIRCUIT_OPEN_SECONDS,
+    probe_timeout=SENTIMENT_DEADLINE
+)
+
+#Caps in-flight RoBERTa calls per worker so a slow API can't pile up requests
+roberta_slots = asyncio.Semaphore(ROBERTA_CONCURRENCY)
+
+
+class RobertaBatcher:
+    """Coalesces concurrent RoBERTa calls into one batched classification.
+
+    Callers queue a text and wait on a future. The queue is flushed when it
+    reaches `max_batch` texts or `window_ms` after the first text arrived,
+    whichever comes first, and each batch call takes one `roberta_slots` slot.
+    With a `breaker`, each batch call is one call through it: one outcome is
+    recorded however many texts it carried, and CircuitOpenError goes to
+    every caller in the batch when the breaker refuses it.
+    """
+
+    def __init__(self, backend, window_ms: float, max_batch: int, breaker: CircuitBreaker = None):
+        self.backend = backend
+        self.breaker = breaker
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._pending = []          # (text, future, queued_at)
+        self._timer = None
+        # The loop only keeps weak references to tasks; an in-flight batch must not be collected
+        self._tasks = set()
+
+        self.batches = 0
+        self.texts = 0
+        self.max_queue_depth = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        # Batch size histogram, bucketed by upper bound (1, 2, 4, ... max_batch)
+        self.batch_sizes = {}
+
+    async def classify(self, text: str):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+        self.max_queue_depth = max(self.max_queue_depth, len(self._pending))
+        ROBERTA_QUEUE_DEPTH.set(len(self._pending))
+
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Callers that already timed out don't need a slot in the batch
+        pending = [item for item in self._pending if not item[1].done()]
+        batch, self._pending = pending[:self.max_batch], pending[self.max_batch:]
+        ROBERTA_QUEUE_DEPTH.set(len(self._pending))
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            ROBERTA_BATCHES_IN_FLIGHT.set(len(self._tasks))
+            task.add_done_callback(self._finished)
+
+    def _finished(self, task):
+        self._tasks.discard(task)
+        ROBERTA_BATCHES_IN_FLIGHT.set(len(self._tasks))
+        if not task.cancelled() and task.exception() is not None:
+            logger.error("RoBERTa batch failed outside the call", exc_info=task.exception())
+
+    async def _run(self, batch):
+        try:
+            now = time.perf_counter()
+            waits = [now - queued_at for _, _, queued_at in batch]
+            self._record(len(batch), waits)
+            texts = [text for text, _, _ in batch]
+            async with roberta_slots:
+                if self.breaker is not None:
+                    results = await self.breaker.call_async(self.backend.classify_batch_async, texts)
+                else:
+                    results = await self.backend.classify_batch_async(texts)
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except asyncio.CancelledError:
+            # Shutdown cancelled the batch: its callers must not wait forever
+            for _, future, _ in batch:
+                future.cancel()
+            raise
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def _record(self, size: int, waits: list):
+        self.batches += 1
+        self.texts += size
+        self.wait_seconds_total += sum(waits)
+        self.wait_seconds_max = max(self.wait_seconds_max, max(waits))
+        bucket = 1
+        while bucket < size:
+            bucket *= 2
+        self.batch_sizes[bucket] = self.batch_sizes.get(bucket, 0) + 1
+        ROBERTA_BATCH_SIZE.observe(size)
+        ROBERTA_BATCHED_TEXTS.inc(amount=size)
+        ROBERTA_BATCH_WAIT.inc(amount=sum(waits))
+
+    def stats(self) -> dict:
+        return {
+            "window_ms": self.window * 1000,
+            "max_batch": self.max_batch,
+            "queue_depth": len(self._pending),
+            "batches_in_flight": len(self._tasks),
+            "max_queue_depth": self.max_queue_depth,
+            "batches": self.batches,
+            "texts": self.texts,
+            "avg_batch_size": round(self.texts / self.batches, 2) if self.batches else 0.0,
+            "batch_size_histogram": {f"<={k}": v for k, v in sorted(self.batch_sizes.items())},
+            "avg_added_wait_ms": round(self.wait_seconds_total / self.texts * 1000, 3) if self.texts else 0.0,
+            "max_added_wait_ms": round(self.wait_seconds_max * 1000, 3),
+        }
 
-#Initialize Hugging Face Client Details
-client = InferenceClient(provider = "hf-inference", api_key = HF_TOKEN)
 
+batcher = (
+    RobertaBatcher(backend, ROBERTA_BATCH_WINDOW_MS, ROBERTA_MAX_BATCH, breaker=roberta_breaker)
+    if ROBERTA_BATCH_WINDOW_MS > 0 else None
+)
+
+
+def get_vader():
+    global _vader
+    if _vader is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _vader = SentimentIntensityAnalyzer()
+    return _vader
+
+def load():
+    """Warm VADER and the RoBERTa backend, so the first request doesn't pay for them."""
+    get_vader()
+    backend.load()
 
 def vader_sentiment(text:str):
-    scores = vader.polarity_scores(text)
+    scores = get_vader().polarity_scores(text)
     compound = scores["compound"]
     confidence = abs(compound)
 
@@ -30,124 +210,276 @@ def vader_sentiment(text:str):
         label = "neutral"
     return label, confidence
 
-def roberta_sentiment(text:str):
-    for attempt in range(1, ROBERTA_RETRIES + 1):
+def parse_roberta(result):
+    if not isinstance(result, list) or len(result) == 0:
+        logger.warning("Unexpected RoBERTa response: %r", result)
+        return "error", 0.0
+
+    preds = result if isinstance(result[0], dict) else result[0]
+    top  = max(preds, key = lambda x:x.get("score", 0.0))
+
+    raw_label = top.get("label", "")
+    score = top.get("score", 0.0)
+    final_label = LABEL_MAP.get(raw_label, raw_label)
+
+    logger.debug("RoBERTa -> %s (%.2f)", final_label, score)
+    return final_label, score
+
+def roberta_sentiment(text:str, deadline: float = None):
+    deadline = deadline or time.monotonic() + SENTIMENT_DEADLINE
+    for attempt in range(1, backend.retries + 1):
+        if not roberta_breaker.allow():
+            ROBERTA_CALLS.inc("short_circuited")
+            logger.debug("RoBERTa circuit %s, skipping the call", roberta_breaker.state)
+            break
+        start = time.monotonic()
         try:
-            result = client.text_classification(text, model=HF_MODEL)
-            if not isinstance(result, list) or len(result) == 0:
-                print(f"Unexpected RoBERTa Respose: {result}")
-                return "error", 0.0
-            
-            preds = result if isinstance(result[0], dict) else result[0]
-            top  = max(preds, key = lambda x:x.get("score", 0.0))
-
-            raw_label = top.get("label", "")
-            score = top.get("score", 0.0)
-            final_label = LABEL_MAP.get(raw_label, raw_label)
-
-            print(f"RoBERTa -> {final_label} ({score:.2f})")
-            return final_label, score
+            with stage("roberta"):
+                result = backend.classify(text)
+            roberta_breaker.record_success(time.monotonic() - start)
+            ROBERTA_CALLS.inc("ok")
+            return parse_roberta(result)
         
         except Exception as e:
-            print(f"RoBERTa API error (attempt {attempt} / {ROBERTA_RETRIES}): {e}")
-            if attempt < ROBERTA_RETRIES:
+            roberta_breaker.record_failure()
+            ROBERTA_CALLS.inc("error")
+            logger.warning("RoBERTa %s error (attempt %d / %d): %s", backend.name, attempt, backend.retries, e)
+            # No retry that would end past the deadline
+            if attempt < backend.retries and time.monotonic() + RETRY_DELAY < deadline:
+                ROBERTA_RETRIES.inc()
                 time.sleep(RETRY_DELAY)
+            else:
+                break
 
     return "error", 0.0    
-    
+
+async def roberta_sentiment_async(text:str, deadline: float = None):
+    loop = asyncio.get_running_loop()
+    deadline = deadline or loop.time() + SENTIMENT_DEADLINE
+    for attempt in range(1, backend.retries + 1):
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        # A batched text shares its upstream call with others, so the batcher asks the
+        # breaker and records the outcome once per call; here it only skips the queue
+        # while the breaker is open
+        if roberta_breaker.rejects() if batcher is not None else not roberta_breaker.allow():
+            ROBERTA_CALLS.inc("short_circuited")
+            logger.debug("RoBERTa circuit %s, skipping the call", roberta_breaker.state)
+            break
+        start = loop.time()
+        try:
+            timeout = min(ROBERTA_TIMEOUT, remaining)
+            with stage("roberta"):
+                if batcher is not None:
+                    result = await asyncio.wait_for(batcher.classify(text), timeout=timeout)
+                else:
+                    # Only the call itself holds a slot, not the backoff sleep
+                    async with roberta_slots:
+                        result = await asyncio.wait_for(backend.classify_async(text), timeout=timeout)
+                    roberta_breaker.record_success(loop.time() - start)
+            ROBERTA_CALLS.inc("ok")
+            return parse_roberta(result)
+
+        except CircuitOpenError:
+            # The batch this text joined was refused (half-open with its probe already out)
+            ROBERTA_CALLS.inc("short_circuited")
+            break
+        except asyncio.CancelledError:
+            # As in CircuitBreaker.call_async: an allowed call must be recorded, or a
+            # cancelled half-open probe would hold the only probe slot
+            if batcher is None:
+                roberta_breaker.record_failure()
+            raise
+        except Exception as e:
+            if batcher is None:
+                roberta_breaker.record_failure()
+            ROBERTA_CALLS.inc("error")
+            logger.warning("RoBERTa %s error (attempt %d / %d): %r", backend.name, attempt, backend.retries, e)
+            if attempt < backend.retries:
+                delay = backoff_delay(attempt)
+                if loop.time() + delay >= deadline:
+                    break
+                ROBERTA_RETRIES.inc()
+                await asyncio.sleep(delay)
+
+    return "error", 0.0
+
+def backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter so retries from many requests spread out
+    return random.uniform(0, min(ROBERTA_BACKOFF_MAX, RETRY_DELAY * 2 ** (attempt - 1)))
+
 def analyze(text: str):
-    vader_label, vader_conf = vader_sentiment(text)
-    print(f"Vader -> {vader_label},{vader_conf:.2f}")
+    cached = cache.get(text)
+    if cached is not None:
+        SENTIMENT_RESULTS.inc("cache")
+        return cached
+
+    result = _analyze(text)
+    cache.set(text, result)
+    return result
+
+def _analyze(text: str):
+    # The route's end-to-end budget starts before VADER
+    deadline = time.monotonic() + SENTIMENT_DEADLINE
+    with stage("vader"):
+        vader_label, vader_conf = vader_sentiment(text)
+    logger.debug("VADER -> %s (%.2f)", vader_label, vader_conf)
     
     if vader_conf >= CONFIDENCE_THRESHOLS:
-        return {
-            "sentiment": vader_label,  # ← Fixed typo
-            "confidence": vader_conf,
-            "model_used": "vader",
-            "emotions": get_emotions(text, vader_label)
-        }
+        return build_result(text, vader_label, vader_conf, "vader")
     
-    print(f"VADER uncertain -> Calling RoBERTa API...")
-    rob_label, rob_conf = roberta_sentiment(text)
+    logger.debug("VADER uncertain -> calling RoBERTa (%s)", backend.name)
+    rob_label, rob_conf = roberta_sentiment(text, deadline)
     
     if rob_label == "error":  # ← Fixed: check label not conf
-         return {
-            "sentiment": vader_label,
-            "confidence": vader_conf,
-            "model_used": "vader-fallback",
-            "emotions": get_emotions(text, vader_label)
-        }
+        return build_result(text, vader_label, vader_conf, "vader-fallback")
     
-    return {
-        "sentiment": rob_label,
-        "confidence": rob_conf,
-        "model_used": "roberta",
-        "emotions": get_emotions(text, rob_label)
-    }
+    return build_result(text, rob_label, rob_conf, "roberta")
+
+async def analyze_async(text: str):
+    """Same as analyze, but waits on RoBERTa and the cache's SQLite file without holding the event loop."""
+    cached = await cache.get_async(text)
+    if cached is not None:
+        SENTIMENT_RESULTS.inc("cache")
+        return cached
+
+    result = await _analyze_async(text)
+    cache.set_async(text, result)
+    return result
+
+async def _analyze_async(text: str):
+    # VADER and the emotion scan are CPU work that grows with the text (seconds for a
+    # long entry), so they run on a thread; only the RoBERTa wait stays on the loop
+    deadline = asyncio.get_running_loop().time() + SENTIMENT_DEADLINE
+    vader_label, vader_conf, result = await asyncio.to_thread(_vader_pass, text)
+    if result is not None:
+        return result
+
+    logger.debug("VADER uncertain -> calling RoBERTa (%s)", backend.name)
+    rob_label, rob_conf = await roberta_sentiment_async(text, deadline)
+
+    if rob_label == "error":
+        return await asyncio.to_thread(build_result, text, vader_label, vader_conf, "vader-fallback")
+
+    return await asyncio.to_thread(build_result, text, rob_label, rob_conf, "roberta")
+
+def _vader_pass(text: str):
+    # VADER's label and confidence, and the finished result when it is confident enough
+    with stage("vader"):
+        vader_label, vader_conf = vader_sentiment(text)
+    logger.debug("VADER -> %s (%.2f)", vader_label, vader_conf)
+    if vader_conf >= CONFIDENCE_THRESHOLS:
+        return vader_label, vader_conf, build_result(text, vader_label, vader_conf, "vader")
+    return vader_label, vader_conf, None
+
+def build_result(text: str, label: str, confidence: float, model_used: str):
+    SENTIMENT_RESULTS.inc(model_used)
+    with stage("emotions"):
+        emotions = get_emotions(text, label)
+    return Sentiment(label, confidence, model_used, tuple(emotions))
 
 def get_emotions(text: str, sentiment: str):
-    text_lower = text.lower()
-    emotions = []
-
-    # Tokenize text into proper words (avoids partial matching issues)
-    words = set(re.findall(r'\b\w+\b', text_lower))
-
-    emotion_keywords = {
-
-        "positive": {
-
-            "happy": [
-                "happy", "joy", "joyful", "cheerful", "glad",
-                "delighted", "content", "pleased", "smiling",
-                "bliss", "great", "awesome", "good"
-            ],
-
-            "calm": [
-                "calm", "relaxed", "peaceful", "comfortable",
-                "chill", "serene", "balanced", "stable",
-                "quiet", "easy"
-            ],
-
-            "excited": [
-                "excited", "thrilled", "pumped", "enthusiastic",
-                "eager", "hyped", "ecstatic", "overjoyed",
-                "energetic"
-            ]
-        },
-
-        "negative": {
-
-            "sad": [
-                "sad", "unhappy", "down", "depressed",
-                "low", "heartbroken", "lonely",
-                "miserable", "hopeless", "crying"
-            ],
-
-            "frustrated": [
-                "frustrated", "angry", "irritated",
-                "annoyed", "fed up", "mad",
-                "resentful", "upset"
-            ],
-
-            "anxious": [
-                "anxious", "worried", "stress",
-                "stressed", "nervous", "tense",
-                "panic", "afraid", "overthinking",
-                "restless"
-            ]
-        }
-    }
+    matcher = EMOTION_MATCHERS.get(sentiment)
 
     # If sentiment is not positive or negative
-    if sentiment not in emotion_keywords:
+    if matcher is None:
         return ["neutral"]
 
-    # Check emotions
-    for emotion, keyword_list in emotion_keywords[sentiment].items():
-        for keyword in keyword_list:
-            if keyword in words:
-                emotions.append(emotion)
-                break  # stop checking once matched
+    # One scan over the text; stop as soon as every emotion has matched
+    pattern, emotion_of, order = matcher
+    found = set()
+    for match in pattern.finditer(text.lower()):
+        found.add(emotion_of[" ".join(match.group().split())])
+        if len(found) == len(order):
+            break
 
+    emotions = [emotion for emotion in order if emotion in found]
     return emotions if emotions else ["neutral"]
 
+def get_emotions_many(texts: list[str], sentiments: list[str]) -> list[list[str]]:
+    """get_emotions for a batch of texts, one sentiment per text."""
+    return [get_emotions(text, sentiment) for text, sentiment in zip(texts, sentiments)]
+
+EMOTION_KEYWORDS = {
+
+    "positive": {
+
+        "happy": [
+            "happy", "joy", "joyful", "cheerful", "glad",
+            "delighted", "content", "pleased", "smiling",
+            "bliss", "great", "awesome", "good"
+        ],
+
+        "calm": [
+            "calm", "relaxed", "peaceful", "comfortable",
+            "chill", "serene", "balanced", "stable",
+            "quiet", "easy"
+        ],
+
+        "excited": [
+            "excited", "thrilled", "pumped", "enthusiastic",
+            "eager", "hyped", "ecstatic", "overjoyed",
+            "energetic"
+        ]
+    },
+
+    "negative": {
+
+        "sad": [
+            "sad", "unhappy", "down", "depressed",
+            "low", "heartbroken", "lonely",
+            "miserable", "hopeless", "crying"
+        ],
+
+        "frustrated": [
+            "frustrated", "angry", "irritated",
+            "annoyed", "fed up", "mad",
+            "resentful", "upset"
+        ],
+
+        "anxious": [
+            "anxious", "worried", "stress",
+            "stressed", "nervous", "tense",
+            "panic", "afraid", "overthinking",
+            "restless"
+        ]
+    }
+}
+
+def _keyword_pattern(keywords) -> re.Pattern:
+    """Whole-word regex for the keywords, factored into a character trie.
+
+    Python's re tries alternatives one by one, so a flat "a|b|c" re-tests
+    every keyword at every position; sharing prefixes means each position
+    costs one walk down the trie. A space in a phrase matches any whitespace.
+    """
+    trie = {}
+    for keyword in keywords:
+        node = trie
+        for ch in keyword:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node):
+        branches = [
+            (r"\s+" if ch == " " else re.escape(ch)) + build(child)
+            for ch, child in sorted(node.items()) if ch
+        ]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A keyword can end here, so the rest of the branch is optional
+        return f"(?:{body})?" if "" in node else body
+
+    return re.compile(r"\b" + build(trie) + r"\b")
+
+#Built once at import: sentiment -> (pattern, keyword -> emotion, emotion order)
+EMOTION_MATCHERS = {
+    sentiment: (
+        _keyword_pattern(kw for kws in by_emotion.values() for kw in kws),
+        {kw: emotion for emotion, kws in by_emotion.items() for kw in kws},
+        list(by_emotion)
+    )
+    for sentiment, by_emotion in EMOTION_KEYWORDS.items()
+}
@@ -0,0 +1,240 @@
+import asyncio
+import json
+import threading
+from pathlib import Path
+import numpy as np
+from App.config import (
+    HF_TOKEN, HF_MODEL, HF_INFERENCE_URL, ROBERTA_TIMEOUT, ROBERTA_RETRIES,
+    SENTIMENT_BACKEND, LOCAL_SENTIMENT_MODEL_DIR, LOCAL_SENTIMENT_RUNTIME,
+    LOCAL_SENTIMENT_THREADS, LOCAL_SENTIMENT_MAX_LENGTH
+)
+from App.log import get_logger
+
+logger = get_logger(__name__)
+
+# Both backends return the Hugging Face text_classification shape:
+# a list of {"label": ..., "score": ...}, one per class (classify_batch_async
+# returns one such list per text). sentiment.parse_roberta maps labels through
+# LABEL_MAP, so callers see the same contract either way.
+
+
+class HFApiBackend:
+    """RoBERTa through the Hugging Face inference API."""
+
+    name = "huggingface_api"
+    retries = ROBERTA_RETRIES
+
+    def __init__(self, model: str = HF_MODEL):
+        self.model = model
+        # Passed to the clients as the model, so HF_INFERENCE_URL moves single calls too
+        self.url = f"{HF_INFERENCE_URL}/{model}"
+        self.client = None
+        self.async_client = None
+        self.http = None
+
+    def load(self):
+        # huggingface_hub and httpx take a few hundred ms to import, so the
+        # clients are built at startup or on first use rather than at import
+        if self.client is not None:
+            return
+        import httpx
+        from huggingface_hub import InferenceClient, AsyncInferenceClient
+        self.client = InferenceClient(provider = "hf-inference", api_key = HF_TOKEN, timeout = ROBERTA_TIMEOUT)
+        self.async_client = AsyncInferenceClient(provider = "hf-inference", api_key = HF_TOKEN, timeout = ROBERTA_TIMEOUT)
+        # InferenceClient.text_classification takes one text; batches go to the endpoint directly
+        self.http = httpx.AsyncClient(
+            timeout = ROBERTA_TIMEOUT,
+            headers = {"Authorization": f"Bearer {HF_TOKEN}"}
+        )
+
+    def classify(self, text: str):
+        self.load()
+        return self.client.text_classification(text, model=self.url)
+
+    async def classify_async(self, text: str):
+        self.load()
+        return await self.async_client.text_classification(text, model=self.url)
+
+    async def classify_batch_async(self, texts: list[str]):
+        self.load()
+        response = await self.http.post(self.url, json={"inputs": texts})
+        response.raise_for_status()
+        results = response.json()
+        if not isinstance(results, list) or len(results) != len(texts):
+            raise ValueError(f"Expected {len(texts)} results from the batch call, got: {results}")
+        # Some deployments answer with only the top label per text
+        return [preds if isinstance(preds, list) else [preds] for preds in results]
+
+
+class LocalRobertaBackend:
+    """RoBERTa run on CPU in-process from a model directory on disk.
+
+    The directory holds a Hugging Face checkpoint of HF_MODEL (or a distilled
+    variant with the same labels), plus optionally `model.onnx` /
+    `model_quantized.onnx`. Runtime "auto" prefers a quantized ONNX graph,
+    then plain ONNX, then PyTorch. torch/transformers/onnxruntime are only
+    needed when this backend is selected.
+    """
+
+    name = "local"
+    # A local failure will not fix itself on retry
+    retries = 1
+
+    def __init__(self, model_dir: Path = LOCAL_SENTIMENT_MODEL_DIR, runtime: str = LOCAL_SENTIMENT_RUNTIME):
+        self.model_dir = Path(model_dir)
+        self.runtime = runtime
+        self.tokenizer = None
+        self.labels = None
+        self._session = None
+        self._model = None
+        # Fast tokenizers and the session are shared; one forward pass at a time
+        # per worker, each using LOCAL_SENTIMENT_THREADS cores
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self.tokenizer is not None:
+            return
+        if not self.model_dir.exists():
+            raise FileNotFoundError(
+                f"Local sentiment model not found at {self.model_dir}. "
+                f"Run `python -m App.sentiment_backends download` first."
+            )
+
+        from transformers import AutoTokenizer
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+        config = json.loads((self.model_dir / "config.json").read_text())
+        id2label = {int(i): label for i, label in config["id2label"].items()}
+        self.labels = [id2label[i] for i in range(len(id2label))]
+
+        runtime = self.runtime
+        onnx_file = self._onnx_file()
+        if runtime == "auto":
+            runtime = "onnx" if onnx_file else "torch"
+
+        if runtime == "onnx":
+            import onnxruntime as ort
+            if onnx_file is None:
+                raise FileNotFoundError(f"No model.onnx or model_quantized.onnx in {self.model_dir}")
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = LOCAL_SENTIMENT_THREADS
+            self._session = ort.InferenceSession(str(onnx_file), options, providers=["CPUExecutionProvider"])
+        else:
+            import torch
+            from transformers import AutoModelForSequenceClassification
+            torch.set_num_threads(LOCAL_SENTIMENT_THREADS)
+            self._model = AutoModelForSequenceClassification.from_pretrained(self.model_dir).eval()
+
+        self.runtime = runtime
+        logger.info("Local sentiment model loaded from %s (%s)", self.model_dir, runtime)
+
+    def classify(self, text: str):
+        return self.classify_batch([text])[0]
+
+    def classify_batch(self, texts: list[str]):
+        self.load()
+        with self._lock:
+            if self._session is not None:
+                encoded = self.tokenizer(
+                    texts, padding=True, truncation=True,
+                    max_length=LOCAL_SENTIMENT_MAX_LENGTH, return_tensors="np"
+                )
+                wanted = {i.name for i in self._session.get_inputs()}
+                feeds = {k: v.astype(np.int64) for k, v in encoded.items() if k in wanted}
+                logits = self._session.run(None, feeds)[0]
+            else:
+                import torch
+                encoded = self.tokenizer(
+                    texts, padding=True, truncation=True,
+                    max_length=LOCAL_SENTIMENT_MAX_LENGTH, return_tensors="pt"
+                )
+                with torch.inference_mode():
+                    logits = self._model(**encoded).logits.numpy()
+
+        scores = _softmax(logits)
+        return [
+            [{"label": label, "score": float(score)} for label, score in zip(self.labels, row)]
+            for row in scores
+        ]
+
+    async def classify_async(self, text: str):
+        # CPU-bound: keep it off the event loop
+        return await asyncio.to_thread(self.classify, text)
+
+    async def classify_batch_async(self, texts: list[str]):
+        return await asyncio.to_thread(self.classify_batch, texts)
+
+    def _onnx_file(self):
+        for name in ("model_quantized.onnx", "model.onnx"):
+            if (self.model_dir / name).exists():
+                return self.model_dir / name
+        return None
+
+
+BACKENDS = {
+    "hf_api": HFApiBackend,
+    "local": LocalRobertaBackend,
+}
+
+
+def get_backend(name: str = SENTIMENT_BACKEND):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend '{name}', use one of {tuple(BACKENDS)}")
+    return BACKENDS[name]()
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    shifted = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def download(model_dir: Path = LOCAL_SENTIMENT_MODEL_DIR, model: str = HF_MODEL):
+    from huggingface_hub import snapshot_download
+    snapshot_download(
+        model, local_dir=model_dir, token=HF_TOKEN,
+        allow_patterns=["*.json", "*.txt", "*.safetensors", "pytorch_model.bin"],
+    )
+    print(f"{model} downloaded to {model_dir}")
+
+
+def export_onnx(model_dir: Path = LOCAL_SENTIMENT_MODEL_DIR, quantize: bool = True):
+    """Export the checkpoint to model.onnx and, by default, a dynamic int8 model_quantized.onnx."""
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    model_dir = Path(model_dir)
+    tokenizer = AutoTokenizer.from_pretrained(model_dir)
+    model = AutoModelForSequenceClassification.from_pretrained(model_dir).eval()
+    sample = tokenizer(["export sample"], return_tensors="pt")
+
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        model_dir / "model.onnx",
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+        },
+        opset_version=17,
+    )
+    print(f"ONNX model written to {model_dir / 'model.onnx'}")
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+        quantize_dynamic(model_dir / "model.onnx", model_dir / "model_quantized.onnx", weight_type=QuantType.QInt8)
+        print(f"int8 model written to {model_dir / 'model_quantized.onnx'}")
+
+
+if __name__ == "__main__":
+    # python -m App.sentiment_backends download | export-onnx [--no-quantize]
+    import sys
+    command = sys.argv[1] if len(sys.argv) > 1 else "download"
+    if command == "download":
+        download()
+    elif command == "export-onnx":
+        export_onnx(quantize="--no-quantize" not in sys.argv)
+    else:
+        raise SystemExit(f"Unknown command '{command}', use download or export-onnx")
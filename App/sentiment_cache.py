@@ -0,0 +1,179 @@
+import asyncio
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from App.cache import LRUCache
+from App.log import get_logger
+from App.schemas import Sentiment
+
+logger = get_logger(__name__)
+
+
+class SentimentCache:
+    """Sentiment results keyed on the journal text and the config that produced them.
+
+    A bounded in-memory LRU sits in front of an optional SQLite file, so warm
+    results survive a restart and are shared by the workers on one host.
+    Keys hash the normalized text together with `config` (model, threshold,
+    backend), so changing any of those starts from a cold cache.
+
+    The async routes use get_async/set_async: the LRU is checked on the
+    event loop, a SQLite read runs on a thread, and writes are queued to a
+    single writer thread that the response never waits for.
+
+    The SQLite connection is opened on first use in each process. Under
+    gunicorn the App is imported in the master, and a connection made
+    there must not be shared by the workers it forks.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = None, db_path: Path = None, config: str = ""):
+        self.memory = LRUCache(maxsize, ttl=ttl)
+        self.ttl = ttl
+        self.config = config
+        self.db_path = Path(db_path) if db_path else None
+        self.disk_hits = 0
+        self.api_calls_saved = 0
+
+        self._db = None
+        self._db_pid = None
+        self._lock = threading.Lock()
+        self._writer = None
+        if self.db_path is not None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory.maxsize > 0
+
+    def key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.config}\0{normalize(text)}".encode()).hexdigest()
+
+    def get(self, text: str):
+        if not self.enabled:
+            return None
+        key = self.key(text)
+        result = self.memory.get(key)
+        if result is None and self.db_path is not None:
+            result = self._disk_hit(key, self._disk_get(key))
+        return self._served(result)
+
+    async def get_async(self, text: str):
+        """get() without a SQLite read on the event loop."""
+        if not self.enabled:
+            return None
+        key = self.key(text)
+        result = self.memory.get(key)
+        if result is None and self.db_path is not None:
+            result = self._disk_hit(key, await asyncio.to_thread(self._disk_get, key))
+        return self._served(result)
+
+    def set(self, text: str, result: Sentiment):
+        key, result = self._remember(text, result)
+        if key is not None and self.db_path is not None:
+            self._disk_set(key, result)
+
+    def set_async(self, text: str, result: Sentiment):
+        """set() that queues the SQLite write instead of committing it on the event loop."""
+        key, result = self._remember(text, result)
+        if key is not None and self.db_path is not None:
+            if self._writer is None:
+                # One thread, so writes commit in order and never wait on each other for the lock
+                self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sentiment-cache")
+            self._writer.submit(self._disk_set, key, result)
+
+    def flush(self):
+        """Wait for queued writes to commit. Called on shutdown."""
+        if self._writer is not None:
+            self._writer.shutdown(wait=True)
+            self._writer = None
+
+    def clear(self):
+        self.memory.clear()
+        if self.db_path is not None:
+            with self._lock:
+                self._connection().execute("DELETE FROM sentiment")
+
+    def stats(self) -> dict:
+        stats = self.memory.stats()
+        # A disk hit is a memory miss that still skipped the work
+        stats["hits"] += self.disk_hits
+        stats["misses"] -= self.disk_hits
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        stats["disk_hits"] = self.disk_hits
+        stats["disk_path"] = str(self.db_path) if self.db_path else None
+        stats["api_calls_saved"] = self.api_calls_saved
+        return stats
+
+    def _remember(self, text: str, result: Sentiment):
+        # A fallback result is what we answer while RoBERTa is down, not the answer
+        if not self.enabled or result.model_used == "vader-fallback":
+            return None, None
+        key = self.key(text)
+        self.memory.set(key, result)
+        return key, result
+
+    def _served(self, result):
+        if result is not None and result.model_used == "roberta":
+            self.api_calls_saved += 1
+        return result
+
+    def _disk_hit(self, key: str, result):
+        if result is not None:
+            self.disk_hits += 1
+            self.memory.set(key, result)
+        return result
+
+    def _disk_set(self, key: str, result: Sentiment):
+        expires_at = time.time() + self.ttl if self.ttl else None
+        try:
+            with self._lock:
+                self._connection().execute(
+                    "INSERT OR REPLACE INTO sentiment (key, result, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(dataclasses.asdict(result)), expires_at)
+                )
+        except sqlite3.Error as e:
+            # The memory tier has it; a missed disk write only costs a later recompute
+            logger.warning("Sentiment cache write failed: %s", e)
+
+    def _disk_get(self, key: str):
+        try:
+            with self._lock:
+                db = self._connection()
+                row = db.execute("SELECT result, expires_at FROM sentiment WHERE key = ?", (key,)).fetchone()
+                if row is None:
+                    return None
+                result, expires_at = row
+                if expires_at is not None and expires_at <= time.time():
+                    db.execute("DELETE FROM sentiment WHERE key = ?", (key,))
+                    return None
+        except sqlite3.Error as e:
+            # Answered as a miss: the text is analyzed again
+            logger.warning("Sentiment cache read failed: %s", e)
+            return None
+        result = json.loads(result)
+        return Sentiment(result["sentiment"], result["confidence"], result["model_used"], tuple(result["emotions"]))
+
+    def _connection(self) -> sqlite3.Connection:
+        # Called under self._lock. A new process (a forked worker) opens its own
+        if self._db_pid != os.getpid():
+            db = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS sentiment ("
+                "key TEXT PRIMARY KEY, result TEXT NOT NULL, expires_at REAL)"
+            )
+            self._db, self._db_pid = db, os.getpid()
+        return self._db
+
+
+def normalize(text: str) -> str:
+    # Case and punctuation stay: VADER scores "GREAT!!" higher than "great"
+    return " ".join(unicodedata.normalize("NFC", text).split())
@@ -0,0 +1,179 @@
+"""Multi-process serving: worker sizing, the gunicorn master's preload, and the CPU pool.
+
+Under gunicorn (see gunicorn.conf.py) the master imports the App and loads
+the models and VADER once, then forks the web workers, which share those
+pages copy-on-write. Each worker keeps I/O-bound routes on its event loop
+and, with CPU_POOL_WORKERS > 0, hands the CPU-bound ones to a small
+process pool of its own, so the forest and the correlation math never
+hold the worker's GIL while it has upstream calls to serve. Large bulk
+insights requests share that pool rather than forking a second one.
+"""
+import asyncio
+import gc
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from starlette.concurrency import run_in_threadpool
+from App.config import CPU_POOL_WORKERS, INSIGHTS_WORKERS, WEB_CONCURRENCY
+from App.insight_engine import generate_insights, generate_insights_packed, pack_logs
+from App.log import get_logger
+from App.metrics import STAGE_SECONDS
+from App.registry import registry
+from App import sentiment
+
+logger = get_logger(__name__)
+
+_pool = None
+_slots = None
+
+
+def cpu_count() -> int:
+    """CPUs this process may use: its affinity mask, capped by a cgroup CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpu_quota()
+    return max(1, min(cpus, math.ceil(quota))) if quota else cpus
+
+
+def _cgroup_cpu_quota():
+    # Containers see every host CPU in os.cpu_count(); the quota is what they get to use.
+    # cgroup v2 writes "<quota> <period>" or "max <period>", v1 a quota of -1 when unlimited
+    try:
+        quota, period = Path("/sys/fs/cgroup/cpu.max").read_text().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        pass
+    try:
+        quota = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read_text())
+        period = int(Path("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read_text())
+        return quota / period if quota > 0 else None
+    except (OSError, ValueError):
+        return None
+
+
+def web_workers(cpus: int = None) -> int:
+    """WEB_CONCURRENCY if set, else one worker per usable CPU.
+
+    Only CPU work needs a core, and a worker's CPU work is serialized by
+    its GIL, so more workers than cores only adds memory.
+    """
+    return WEB_CONCURRENCY if WEB_CONCURRENCY > 0 else (cpus or cpu_count())
+
+
+def preload():
+    """Load everything read-only that workers would otherwise each load, then freeze it.
+
+    Runs in the gunicorn master before the fork. gc.freeze() moves these
+    objects out of the collector's reach, so collections in the workers
+    don't write to their pages and break the sharing. HTTP clients,
+    threads, the process pool and the sentiment cache's SQLite connection
+    are made in each worker, by its lifespan or on first use: none of them
+    can be shared across a fork, so the master makes none.
+    """
+    registry.load()
+    sentiment.get_vader()
+    gc.collect()
+    gc.freeze()
+
+
+def start_cpu_pool():
+    """Fork this worker's CPU pool and return it, or None when CPU_POOL_WORKERS is 0.
+
+    Called from the lifespan before any thread starts: an executor starts
+    its manager thread right after forking its processes, so this is the
+    worker's only fork. It has enough processes for INSIGHTS_WORKERS too,
+    and the lifespan hands it to insight_engine.start_pool() for bulk
+    requests. /v1/predict and /v1/insights_weekly still keep at most
+    2 × CPU_POOL_WORKERS tasks on it.
+    """
+    global _pool, _slots
+    if CPU_POOL_WORKERS <= 0 or _pool is not None:
+        return _pool
+    workers = max(CPU_POOL_WORKERS, INSIGHTS_WORKERS)
+    _pool = ProcessPoolExecutor(max_workers=workers)
+    # The first submit forks every process, while the worker is still single-threaded
+    _pool.submit(os.getpid).result()
+    # One task running and one queued per process; the rest wait here without pickling anything
+    _slots = asyncio.Semaphore(2 * CPU_POOL_WORKERS)
+    logger.info("CPU pool started, %d processes for worker %d", workers, os.getpid())
+    return _pool
+
+
+def shutdown_cpu_pool():
+    global _pool, _slots
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool, _slots = None, None
+
+
+async def run_predict(predictor, row: dict):
+    """predictor.predict(row), in the CPU pool when there is one, else on the threadpool.
+
+    With the pool, the prediction cache is still this worker's: a hit is
+    answered here and only a miss goes to the pool, so /v1/stats counts
+    every lookup and pool processes never fill caches of their own.
+    """
+    if _pool is None:
+        return await run_in_threadpool(predictor.predict, row)
+    key = predictor.cache_key(row)
+    cached = predictor.cache.get(key)
+    if cached is not None:
+        return cached
+    result = await _run_in_pool(
+        _predict_in_pool, (predictor.version, predictor.fingerprint, row), predictor.predict, (row,)
+    )
+    predictor.cache.set(key, result)
+    return result
+
+
+async def run_weekly_insights(logs: list) -> dict:
+    """generate_insights(logs), in the CPU pool when there is one, else on the threadpool."""
+    if _pool is None:
+        return await run_in_threadpool(generate_insights, logs)
+    # Packing is quick and turns the DailyLog models into an array, which pickles cheaply
+    X, _ = pack_logs(logs)
+    dates = [log.date for log in logs]
+    return await _run_in_pool(generate_insights_packed, (X, dates), generate_insights_packed, (X, dates))
+
+
+async def _run_in_pool(fn, args: tuple, fallback, fallback_args: tuple):
+    global _pool
+    pool = _pool
+    async with _slots:
+        try:
+            result, stages = await asyncio.get_running_loop().run_in_executor(pool, _with_stages, fn, *args)
+            STAGE_SECONDS.merge(stages)
+            return result
+        except BrokenProcessPool:
+            # A pool process died (e.g. killed for memory). Forking a new one now that the
+            # worker runs threads could deadlock it, so this worker goes back to the threadpool
+            if _pool is pool:
+                logger.error("CPU pool broken, worker %d falls back to the threadpool", os.getpid())
+                _pool = None
+                pool.shutdown(wait=False, cancel_futures=True)
+    return await run_in_threadpool(fallback, *fallback_args)
+
+
+def _with_stages(fn, *args):
+    # Runs in a pool process, one task at a time. Its stage timings go back with the result
+    # for the worker to merge, since /metrics is served from the worker's registry
+    before = STAGE_SECONDS.snapshot()
+    result = fn(*args)
+    return result, STAGE_SECONDS.since(before)
+
+
+def _predict_in_pool(version: str, fingerprint: str, row: dict):
+    # Runs in a pool process, which has the registry as it was when the pool forked.
+    # After a hot reload in the worker, it loads the new artifact from disk once
+    for predictor in registry.predictors():
+        if predictor.version == version and predictor.fingerprint == fingerprint:
+            return predictor.predict(row, use_cache=False)
+    registry.refresh()
+    for predictor in registry.predictors():
+        if predictor.version == version:
+            return predictor.predict(row, use_cache=False)
+    raise ValueError(f"Model {version} not loaded")
@@ -0,0 +1 @@
+"""Rhythmé API benchmarks"""
@@ -0,0 +1,119 @@
+import os
+import time
+import random
+from datetime import date, timedelta
+
+# The App refuses to start without API keys; benchmarks never call out
+os.environ.setdefault("HF_TOKEN", "bench")
+os.environ.setdefault("GROQ_API_KEY", "bench")
+os.environ.setdefault("API_SECRET", "bench")
+# Measure the model, not the result caches, unless a benchmark opts in
+os.environ.setdefault("PREDICTION_CACHE_SIZE", "0")
+os.environ.setdefault("SENTIMENT_CACHE_SIZE", "0")
+os.environ.setdefault("GOAL_CACHE_SIZE", "0")
+
+
+def random_habit_row(rng: random.Random) -> dict:
+    day = rng.randint(0, 6)
+    return {
+        "day_of_week": day,
+        "is_weekend": int(day >= 5),
+        "current_streak": rng.randint(0, 60),
+        "completion_rate_7d": round(rng.random(), 2),
+        "completion_rate_30d": round(rng.random(), 2),
+        "days_since_start": rng.randint(0, 365),
+        "frequency_encoded": rng.randint(0, 3),
+    }
+
+
+def random_daily_log(rng: random.Random) -> dict:
+    """One day of insight input. Mood, focus and tasks move together and journaling helps."""
+    journaled = int(rng.random() < 0.6)
+    mood = min(10, max(1, round(rng.gauss(5.5 + journaled, 2))))
+    focus = max(0, round(rng.gauss(40 + 8 * mood, 30)))
+    log = {
+        "journaled": journaled,
+        "tasks_done": max(0, round(rng.gauss(1 + mood / 2 + focus / 60, 1.5))),
+        "mood": mood,
+        "focus_mins": focus,
+    }
+    if journaled:
+        log["sentiment"] = {
+            "sentiment": "positive" if mood >= 6 else "negative",
+            "confidence": round(min(1.0, max(0.0, rng.gauss(0.4 + mood / 20, 0.15))), 3),
+        }
+    return log
+
+
+# Journal fragments: the first two lists read clearly to VADER, the last one
+# leaves it unsure, so about a third of generated entries go on to RoBERTa
+CLEAR_POSITIVE = (
+    "Had a great day and felt really happy", "Finished the project and I'm so proud",
+    "Lovely walk with friends, we laughed a lot", "Slept well and woke up excited",
+)
+CLEAR_NEGATIVE = (
+    "Awful day, I felt anxious and exhausted", "Everything went wrong and I'm so frustrated",
+    "Lonely evening, feeling sad and tired", "Terrible meeting, I'm angry and stressed",
+)
+UNSURE = (
+    "Work was work", "Dinner was fine I guess", "Went to the store and came back",
+    "Not sure how today went", "Meetings in the morning, emails after lunch",
+)
+GOALS = (
+    ("Run a 5k", "Never ran before"), ("Learn Spanish", "Conversational in a year"),
+    ("Read more books", "One a month"), ("Save money", "Build a 3 month emergency fund"),
+    ("Learn guitar", "Play a full song by summer"), ("Sleep better", "In bed by 11"),
+)
+
+
+def random_journal_text(rng: random.Random) -> str:
+    """A journal entry of 1-4 sentences, unique enough to miss the sentiment cache."""
+    pool = rng.choice((CLEAR_POSITIVE, CLEAR_NEGATIVE, UNSURE))
+    sentences = [rng.choice(pool) for _ in range(rng.randint(1, 4))]
+    return ". ".join(sentences) + f". Day {rng.randint(1, 10**6)}."
+
+
+def random_goal(rng: random.Random) -> dict:
+    title, description = rng.choice(GOALS)
+    return {"goal_title": title, "goal_description": f"{description}, attempt {rng.randint(1, 10**6)}"}
+
+
+def random_history(n_days: int, rng: random.Random) -> list:
+    """n_days of consecutive dated daily logs, as request JSON."""
+    start = date(2025, 1, 1)
+    return [{**random_daily_log(rng), "date": (start + timedelta(days=d)).isoformat()} for d in range(n_days)]
+
+
+def random_logged_days(n_days: int, rng: random.Random, skip: float = 0.2) -> list:
+    """Dated daily logs in date order over n_days, each day left out with probability `skip`."""
+    start = date(2025, 1, 1)
+    return [
+        {**random_daily_log(rng), "date": (start + timedelta(days=d)).isoformat()}
+        for d in range(n_days) if rng.random() >= skip
+    ]
+
+
+def random_daily_logs(n_days: int, rng: random.Random) -> list:
+    from App.schemas import DailyLog
+    return [DailyLog(**random_daily_log(rng)) for _ in range(n_days)]
+
+
+def random_habit(n_days: int, rng: random.Random) -> dict:
+    """A habit with n_days of completions as a bitmap; each habit keeps its own success rate."""
+    done = rng.random()
+    return {
+        "habit_id": f"h{rng.randrange(10**6)}",
+        "start_date": (date(2025, 1, 1) - timedelta(days=n_days)).isoformat(),
+        "frequency": rng.choice(("daily", "weekly", "monthly", "twice_weekly")),
+        "completions": "".join("1" if rng.random() < done else "0" for _ in range(n_days)),
+    }
+
+
+def timed(fn, *args, repeat: int = 5):
+    """Best wall time of `repeat` runs, in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
@@ -0,0 +1,164 @@
+"""A local stand-in for the Hugging Face inference and Groq APIs.
+
+Serves the two endpoints the App calls, on 127.0.0.1, with a switchable
+behaviour so benchmarks can stage outages without touching the real APIs:
+  mode "ok"     answers straight away
+  mode "slow"   answers after `delay` seconds
+  mode "error"  answers 503
+On top of the mode, every request can wait `latency` seconds plus up to
+`jitter` more, and fail with 503 at `error_rate`, drawn from a seeded
+generator so load tests see the same upstream each run.
+Chat completions stream as server-sent events when asked to, one
+`chunk_chars` piece every `token_delay` seconds; a buffered reply waits
+as long as the stream would have taken. `plans` are answered in turn.
+Point the App at it with HF_INFERENCE_URL=<url>/models and GROQ_BASE_URL=<url>
+(both must be set before App.config is imported).
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GOAL_PLAN = {
+    "tasks": [
+        {"title": "Pick a beginner running plan", "description": "Choose a couch to 5k style plan", "type": "starter"},
+        {"title": "Buy proper running shoes", "description": "Get fitted at a running store", "type": "starter"},
+        {"title": "Map a safe 3km route", "description": "Find a flat loop near home", "type": "starter"},
+    ],
+    "habits": [
+        {"title": "Run the planned interval session", "frequency": "3x per week", "reason": "Builds aerobic base"},
+        {"title": "Stretch after every run", "frequency": "3x per week", "reason": "Reduces soreness"},
+    ],
+}
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections under load, which costs a 1s SYN retry
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class FakeUpstream:
+    def __init__(self, mode: str = "ok", delay: float = 1.0, plans=None, token_delay: float = 0.0, chunk_chars: int = 16,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.mode = mode
+        self.delay = delay
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self.plans = plans or [GOAL_PLAN]
+        self.token_delay = token_delay
+        self.chunk_chars = chunk_chars
+        self.requests = 0
+        self.completions = 0
+        self._server = _Server(("127.0.0.1", 0), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstream", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                upstream.requests += 1
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+
+                if upstream.mode == "error" or upstream._rng.random() < upstream.error_rate:
+                    return self._send(503, {"error": "upstream unavailable"})
+                if upstream.mode == "slow":
+                    time.sleep(upstream.delay)
+                if upstream.latency or upstream.jitter:
+                    time.sleep(upstream.latency + upstream._rng.uniform(0, upstream.jitter))
+
+                if self.path.startswith("/models/"):
+                    return self._send(200, _classify(body["inputs"]))
+                if self.path.endswith("/chat/completions"):
+                    plan = upstream.plans[upstream.completions % len(upstream.plans)]
+                    upstream.completions += 1
+                    content = json.dumps(plan, indent=2)
+                    pieces = [content[i:i + upstream.chunk_chars] for i in range(0, len(content), upstream.chunk_chars)]
+                    if body.get("stream"):
+                        return self._stream(body, pieces)
+                    time.sleep(upstream.token_delay * len(pieces))
+                    return self._send(200, _completion(body, content))
+                self._send(404, {"error": f"no route {self.path}"})
+
+            def _stream(self, body, pieces):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.end_headers()
+                try:
+                    for piece in pieces:
+                        time.sleep(upstream.token_delay)
+                        event = _chunk(body, {"content": piece})
+                        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                        self.wfile.flush()
+                    self.wfile.write(f"data: {json.dumps(_chunk(body, {}, 'stop'))}\n\ndata: [DONE]\n\n".encode())
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client hung up early, which is what early rejection does
+                    pass
+                self.close_connection = True
+
+            def _send(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+def _classify(inputs):
+    def scores(text):
+        positive = 0.8 if "good" in text.lower() else 0.1
+        return [
+            {"label": "positive", "score": positive},
+            {"label": "neutral", "score": 0.9 - positive},
+            {"label": "negative", "score": 0.1},
+        ]
+    return [scores(text) for text in inputs] if isinstance(inputs, list) else [scores(inputs)]
+
+
+def _chunk(body, delta, finish_reason=None):
+    return {
+        "id": "fake-completion",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+
+
+def _completion(body, content):
+    return {
+        "id": "fake-completion",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content},
+        }],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
@@ -0,0 +1,166 @@
+"""Tail latency of /v1/analyze and goal generation through an upstream outage.
+
+Runs the sentiment and goal paths against a local fake HF/Groq server
+(Benchmarks/_fake_upstream.py) through four phases: healthy, erroring,
+slow, and recovered. Once a breaker opens, requests should drop to the
+fallback answer in about a millisecond instead of paying for retries,
+and after CIRCUIT_OPEN_SECONDS a probe should close it again.
+The state machine itself is checked first with a fake clock, then that
+a cancelled half-open probe doesn't leave the breaker stuck half-open and
+that a failed micro-batch counts as one failure, not one per text.
+Run:  python -m Benchmarks.bench_circuit_breaker
+"""
+import asyncio
+import os
+import time
+import numpy as np
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._fake_upstream import FakeUpstream
+
+upstream = FakeUpstream().start()
+os.environ["HF_INFERENCE_URL"] = f"{upstream.url}/models"
+os.environ["GROQ_BASE_URL"] = upstream.url
+os.environ.setdefault("CIRCUIT_OPEN_SECONDS", "2")
+os.environ.setdefault("ROBERTA_SLOW_SECONDS", "0.3")
+os.environ.setdefault("GROQ_SLOW_SECONDS", "0.3")
+
+from App import sentiment, goals_engine  # noqa: E402
+from App.circuit_breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN  # noqa: E402
+
+# VADER is unsure about this one, so it always goes to RoBERTa
+UNCERTAIN = "Work was work. Dinner was fine I guess."
+PHASES = (("healthy", "ok"), ("erroring", "error"), ("slow", "slow"), ("recovered", "ok"))
+
+
+def check_state_machine():
+    now = [0.0]
+    breaker = CircuitBreaker("test", window=10, min_calls=4, error_rate=0.5,
+                             slow_call_seconds=1.0, open_seconds=30, clock=lambda: now[0])
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_success(0.1)
+    for _ in range(3):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == OPEN and not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow(), "only one probe at a time"
+    breaker.record_failure()
+    assert breaker.state == OPEN
+
+    now[0] += 30
+    assert breaker.allow()
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+
+    for _ in range(4):
+        breaker.allow()
+        breaker.record_success(2.0)
+    assert breaker.state == OPEN, "slow calls trip it too"
+
+    # A probe that never reports is given up on after probe_timeout (30s, the open_seconds default)
+    now[0] += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    now[0] += 29
+    assert not breaker.allow()
+    now[0] += 1
+    assert not breaker.allow() and breaker.state == OPEN, "lost probe reopens it"
+    now[0] += 30
+    assert breaker.allow() and breaker.state == HALF_OPEN, "and the next probe goes out"
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    print("state machine ok (error rate, slow rate, half-open probe, probe timeout)")
+
+
+async def check_cancelled_probe():
+    """A half-open probe cancelled mid-call (client gone) must not keep the breaker half-open."""
+    breaker = sentiment.roberta_breaker
+    breaker._trip()
+    breaker.opened_at -= breaker.open_seconds
+    upstream.mode = "slow"
+    task = asyncio.ensure_future(sentiment.roberta_sentiment_async(UNCERTAIN))
+    await asyncio.sleep(0.05)
+    assert breaker.state == HALF_OPEN
+    task.cancel()
+    if sentiment.batcher is not None:
+        # A batched probe is the batch call, which outlives its callers unless it's cancelled too
+        for batch in list(sentiment.batcher._tasks):
+            batch.cancel()
+    await asyncio.gather(task, *sentiment.batcher._tasks if sentiment.batcher else (), return_exceptions=True)
+    upstream.mode = "ok"
+    assert breaker.state == OPEN, "a cancelled probe counts as failed"
+    breaker.opened_at -= breaker.open_seconds
+    assert breaker.allow(), "the next probe goes out"
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    print("cancelled probe ok")
+
+
+async def check_failed_batch(n_texts: int = 8):
+    """One failed upstream call carrying n texts is one failure, below min_calls=5."""
+    breaker = CircuitBreaker("test", window=10, min_calls=5, error_rate=0.5)
+    batcher = sentiment.RobertaBatcher(sentiment.backend, window_ms=20, max_batch=n_texts, breaker=breaker)
+    upstream.mode = "error"
+    before = upstream.requests
+    results = await asyncio.gather(*(batcher.classify(f"{UNCERTAIN} {i}") for i in range(n_texts)),
+                                   return_exceptions=True)
+    upstream.mode = "ok"
+    assert all(isinstance(r, Exception) for r in results), "every caller sees the failure"
+    assert upstream.requests - before == 1 and batcher.batches == 1
+    status = breaker.status()
+    assert breaker.state == CLOSED and status["window_calls"] == 1 and status["error_rate"] == 1.0, status
+    assert sentiment.batcher is None or sentiment.batcher.breaker is sentiment.roberta_breaker
+    print(f"failed batch ok ({n_texts} texts, 1 upstream call, 1 failure recorded, breaker closed)")
+
+
+async def sentiment_phase(n_requests: int):
+    lat, used = [], {}
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        result = await sentiment.analyze_async(UNCERTAIN)
+        lat.append((time.perf_counter() - start) * 1000)
+        used[result.model_used] = used.get(result.model_used, 0) + 1
+    return np.array(lat), used
+
+
+def goal_phase(n_requests: int):
+    lat, used = [], {}
+    for _ in range(n_requests):
+        start = time.perf_counter()
+        plan = goals_engine.generate_goal_plan("Run a 5k", "Never ran before")
+        lat.append((time.perf_counter() - start) * 1000)
+        kind = "fallback" if plan["fallback_used"] else "generated"
+        used[kind] = used.get(kind, 0) + 1
+    return np.array(lat), used
+
+
+def report(name, lat, used, breaker):
+    print(f"{name:>10} {np.percentile(lat, 50):>8.1f} {np.percentile(lat, 99):>8.1f} "
+          f"{breaker.state:>10}  {used}")
+
+
+def main():
+    check_state_machine()
+    asyncio.run(check_cancelled_probe())
+    asyncio.run(check_failed_batch())
+    for label, run, breaker in (
+        ("sentiment", lambda n: asyncio.run(sentiment_phase(n)), sentiment.roberta_breaker),
+        ("goals", goal_phase, goals_engine.groq_breaker),
+    ):
+        print(f"\n{label}: {'phase':>10} {'p50 ms':>8} {'p99 ms':>8} {'breaker':>10}  answers")
+        for phase, mode in PHASES:
+            upstream.mode = mode
+            if breaker.state != CLOSED:
+                # Let the open period pass so the phase starts with a half-open probe
+                time.sleep(breaker.open_seconds)
+            lat, used = run(12)
+            report(phase, lat, used, breaker)
+        print(f"{'':>10} times opened {breaker.times_opened}, short-circuited {breaker.short_circuited}")
+    print(f"\nfake upstream served {upstream.requests} requests")
+    upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Emotion keyword matching on long journal entries (5-50 KB).
+
+Compares the precompiled trie regex in sentiment.get_emotions with the
+old per-call version (dict rebuilt, text tokenized into a word set) and
+checks both give the same emotions. The old version could never match
+phrases like "fed up"; that is the one expected difference. Then checks
+that the async routes' VADER and emotion pass on a 48 KB entry leaves the
+event loop free: a 1ms ticker running alongside must never stall.
+Run:  python -m Benchmarks.bench_emotions
+"""
+import asyncio
+import json
+import random
+import time
+import re
+from pathlib import Path
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import timed
+from App import sentiment as sentiment_module
+from App.sentiment import get_emotions, get_emotions_many, EMOTION_KEYWORDS
+
+CORPUS = Path(__file__).parent / "fixtures" / "journal_corpus.jsonl"
+SIZES_KB = (5, 10, 25, 50)
+
+
+def legacy_get_emotions(text: str, sentiment: str):
+    # The pre-matcher get_emotions; EMOTION_KEYWORDS is the same dict it rebuilt per call
+    emotion_keywords = json.loads(json.dumps(EMOTION_KEYWORDS))
+    words = set(re.findall(r'\b\w+\b', text.lower()))
+    if sentiment not in emotion_keywords:
+        return ["neutral"]
+    emotions = []
+    for emotion, keyword_list in emotion_keywords[sentiment].items():
+        for keyword in keyword_list:
+            if keyword in words:
+                emotions.append(emotion)
+                break
+    return emotions if emotions else ["neutral"]
+
+
+def same_emotions(text: str, sentiment: str) -> bool:
+    new, old = get_emotions(text, sentiment), legacy_get_emotions(text, sentiment)
+    if new == old:
+        return True
+    # Allowed difference: a phrase keyword only the matcher can see
+    return old == ["neutral"] or set(old) < set(new)
+
+
+def long_entry(sentences, size_kb: int, rng: random.Random) -> str:
+    parts, size = [], 0
+    while size < size_kb * 1024:
+        parts.append(rng.choice(sentences))
+        size += len(parts[-1]) + 1
+    return " ".join(parts)
+
+
+def main():
+    with open(CORPUS) as f:
+        sentences = [json.loads(line)["text"] for line in f if line.strip()]
+    rng = random.Random(0)
+
+    # Parity on every corpus text and sentiment, then on the long entries
+    checks = [(t, s) for t in sentences for s in ("positive", "negative", "neutral")]
+    phrases = 0
+    for text, sentiment in checks:
+        assert same_emotions(text, sentiment), text
+        phrases += get_emotions(text, sentiment) != legacy_get_emotions(text, sentiment)
+    assert get_emotions("honestly fed up with it", "negative") == ["frustrated"]
+    assert legacy_get_emotions("honestly fed up with it", "negative") == ["neutral"]
+    print(f"parity ok on {len(checks)} corpus checks ({phrases} gained a phrase match like 'fed up')")
+
+    print(f"{'size':>6} {'sentiment':>9} {'legacy ms':>10} {'matcher ms':>11} {'speedup':>8}")
+    for size_kb in SIZES_KB:
+        text = long_entry(sentences, size_kb, rng)
+        for sentiment in ("positive", "negative"):
+            assert same_emotions(text, sentiment)
+            old = timed(legacy_get_emotions, text, sentiment, repeat=50)
+            new = timed(get_emotions, text, sentiment, repeat=50)
+            print(f"{size_kb:>4}KB {sentiment:>9} {old * 1000:>10.3f} {new * 1000:>11.3f} {old / new:>7.1f}x")
+
+    # Worst case for the early exit: a long entry where nothing matches
+    filler = ("we met at the office and then went over the plan for the week " * 800)[:50 * 1024]
+    old = timed(legacy_get_emotions, filler, "negative", repeat=50)
+    new = timed(get_emotions, filler, "negative", repeat=50)
+    print(f"  50KB  no match {old * 1000:>10.3f} {new * 1000:>11.3f} {old / new:>7.1f}x")
+
+    texts = [long_entry(sentences, rng.choice(SIZES_KB), rng) for _ in range(100)]
+    labels = [rng.choice(("positive", "negative", "neutral")) for _ in texts]
+    batch = timed(get_emotions_many, texts, labels, repeat=5)
+    print(f"batch of {len(texts)} entries: {batch * 1000:.1f}ms ({batch / len(texts) * 1000:.3f}ms per entry)")
+    check_event_loop(sentences, rng)
+
+
+async def loop_stall(text: str) -> tuple[float, float]:
+    """Seconds to analyze `text` with analyze_async, and the longest gap between 1ms ticks meanwhile."""
+    gaps, done = [], False
+
+    async def ticker():
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await sentiment_module.analyze_async(text)
+    elapsed = time.perf_counter() - start
+    done = True
+    await tick
+    return elapsed, max(gaps)
+
+
+def check_event_loop(sentences, rng):
+    # VADER's compound saturates on an entry this long, so it answers alone and no upstream call is made
+    text = long_entry(sentences, 48, rng)
+    elapsed, stall = asyncio.run(loop_stall(text))
+    assert stall < max(0.1, elapsed / 5), f"event loop stalled {stall * 1000:.0f}ms of {elapsed * 1000:.0f}ms"
+    print(f"event loop ok: 48KB entry analyzed in {elapsed * 1000:.0f}ms, longest stall {stall * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Throughput and p50/p95/p99 of every endpoint, per worker configuration, against a stored baseline.
+
+Each configuration runs in a fresh interpreter (settings are read at import),
+boots the App through its lifespan and drives it in-process over ASGI with
+LOADTEST_CONCURRENCY requests in flight. The Hugging Face and Groq APIs are
+the local fake upstream (Benchmarks/_fake_upstream.py), answering after
+UPSTREAM_LATENCY seconds plus up to UPSTREAM_JITTER and failing at
+UPSTREAM_ERROR_RATE; the flaky_upstream configuration raises both.
+Requests come from seeded generators, so every run sends the same ones:
+habit rows, 100 habits' completion bitmaps of up to a year, 90-day dated
+histories (as JSON, as NDJSON, and as a week of new days on top of the
+state of the 83 before), journal texts of which about a third leave VADER
+unsure, and goals.
+
+Results are compared with Benchmarks/baselines/bench_endpoints.json. A p95
+more than REGRESSION_TOLERANCE (default 0.5) above its baseline, and at
+least a millisecond slower, throughput that much below, or new errors count
+as a regression, and the run exits 1. Baselines are per machine: record
+them with --update-baseline on the machine that runs the comparison.
+Run:  python -m Benchmarks.bench_endpoints [--update-baseline] [config ...]
+"""
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from Benchmarks._common import random_goal, random_habit, random_habit_row, random_history, random_journal_text
+
+BASELINE_PATH = Path(__file__).parent / "baselines" / "bench_endpoints.json"
+REQUESTS = int(os.getenv("LOADTEST_REQUESTS", "200"))
+WARMUP = int(os.getenv("LOADTEST_WARMUP", "20"))
+CONCURRENCY = int(os.getenv("LOADTEST_CONCURRENCY", "16"))
+TOLERANCE = float(os.getenv("REGRESSION_TOLERANCE", "0.5"))
+
+# Environment per configuration, on top of the benchmark defaults in _common
+CONFIGS = {
+    "default": {},
+    "flat_model": {"MODEL_FORMAT": "flat"},
+    "no_roberta_batching": {"ROBERTA_BATCH_WINDOW_MS": "0"},
+    # Breakers kept closed, so this measures retries rather than the fast fallback
+    # of an open breaker (bench_circuit_breaker covers that), and a short backoff
+    # cap, so the tail follows the upstream rather than the backoff's random draw
+    "flaky_upstream": {
+        "UPSTREAM_LATENCY": "0.2", "UPSTREAM_ERROR_RATE": "0.2",
+        "CIRCUIT_ERROR_RATE": "1.1", "ROBERTA_BACKOFF_MAX": "0.25",
+    },
+}
+
+
+def _analyze(rng):
+    return {"params": {"data": random_journal_text(rng)}}
+
+
+def _journal(rng):
+    return {"json": {"text": random_journal_text(rng), "title": "Today"}}
+
+
+def _predict(rng):
+    return {"json": random_habit_row(rng)}
+
+
+def _predict_batch(rng):
+    return {"json": {"rows": [random_habit_row(rng) for _ in range(100)]}}
+
+
+def _predict_history(rng):
+    return {"json": {"habits": [random_habit(rng.randint(1, 365), rng) for _ in range(100)]}}
+
+
+def _insights(rng):
+    return {"json": {"logs": random_history(90, rng)}}
+
+
+def _insights_stream(rng):
+    body = b"".join(json.dumps(log).encode() + b"\n" for log in random_history(90, rng))
+    return {"content": body, "headers": {"content-type": "application/x-ndjson"}}
+
+
+def _insights_incremental(rng):
+    # Imported here: the App is only loaded in the worker process, after the benchmark env is set
+    from App.insight_engine import LogStats, log_dates, pack_log_dicts
+    logs = random_history(90, rng)
+    stats = LogStats()
+    stats.add(*pack_log_dicts(logs[:-7]), log_dates(logs[:-7]))
+    return {"json": {"logs": logs[-7:], "state": stats.to_state()}}
+
+
+def _insights_bulk(rng):
+    return {"json": {"users": [{"user_id": str(i), "logs": random_history(30, rng)} for i in range(50)]}}
+
+
+def _goal(rng):
+    return {"json": random_goal(rng)}
+
+
+def _sentiment_fallback(body):
+    return body.get("model_used") == "vader-fallback"
+
+
+def _goal_fallback(body):
+    return body.get("fallback_used", False)
+
+
+# name: (path, request generator, whether an answer is a degraded fallback)
+SCENARIOS = {
+    "predict": ("/v1/predict", _predict, None),
+    "predict_batch_100": ("/v1/predict/batch", _predict_batch, None),
+    "predict_history_100": ("/v1/predict/history", _predict_history, None),
+    "analyze": ("/v1/analyze", _analyze, _sentiment_fallback),
+    "journal": ("/v1/journal", _journal, _sentiment_fallback),
+    "insights_weekly_90d": ("/v1/insights_weekly", _insights, None),
+    "insights_stream_90d": ("/v1/insights_weekly/stream", _insights_stream, None),
+    "insights_incremental_7d": ("/v1/insights_weekly/incremental", _insights_incremental, None),
+    "insights_bulk_50x30d": ("/v1/insights_weekly/bulk", _insights_bulk, None),
+    "goal_generate": ("/api/v1/onboarding/generate", _goal, _goal_fallback),
+}
+
+
+async def drive(client, path: str, requests: list, degraded=None) -> dict:
+    """Send `requests` with CONCURRENCY in flight; latency in ms per request."""
+    latencies, errors, fallbacks = [], 0, 0
+    pending = iter(requests)
+
+    async def worker():
+        nonlocal errors, fallbacks
+        for kwargs in pending:
+            start = time.perf_counter()
+            response = await client.post(path, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+            elif degraded and degraded(response.json()):
+                fallbacks += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+    elapsed = time.perf_counter() - start
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "rps": round(len(requests) / elapsed, 1),
+        "p50_ms": round(float(p50), 2),
+        "p95_ms": round(float(p95), 2),
+        "p99_ms": round(float(p99), 2),
+        "errors": errors,
+        "fallbacks": fallbacks,
+    }
+
+
+async def run_worker() -> dict:
+    """One configuration, in this process: fake upstream, App lifespan, every scenario."""
+    from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+    from Benchmarks._fake_upstream import FakeUpstream
+
+    upstream = FakeUpstream(
+        latency=float(os.getenv("UPSTREAM_LATENCY", "0.05")),
+        jitter=float(os.getenv("UPSTREAM_JITTER", "0.05")),
+        error_rate=float(os.getenv("UPSTREAM_ERROR_RATE", "0")),
+    ).start()
+    os.environ["HF_INFERENCE_URL"] = f"{upstream.url}/models"
+    os.environ["GROQ_BASE_URL"] = upstream.url
+
+    import httpx
+    from App.main import app
+
+    results = {}
+    headers = {"x-api-secret": os.environ["API_SECRET"]}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers, timeout=60) as client:
+            for seed, (name, (path, generate, degraded)) in enumerate(SCENARIOS.items()):
+                rng = random.Random(seed)
+                requests = [generate(rng) for _ in range(WARMUP + REQUESTS)]
+                await drive(client, path, requests[:WARMUP])
+                results[name] = await drive(client, path, requests[WARMUP:], degraded)
+    upstream.stop()
+    return results
+
+
+def run_config(name: str) -> dict:
+    env = {**os.environ, "MODEL_WATCH_INTERVAL": "0", "LOG_LEVEL": "ERROR", **CONFIGS[name]}
+    out = subprocess.run(
+        [sys.executable, "-W", "ignore", "-m", "Benchmarks.bench_endpoints", "--worker"],
+        capture_output=True, text=True, env=env,
+    )
+    if out.returncode != 0:
+        raise RuntimeError(f"config {name} failed:\n{out.stderr[-2000:]}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def machine() -> dict:
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "requests": REQUESTS,
+        "concurrency": CONCURRENCY,
+    }
+
+
+def regressions(result: dict, base: dict) -> list:
+    found = []
+    if result["p95_ms"] > base["p95_ms"] * (1 + TOLERANCE) and result["p95_ms"] - base["p95_ms"] >= 1.0:
+        found.append(f"p95 {base['p95_ms']:.1f} -> {result['p95_ms']:.1f}ms")
+    if result["rps"] < base["rps"] * (1 - TOLERANCE):
+        found.append(f"throughput {base['rps']:.0f} -> {result['rps']:.0f} req/s")
+    if result["errors"] > base["errors"]:
+        found.append(f"errors {base['errors']} -> {result['errors']}")
+    return found
+
+
+def main():
+    args = sys.argv[1:]
+    if "--worker" in args:
+        print(json.dumps(asyncio.run(run_worker())))
+        return
+
+    update = "--update-baseline" in args
+    names = [a for a in args if not a.startswith("--")] or list(CONFIGS)
+    unknown = set(names) - set(CONFIGS)
+    if unknown:
+        sys.exit(f"unknown configuration {sorted(unknown)}, use some of {list(CONFIGS)}")
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {"machine": {}, "results": {}}
+    if baseline["machine"] and baseline["machine"] != machine() and not update:
+        print(f"note: baseline was recorded on {baseline['machine']}, this is {machine()}")
+
+    failed = []
+    for name in names:
+        results = run_config(name)
+        base = baseline["results"].get(name, {})
+        print(f"\n{name}  ({REQUESTS} requests per endpoint, {CONCURRENCY} in flight)")
+        print(f"{'endpoint':>24} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7} "
+              f"{'fallback':>9} {'p95 vs base':>12}")
+        for scenario, r in results.items():
+            b = base.get(scenario)
+            change = f"{r['p95_ms'] / b['p95_ms'] - 1:+.0%}" if b and b["p95_ms"] else "-"
+            print(f"{scenario:>24} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f} "
+                  f"{r['errors']:>7} {r['fallbacks']:>9} {change:>12}")
+            if b and not update:
+                failed += [f"{name}/{scenario}: {problem}" for problem in regressions(r, b)]
+        baseline["results"][name] = results
+
+    if update:
+        baseline["machine"] = machine()
+        BASELINE_PATH.parent.mkdir(exist_ok=True)
+        BASELINE_PATH.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\nbaseline written to {BASELINE_PATH}")
+    elif failed:
+        print("\nREGRESSION:\n  " + "\n  ".join(failed))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
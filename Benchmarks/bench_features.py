@@ -0,0 +1,117 @@
+"""Habits/sec for predictions from raw completion history: per-habit Python vs the packed arrays.
+
+  python   what each client did: walk the history for the streak, sum the
+           last 7 and 30 days, then predict_many on the feature dicts
+  arrays   App.features: all histories packed once, streaks from where the
+           last miss falls, rates from a running sum, one predict_array
+Both forecast 1 and FORECAST_DAYS days ahead; from the second day on, each
+day's predicted outcome is added to the history. Checks first that both
+give identical features and predictions, and that completed_dates gives
+the same as the bitmap. Then times 1-10,000 habits of 1-365 days, and
+calls /v1/predict/history over HTTP.
+Run:  python -m Benchmarks.bench_features
+"""
+import os
+import random
+from datetime import date, timedelta
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_habit, timed
+
+from fastapi.testclient import TestClient  # noqa: E402
+from App.config import FORECAST_DAYS  # noqa: E402
+from App.features import FREQUENCIES, forecast, parse_habit  # noqa: E402
+from App.model import HabitPredictor  # noqa: E402
+from App.main import app  # noqa: E402
+
+HEADERS = {"x-api-secret": os.environ["API_SECRET"]}
+HABITS = (1, 100, 1_000, 10_000)
+
+
+def python_forecast(predictor, habits: list, days: int) -> list:
+    histories = [[int(c) for c in h["completions"]] for h in habits]
+    firsts = [date.fromisoformat(h["start_date"]) + timedelta(days=len(h["completions"])) for h in habits]
+    out = [[] for _ in habits]
+    for step in range(days):
+        rows = []
+        for habit, bits, first in zip(habits, histories, firsts):
+            streak = 0
+            for done in reversed(bits):
+                if not done:
+                    break
+                streak += 1
+            day = first + timedelta(days=step)
+            rows.append({
+                "day_of_week": day.weekday(),
+                "is_weekend": int(day.weekday() >= 5),
+                "current_streak": streak,
+                "completion_rate_7d": sum(bits[-7:]) / max(min(len(bits), 7), 1),
+                "completion_rate_30d": sum(bits[-30:]) / max(min(len(bits), 30), 1),
+                "days_since_start": len(bits),
+                "frequency_encoded": FREQUENCIES[habit["frequency"]],
+            })
+        for i, (row, result) in enumerate(zip(rows, predictor.predict_many(rows))):
+            out[i].append({"date": (firsts[i] + timedelta(days=step)).isoformat(), "features": row, "result": result})
+            histories[i].append(int(result.prediction == "complete"))
+    return out
+
+
+def array_forecast(predictor, habits: list, days: int) -> list:
+    return forecast(predictor, [parse_habit(h) for h in habits], days)
+
+
+def as_dates(habit: dict) -> dict:
+    start = date.fromisoformat(habit["start_date"])
+    done = [(start + timedelta(days=d)).isoformat() for d, c in enumerate(habit["completions"]) if c == "1"]
+    as_of = (start + timedelta(days=len(habit["completions"]))).isoformat()
+    return {**{k: v for k, v in habit.items() if k != "completions"}, "completed_dates": done, "as_of": as_of}
+
+
+def check(predictor, rng):
+    habits = [random_habit(rng.randint(0, 365), rng) for _ in range(300)]
+    # Edges: no history yet, never missed, missed only today, long unbroken streak
+    habits += [
+        {"start_date": "2025-01-01", "completions": ""},
+        {"start_date": "2025-01-01", "completions": "1" * 45},
+        {"start_date": "2025-01-01", "completions": "1" * 12 + "0"},
+        {"start_date": "2024-01-01", "completions": "0" + "1" * 400, "frequency": "weekly"},
+    ]
+    for h in habits:
+        h.setdefault("frequency", "daily")
+    for days in (1, FORECAST_DAYS):
+        assert array_forecast(predictor, habits, days) == python_forecast(predictor, habits, days), days
+    for h in habits:
+        bits, *rest = parse_habit(h)
+        dated_bits, *dated_rest = parse_habit(as_dates(h))
+        assert (bits == dated_bits).all() and rest == dated_rest, h
+    print(f"parity ok: {len(habits)} habits, 1 and {FORECAST_DAYS} days, bitmap and completed_dates")
+
+
+def main():
+    rng = random.Random(0)
+    predictor = HabitPredictor()
+    predictor.load_model()
+    check(predictor, rng)
+
+    print(f"{'habits':>8} {'days':>5} {'python habits/s':>16} {'arrays habits/s':>16} {'speedup':>9}")
+    for n in HABITS:
+        habits = [random_habit(rng.randint(1, 365), rng) for _ in range(n)]
+        for days in (1, FORECAST_DAYS):
+            old = timed(python_forecast, predictor, habits, days, repeat=3)
+            new = timed(array_forecast, predictor, habits, days, repeat=3)
+            print(f"{n:>8,} {days:>5} {n / old:>16,.0f} {n / new:>16,.0f} {old / new:>8.1f}x")
+
+    habits = [random_habit(rng.randint(1, 365), rng) for _ in range(1_000)]
+    habits.append({"habit_id": "bad", "start_date": "2025-01-01", "completions": "01x1"})
+    with TestClient(app) as client:
+        post = lambda: client.post(  # noqa: E731
+            "/v1/predict/history", json={"habits": habits, "days": FORECAST_DAYS}, headers=HEADERS
+        ).raise_for_status().json()
+        body = post()
+        assert body["predicted"] == 1_000 and body["failed"] == 1, body["failed"]
+        assert body["results"][-1]["error"].startswith("Validation error: completions")
+        assert len(body["results"][0]["days"]) == FORECAST_DAYS
+        print(f"HTTP /v1/predict/history, 1,000 habits x {FORECAST_DAYS} days: {timed(post, repeat=3) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
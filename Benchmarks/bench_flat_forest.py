@@ -0,0 +1,34 @@
+"""Parity and latency of the compiled flat forest vs the sklearn forest.
+
+Run:  python -m Benchmarks.bench_flat_forest
+"""
+import numpy as np
+from Benchmarks._common import timed
+from App.model import HabitPredictor
+from App.flat_forest import compile_forest, random_feature_rows
+
+BATCH_SIZES = [1, 100, 10_000]
+
+
+def main():
+    predictor = HabitPredictor(engine="sklearn")
+    predictor.load_model()
+    model = predictor.model
+    flat = compile_forest(model)
+
+    for seed in range(5):
+        X = random_feature_rows(20_000, flat, seed)
+        assert np.array_equal(model.predict_proba(X), flat.predict_proba(X)), f"parity failed (seed {seed})"
+    print(f"parity: exact on 100,000 random rows ({flat.n_trees} trees, {len(flat.feature)} nodes)")
+
+    print(f"{'batch':>8} {'sklearn ms':>11} {'flat ms':>9} {'speedup':>9}")
+    for size in BATCH_SIZES:
+        X = random_feature_rows(size, seed=size)
+        repeat = 200 if size == 1 else 10
+        sk = timed(model.predict_proba, X, repeat=repeat) * 1000
+        fl = timed(flat.predict_proba, X, repeat=repeat) * 1000
+        print(f"{size:>8} {sk:>11.3f} {fl:>9.3f} {sk / fl:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
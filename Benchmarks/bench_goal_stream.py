@@ -0,0 +1,92 @@
+"""Time to a valid goal plan: streamed with mid-stream validation vs buffered.
+
+A local fake Groq (Benchmarks/_fake_upstream.py) generates at a steady
+token rate. Each scenario's first reply fails validation and the retry
+succeeds. Streaming spots a bad habit frequency or a sixth task as soon
+as that object closes and retries at once. The buffered call has to
+wait for the whole reply first. Reports time to first token and total
+per attempt from groq_metrics. First checks that a plan cache file
+written with GOAL_CACHE_SIZE > 0 doesn't stop a size-0 cache starting.
+Run:  python -m Benchmarks.bench_goal_stream
+"""
+import asyncio
+import copy
+import os
+import tempfile
+import time
+from pathlib import Path
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._fake_upstream import FakeUpstream, GOAL_PLAN
+
+upstream = FakeUpstream(token_delay=0.01).start()
+os.environ["GROQ_BASE_URL"] = upstream.url
+
+from App import goals_engine  # noqa: E402
+from App.goal_cache import GoalPlanCache  # noqa: E402
+
+
+def bad_frequency():
+    plan = copy.deepcopy(GOAL_PLAN)
+    plan["habits"][0]["frequency"] = "as often as possible"
+    return plan
+
+
+def too_many_tasks():
+    plan = copy.deepcopy(GOAL_PLAN)
+    plan["tasks"] = plan["tasks"] * 2
+    return plan
+
+
+SCENARIOS = {
+    "valid first time": [GOAL_PLAN],
+    "bad frequency, then valid": [bad_frequency(), GOAL_PLAN],
+    "6 tasks, then valid": [too_many_tasks(), GOAL_PLAN],
+}
+
+
+def check_disabled_cache_file():
+    """GOAL_CACHE_SIZE=0 with a file left by a bigger cache: nothing loaded, the file untouched."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "plans.json"
+        cache = GoalPlanCache(10, path=path)
+        cache.set("Run a 5k", "Never ran before", GOAL_PLAN)
+        cache.flush()
+        saved = path.read_text()
+        disabled = GoalPlanCache(0, path=path)
+        assert len(disabled) == 0 and disabled.get("Run a 5k", "Never ran before") is None
+        assert path.read_text() == saved
+        assert len(GoalPlanCache(1, path=path)) == 1, "a cache that's on still loads it"
+    print("disabled cache ok: a size-0 cache starts with a plan file present")
+
+
+async def run(stream: bool, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        upstream.completions = 0
+        start = time.perf_counter()
+        plan = await goals_engine.generate_goal_plan_async("Run a 5k", "Never ran before", stream=stream)
+        best = min(best, time.perf_counter() - start)
+        assert plan["generated"], "the retry should succeed"
+    return best
+
+
+async def main():
+    check_disabled_cache_file()
+    # Warm the pooled connection so neither mode pays for the first connect
+    await run(stream=True, repeat=1)
+    print(f"{'scenario':>28} {'buffered ms':>12} {'streamed ms':>12} {'saved':>7}")
+    for name, plans in SCENARIOS.items():
+        upstream.plans = plans
+        buffered = await run(stream=False)
+        streamed = await run(stream=True)
+        print(f"{name:>28} {buffered * 1000:>12.0f} {streamed * 1000:>12.0f} {1 - streamed / buffered:>7.0%}")
+
+    stats = goals_engine.groq_metrics.stats()
+    print(f"\n{stats['attempts']} attempts {stats['outcomes']}")
+    print(f"first token ms {stats['ttfb_ms']}, total ms {stats['total_ms']}")
+    await goals_engine.close_clients()
+    upstream.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
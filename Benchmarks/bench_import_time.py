@@ -0,0 +1,90 @@
+"""Import and boot time of App.main, with a budget that fails the run on regressions.
+
+Each measurement runs in a fresh interpreter, like a newly started worker,
+with HF_TOKEN and GROQ_API_KEY unset to show the import no longer needs them.
+  import   `python -X importtime -c "import App.main"`, best of 5, and the
+           heavy modules it pulled in (none of LAZY_MODULES should be there)
+  boot     import plus the lifespan startup, per model format, i.e. the
+           time until a worker can serve
+Exits 1 when the import is over IMPORT_BUDGET_MS or a lazy module is imported,
+so CI can run it as a guard.
+Run:  python -m Benchmarks.bench_import_time
+"""
+import json
+import os
+import re
+import subprocess
+import sys
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1000"))
+RUNS = 5
+# Only needed by some routes or backends; each is imported where it is first used
+LAZY_MODULES = (
+    "groq", "httpx", "huggingface_hub", "vaderSentiment",
+    "sklearn", "scipy", "pandas", "transformers", "torch", "onnxruntime",
+)
+
+BOOT_PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+from App.main import app
+imported = time.perf_counter()
+
+async def boot():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+    return ready
+
+ready = asyncio.run(boot())
+loaded = sorted({name.split(".")[0] for name in sys.modules} & set(LAZY))
+print(json.dumps({"import_ms": (imported - start) * 1000, "boot_ms": (ready - start) * 1000, "loaded": loaded}))
+"""
+
+
+def clean_env(**extra) -> dict:
+    env = {k: v for k, v in os.environ.items() if k not in ("HF_TOKEN", "GROQ_API_KEY")}
+    env.update(extra)
+    return env
+
+
+def import_profile():
+    """(App.main cumulative ms, top-level packages imported) from -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-W", "ignore", "-X", "importtime", "-c", "import App.main"],
+        capture_output=True, text=True, check=True, env=clean_env(),
+    )
+    total, modules = None, set()
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)", line)
+        if not match:
+            continue
+        modules.add(match.group(3).split(".")[0])
+        if match.group(3) == "App.main":
+            total = int(match.group(1)) / 1000
+    return total, modules
+
+
+def main():
+    profiles = [import_profile() for _ in range(RUNS)]
+    best = min(total for total, _ in profiles)
+    lazy_loaded = sorted(set().union(*(modules for _, modules in profiles)) & set(LAZY_MODULES))
+    print(f"import App.main: best {best:.0f}ms of {RUNS} (budget {IMPORT_BUDGET_MS:.0f}ms), "
+          f"lazy modules imported: {lazy_loaded or 'none'}")
+
+    print(f"{'format':>8} {'import ms':>10} {'boot ms':>9}  loaded at startup")
+    for fmt in ("pickle", "flat"):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", f"LAZY = {LAZY_MODULES!r}\n" + BOOT_PROBE],
+            capture_output=True, text=True, check=True,
+            env=clean_env(HF_TOKEN="bench", GROQ_API_KEY="bench", MODEL_FORMAT=fmt, MODEL_WATCH_INTERVAL="0"),
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{fmt:>8} {r['import_ms']:>10.0f} {r['boot_ms']:>9.0f}  {', '.join(r['loaded']) or '-'}")
+
+    if best > IMPORT_BUDGET_MS or lazy_loaded:
+        print("FAIL: import time regressed")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
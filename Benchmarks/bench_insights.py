@@ -0,0 +1,81 @@
+"""generate_insights: NumPy correlation matrix vs the per-pair scipy calls it replaced.
+
+Checks every pair's r against scipy.stats.pearsonr/pointbiserialr and that
+the insight sentences match, then times both at 14, 90 and 365 days.
+Run:  python -m Benchmarks.bench_insights
+"""
+import random
+import warnings
+import numpy as np
+from scipy import stats
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_daily_logs, timed
+from App.config import MIN_DAYS
+from App.insight_engine import generate_insights, pack_logs, correlation_matrix, pair_correlations, PAIRS
+from App.schemas import DailyLog
+
+DAYS = (14, 90, 365)
+
+
+def legacy_pairs(logs):
+    """The pairs the scipy version computed, None where it skipped them."""
+    def pearson(x, y):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return stats.pearsonr(x, y)[0]
+
+    cols = {
+        "journaled": [log.journaled for log in logs],
+        "tasks_done": [log.tasks_done for log in logs],
+        "mood": [log.mood for log in logs],
+        "focus_mins": [log.focus_mins for log in logs],
+    }
+    pairs = [(a, b, pearson(cols[a], cols[b])) for a, b in PAIRS[:6]]
+
+    with_sentiment = [log for log in logs if log.sentiment is not None]
+    for a, b in PAIRS[6:]:
+        r = None
+        if len(with_sentiment) >= MIN_DAYS:
+            r = pearson([log.sentiment.confidence for log in with_sentiment],
+                        [getattr(log, b) for log in with_sentiment])
+        pairs.append((a, b, r))
+    return pairs
+
+
+def new_pairs(logs):
+    X, present = pack_logs(logs)
+    return pair_correlations(correlation_matrix(X, present))
+
+
+def check_parity(logs):
+    for (a, b, old), (_, _, new) in zip(legacy_pairs(logs), new_pairs(logs)):
+        old_signal = old is not None and not np.isnan(old)
+        assert old_signal == (new is not None), (a, b, old, new)
+        if old_signal:
+            assert abs(old - new) < 1e-9, (a, b, old, new)
+
+
+def main():
+    rng = random.Random(0)
+    for n_days in DAYS:
+        for _ in range(50):
+            check_parity(random_daily_logs(n_days, rng))
+
+    # A constant column: scipy returned NaN with a warning, the matrix reports no signal
+    flat = [DailyLog(journaled=1, tasks_done=3, mood=i % 10 + 1, focus_mins=30) for i in range(20)]
+    check_parity(flat)
+    assert all(r is None for a, b, r in new_pairs(flat) if "focus_mins" in (a, b) or "tasks_done" in (a, b))
+    print("parity ok: r within 1e-9 of scipy, constant columns give no signal")
+
+    print(f"{'days':>5} {'scipy ms':>9} {'numpy ms':>9} {'speedup':>8}")
+    for n_days in DAYS:
+        logs = random_daily_logs(n_days, rng)
+        old = timed(legacy_pairs, logs, repeat=20)
+        new = timed(new_pairs, logs, repeat=20)
+        total = timed(generate_insights, logs, repeat=20)
+        print(f"{n_days:>5} {old * 1000:>9.3f} {new * 1000:>9.3f} {old / new:>7.1f}x"
+              f"   (generate_insights {total * 1000:.3f}ms)")
+
+
+if __name__ == "__main__":
+    main()
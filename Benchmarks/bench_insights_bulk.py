@@ -0,0 +1,97 @@
+"""Users/sec for weekly insights: one call per user vs the bulk endpoint.
+
+Histories are 10-365 days long (a few are under MIN_DAYS on purpose).
+Compares same-day generate_insights per user with generate_insights_bulk
+in-process and on a process pool, checks they give identical results,
+does the same with next-day and recent patterns (bulk given the log
+dates, computed per chunk in the pool processes), then compares over
+HTTP with dated logs and the routes' default time_series: N calls to
+/v1/insights_weekly against one call to /v1/insights_weekly/bulk.
+Run:  python -m Benchmarks.bench_insights_bulk [users]
+"""
+import os
+import random
+import sys
+import time
+import numpy as np
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_daily_logs, random_logged_days
+
+os.environ.setdefault("INSIGHTS_WORKERS", str(min(4, os.cpu_count() or 1)))
+os.environ.setdefault("INSIGHTS_POOL_MIN_USERS", "1")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from App import insight_engine  # noqa: E402
+from App.insight_engine import generate_insights, generate_insights_bulk, pack_logs, pack_log_dicts  # noqa: E402
+from App.schemas import DailyLog  # noqa: E402
+from App.main import app  # noqa: E402
+
+HEADERS = {"x-api-secret": os.environ["API_SECRET"]}
+
+
+def rate(n_users, seconds):
+    return f"{n_users / seconds:>10,.0f} users/s ({seconds * 1000:,.0f}ms)"
+
+
+def main():
+    n_users = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = random.Random(0)
+    users = [random_daily_logs(rng.randint(10, 365), rng) for _ in range(n_users)]
+    print(f"{n_users} users, {sum(map(len, users)):,} days of logs")
+
+    start = time.perf_counter()
+    single = [generate_insights(logs, time_series=False) for logs in users]
+    print(f"{'per user':>22} {rate(n_users, time.perf_counter() - start)}")
+
+    workers = insight_engine.INSIGHTS_WORKERS
+    for label, pooled in (("bulk", False), (f"bulk, {workers} procs", True)):
+        if pooled:
+            insight_engine.start_pool()
+        start = time.perf_counter()
+        bulk = generate_insights_bulk([pack_logs(logs)[0] for logs in users])
+        print(f"{label:>22} {rate(n_users, time.perf_counter() - start)}")
+        assert bulk == single, "bulk results differ from generate_insights"
+
+        histories = [pack_logs(logs)[0] for logs in users]
+        start = time.perf_counter()
+        generate_insights_bulk(histories)
+        print(f"{label + ', prepacked':>22} {rate(n_users, time.perf_counter() - start)}")
+    insight_engine.shutdown_pool()
+
+    dates = [[log.date for log in logs] for logs in users]
+    start = time.perf_counter()
+    single = [generate_insights(logs) for logs in users]
+    print(f"{'per user, time series':>22} {rate(n_users, time.perf_counter() - start)}")
+    for label, pooled in (("bulk, time series", False), (f"{workers} procs, time series", True)):
+        if pooled:
+            insight_engine.start_pool()
+        start = time.perf_counter()
+        bulk = generate_insights_bulk([pack_logs(logs)[0] for logs in users], dates)
+        print(f"{label:>22} {rate(n_users, time.perf_counter() - start)}")
+        assert bulk == single, "bulk results with time series differ from generate_insights"
+    insight_engine.shutdown_pool()
+
+    # Over HTTP: JSON parsing and pydantic validation are part of the cost
+    n_http = min(n_users, 1000)
+    bodies = [random_logged_days(rng.randint(14, 365), rng) for _ in range(n_http)]
+    for logs in bodies[:50]:
+        X = pack_log_dicts(logs)[0]
+        Y = pack_logs([DailyLog(**log) for log in logs])[0]
+        assert ((X == Y) | (np.isnan(X) & np.isnan(Y))).all(), "pack_log_dicts differs from pack_logs"
+    with TestClient(app) as client:
+        start = time.perf_counter()
+        for logs in bodies:
+            client.post("/v1/insights_weekly", json={"logs": logs}, headers=HEADERS).raise_for_status()
+        print(f"{'HTTP per user':>22} {rate(n_http, time.perf_counter() - start)}")
+
+        payload = {"users": [{"user_id": str(u), "logs": logs} for u, logs in enumerate(bodies)]}
+        start = time.perf_counter()
+        response = client.post("/v1/insights_weekly/bulk", json=payload, headers=HEADERS)
+        response.raise_for_status()
+        print(f"{'HTTP bulk':>22} {rate(n_http, time.perf_counter() - start)}")
+        assert all(r["error"] is None for r in response.json()["results"])
+        assert response.json()["analyzed"] == n_http
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Weekly insights from the full history vs an incremental state plus the new week.
+
+Replays two years of weekly check-ins per user, dated with days skipped.
+Each week the full recompute (generate_insights on every day so far, with
+next-day and recent patterns) is compared with LogStats rebuilt from last
+week's state blob plus the 7 new days: same insights and the same r to
+within 1e-9, every week. With a half-life,
+the weekly updates are checked against one pass over the whole history
+and against an independent weighted Pearson (np.cov with aweights).
+Then times one week's work and the request size both ways.
+Run:  python -m Benchmarks.bench_insights_incremental
+"""
+import json
+import os
+import random
+import numpy as np
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_daily_log, random_logged_days, timed
+
+from fastapi.testclient import TestClient  # noqa: E402
+from App.insight_engine import (  # noqa: E402
+    COL, LogStats, correlation_matrix, decay_for_half_life, generate_insights, pack_logs
+)
+from App.schemas import DailyLog  # noqa: E402
+from App.main import app  # noqa: E402
+
+HEADERS = {"x-api-secret": os.environ["API_SECRET"]}
+USERS = 20
+WEEKS = 104
+HALF_LIFE = 60
+
+
+def weekly_update(state, week, decay=1.0):
+    stats = LogStats.from_state(state) if state else LogStats(decay)
+    stats.add(*pack_logs(week), [log.date for log in week])
+    return stats
+
+
+def check_parity(rng: random.Random):
+    for _ in range(USERS):
+        logs = [DailyLog(**log) for log in random_logged_days(9 * WEEKS, rng)][:7 * WEEKS]
+        state = None
+        for w in range(1, WEEKS + 1):
+            stats = weekly_update(state, logs[7 * (w - 1):7 * w])
+            state = stats.to_state()
+            history = logs[:7 * w]
+            assert stats.insights() == generate_insights(history), f"week {w} insights differ"
+            expected = correlation_matrix(*pack_logs(history))
+            assert np.allclose(stats.correlations(), expected, atol=1e-9, equal_nan=True), f"week {w} r differs"
+    print(f"parity ok: {USERS} users x {WEEKS} weekly updates match the full recompute")
+
+
+def check_decay(rng: random.Random):
+    decay = decay_for_half_life(HALF_LIFE)
+    columns = [COL[c] for c in ("journaled", "tasks_done", "mood", "focus_mins")]
+    for _ in range(USERS):
+        logs = [DailyLog(**random_daily_log(rng)) for _ in range(7 * WEEKS)]
+        state = None
+        for w in range(1, WEEKS + 1):
+            stats = weekly_update(state, logs[7 * (w - 1):7 * w], decay)
+            state = stats.to_state()
+
+        once = LogStats(decay)
+        once.add(*pack_logs(logs))
+        assert np.allclose(stats.correlations(), once.correlations(), atol=1e-9, equal_nan=True)
+
+        X = pack_logs(logs)[0]
+        weights = decay ** np.arange(len(X) - 1, -1, -1)
+        r = stats.correlations()
+        for i, a in enumerate(columns):
+            for b in columns[i + 1:]:
+                cov = np.cov(X[:, a], X[:, b], aweights=weights)
+                expected = cov[0, 1] / np.sqrt(cov[0, 0] * cov[1, 1])
+                assert abs(r[a, b] - expected) < 1e-9, "decayed r differs from weighted Pearson"
+    print(f"decay ok: half-life {HALF_LIFE} days matches one pass and np.cov(aweights)")
+
+
+def main():
+    rng = random.Random(0)
+    check_parity(rng)
+    check_decay(rng)
+
+    raw = random_logged_days(9 * WEEKS, rng)[:7 * WEEKS]
+    logs = [DailyLog(**log) for log in raw]
+    state = weekly_update(None, logs[:-7]).to_state()
+    full = timed(generate_insights, logs, repeat=20)
+    incremental = timed(lambda: weekly_update(state, logs[-7:]).to_state(), repeat=20)
+    print(f"week {WEEKS}: full recompute {full * 1000:.2f}ms, incremental {incremental * 1000:.2f}ms "
+          f"({full / incremental:.1f}x)")
+
+    full_body = {"logs": raw}
+    incremental_body = {"logs": raw[-7:], "state": state}
+    print(f"request body: full {len(json.dumps(full_body)):,} bytes, "
+          f"incremental {len(json.dumps(incremental_body)):,} bytes (state {len(state)} chars)")
+
+    with TestClient(app) as client:
+        expected = generate_insights(logs)
+        response = client.post("/v1/insights_weekly/incremental", json=incremental_body, headers=HEADERS)
+        response.raise_for_status()
+        got = response.json()
+        assert {k: got[k] for k in expected} == expected, "HTTP incremental differs from the full recompute"
+        print("HTTP ok: /v1/insights_weekly/incremental answers like the full recompute")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Peak memory and time of weekly insights: one JSON body vs NDJSON streaming.
+
+The JSON route parses the whole body into a list of DailyLog models
+before computing anything. The NDJSON route folds one block of lines at a
+time into LogStats, so its peak should stay flat as histories grow.
+Checks first that all four insight routes agree with next-day and recent
+patterns on: generate_insights, NDJSON into LogStats, weekly incremental
+updates through the state blob, and generate_insights_bulk with dates,
+in-process and over HTTP. Histories are dated with gaps, undated, out of
+order or with repeated dates, with no sentiment and with constant columns.
+Run:  python -m Benchmarks.bench_insights_stream
+"""
+import asyncio
+import json
+import os
+import random
+import tracemalloc
+import numpy as np
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_daily_log, random_logged_days, timed
+
+from fastapi.testclient import TestClient  # noqa: E402
+from App.insight_engine import (  # noqa: E402
+    LogStats, accumulate_ndjson, correlation_matrix, generate_insights, generate_insights_bulk, pack_logs
+)
+from App.schemas import DailyLog, WeeklyInsightRequest  # noqa: E402
+from App.main import app  # noqa: E402
+
+HEADERS = {"x-api-secret": os.environ["API_SECRET"]}
+DAYS = (1_000, 10_000, 100_000)
+CHUNK_BYTES = 64 * 1024
+
+
+def ndjson(logs) -> bytes:
+    return b"".join(json.dumps(log).encode() + b"\n" for log in logs)
+
+
+async def chunked(body: bytes):
+    for i in range(0, len(body), CHUNK_BYTES):
+        yield body[i:i + CHUNK_BYTES]
+
+
+def streamed(body: bytes) -> LogStats:
+    return asyncio.run(accumulate_ndjson(chunked(body)))
+
+
+def weekly(logs: list) -> LogStats:
+    # The incremental route: a week at a time, through the state blob in between
+    state = None
+    for w in range(0, len(logs), 7):
+        stats = LogStats.from_state(state) if state else LogStats()
+        week = logs[w:w + 7]
+        stats.add(*pack_logs(week), [log.date for log in week])
+        state = stats.to_state()
+    return stats
+
+
+def parity_cases(rng: random.Random) -> list:
+    cases = [random_logged_days(rng.randint(1, 400), rng) for _ in range(60)]
+    cases += [[random_daily_log(rng) for _ in range(rng.randint(1, 2000))] for _ in range(20)]
+    for _ in range(10):
+        logs = random_logged_days(rng.randint(30, 200), rng)
+        rng.shuffle(logs)
+        cases.append(logs)
+    for _ in range(5):
+        logs = random_logged_days(rng.randint(30, 200), rng)
+        logs[len(logs) // 2]["date"] = logs[len(logs) // 2 - 1]["date"]
+        cases.append(logs)
+    cases.append([{**log, "date": "not a date"} if i == 40 else log for i, log in enumerate(random_logged_days(90, rng))])
+    cases.append([{**log, "sentiment": None} for log in random_logged_days(40, rng)])
+    cases.append([{**log, "mood": 5} for log in random_logged_days(40, rng)])
+    return [logs for logs in cases if logs]
+
+
+def check_parity(rng: random.Random):
+    cases = parity_cases(rng)
+    expected, recent = [], 0
+    for logs in cases:
+        models = [DailyLog(**log) for log in logs]
+        want = generate_insights(models)
+        expected.append(want)
+        recent += want != generate_insights(models, time_series=False)
+        stats = streamed(ndjson(logs))
+        assert stats.insights() == want, "stream insights differ"
+        expected_r = correlation_matrix(*pack_logs(models))
+        assert np.allclose(stats.correlations(), expected_r, atol=1e-9, equal_nan=True), "r differs"
+        assert weekly(models).insights() == want, "incremental insights differ"
+    histories = [[DailyLog(**log) for log in logs] for logs in cases]
+    bulk = generate_insights_bulk(
+        [pack_logs(logs)[0] for logs in histories], [[log.date for log in logs] for logs in histories]
+    )
+    assert bulk == expected, "bulk insights differ"
+
+    with TestClient(app) as client:
+        def post(path, headers=HEADERS, **kwargs):
+            return client.post(path, headers=headers, **kwargs).raise_for_status().json()
+
+        for logs, want in list(zip(cases, expected))[::5]:
+            assert post("/v1/insights_weekly", json={"logs": logs})["insights"] == want["insights"]
+            got = post("/v1/insights_weekly/stream", content=ndjson(logs),
+                       headers={**HEADERS, "content-type": "application/x-ndjson"})
+            assert got["insights"] == want["insights"], "HTTP stream differs"
+            state = None
+            for w in range(0, len(logs), 7):
+                got = post("/v1/insights_weekly/incremental", json={"logs": logs[w:w + 7], "state": state})
+                state = got["state"]
+            assert got["insights"] == want["insights"], "HTTP incremental differs"
+        users = [{"user_id": str(u), "logs": logs} for u, logs in enumerate(cases)]
+        got = post("/v1/insights_weekly/bulk", json={"users": users})["results"]
+        assert [r["result"]["insights"] for r in got] == [w["insights"] for w in expected], "HTTP bulk differs"
+    print(f"parity ok on {len(cases)} histories (1-2000 days, {recent} with time-series insights): "
+          f"json, stream, incremental and bulk, in-process and over HTTP")
+
+
+def peak_mb(fn, *args):
+    # Timed separately: tracing every allocation slows the run down several times
+    tracemalloc.start()
+    fn(*args)
+    peak_bytes = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak_bytes / 2**20
+
+
+def json_route(body: bytes):
+    generate_insights(WeeklyInsightRequest.model_validate_json(body).logs)
+
+
+def main():
+    rng = random.Random(0)
+    check_parity(rng)
+
+    print(f"{'days':>8} {'body MB':>8} {'json MB':>8} {'json ms':>8} {'ndjson MB':>10} {'ndjson ms':>10}")
+    for days in DAYS:
+        logs = [random_daily_log(rng) for _ in range(days)]
+        body_json, body_nd = json.dumps({"logs": logs}).encode(), ndjson(logs)
+        json_mb, nd_mb = peak_mb(json_route, body_json), peak_mb(streamed, body_nd)
+        json_ms, nd_ms = timed(json_route, body_json, repeat=3) * 1000, timed(streamed, body_nd, repeat=3) * 1000
+        print(f"{days:>8,} {len(body_nd) / 2**20:>8.1f} {json_mb:>8.1f} {json_ms:>8.0f} {nd_mb:>10.2f} {nd_ms:>10.0f}")
+
+    with TestClient(app) as client:
+        response = client.post(
+            "/v1/insights_weekly/stream", content=body_nd,
+            headers={**HEADERS, "content-type": "application/x-ndjson"},
+        )
+        response.raise_for_status()
+        print(f"HTTP stream of {days:,} days: {response.json()['insights'][:1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Rolling-window and next-day insight correlations vs per-window scipy calls.
+
+Checks rolling_correlations against scipy.stats.pearsonr run on every
+window (14, 30 and 90 days), next-day r against pearsonr on shifted
+columns, that dated logs with gaps only pair days that are really
+consecutive, and that logs out of date order fall back to list order. Then plants a next-day effect and a recent change in
+otherwise unrelated logs and checks the matching sentences come out,
+and times generate_insights with and without the time-series part.
+Run:  python -m Benchmarks.bench_insights_timeseries
+"""
+import random
+import warnings
+from datetime import date, timedelta
+import numpy as np
+from scipy import stats
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_daily_logs, timed
+from App.config import RECENT_WINDOWS
+from App.insight_engine import (
+    COL, LAG_PAIRS, PAIRS, TAIL_DAYS, TimeSeriesStats, generate_insights, pack_logs, rolling_correlations
+)
+from App.schemas import DailyLog
+
+DAYS = (14, 90, 365)
+SAME_DAY = PAIRS[:6]     # the pairs present every day; sentiment pairs skip days
+
+
+def pearson(x, y):
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        return stats.pearsonr(x, y)[0]
+
+
+def naive_rolling(X, window):
+    return np.array([
+        [pearson(X[t:t + window, COL[a]], X[t:t + window, COL[b]]) for a, b in SAME_DAY]
+        for t in range(len(X) - window + 1)
+    ])
+
+
+def unrelated_logs(n_days, rng, start=date(2024, 1, 1)):
+    return [
+        {
+            "date": (start + timedelta(days=d)).isoformat(),
+            "journaled": int(rng.random() < 0.5),
+            "tasks_done": rng.randint(0, 10),
+            "mood": rng.randint(1, 10),
+            "focus_mins": rng.randint(0, 180),
+        }
+        for d in range(n_days)
+    ]
+
+
+def check_rolling(rng):
+    X = pack_logs(random_daily_logs(365, rng))[0]
+    for window in RECENT_WINDOWS:
+        fast = rolling_correlations(X, window)[:, [COL[a] for a, _ in SAME_DAY], [COL[b] for _, b in SAME_DAY]]
+        slow = naive_rolling(X, window)
+        assert np.allclose(fast, slow, atol=1e-9, equal_nan=True), f"window {window} differs"
+        old, new = timed(naive_rolling, X, window, repeat=1), timed(rolling_correlations, X, window, repeat=5)
+        print(f"rolling {window:>2}-day r over 365 days: scipy {old * 1000:>7.1f}ms, "
+              f"strided {new * 1000:>5.2f}ms ({old / new:.0f}x)")
+
+    r = next_day_r(X)[1]
+    for a, b in LAG_PAIRS:
+        expected = pearson(X[:-1, COL[a]], X[1:, COL[b]])
+        assert abs(r[(a, f"next_day_{b}")] - expected) < 1e-9, f"next-day {a} -> {b} differs"
+    print("parity ok: rolling windows and next-day r match scipy")
+
+
+def next_day_r(X, dates=None, blocks=1):
+    series = TimeSeriesStats()
+    for rows in np.array_split(np.arange(len(X)), blocks):
+        series.add(X[rows], None, None if dates is None else [dates[i] for i in rows])
+    return series, dict(((a, b), value) for a, b, value in series.lagged_pairs())
+
+
+def check_gaps(rng):
+    logs = [log for i, log in enumerate(unrelated_logs(201, rng)) if i % 5 != 4]
+    X = pack_logs([DailyLog(**log) for log in logs])[0]
+    dates = [log["date"] for log in logs]
+    days = [date.fromisoformat(d).toordinal() for d in dates]
+    pairs = [i for i in range(len(days) - 1) if days[i + 1] == days[i] + 1]
+    today, tomorrow = np.array(pairs), np.array(pairs) + 1
+
+    expected = pearson(X[today, COL["mood"]], X[tomorrow, COL["tasks_done"]])
+    for blocks in (1, 7):
+        series, r = next_day_r(X, dates, blocks)
+        assert abs(r[("mood", "next_day_tasks_done")] - expected) < 1e-9
+        grid, span = series.recent_days()
+        assert span == 201 and len(grid) == TAIL_DAYS
+        missing = [i for i in range(TAIL_DAYS) if (201 - TAIL_DAYS + i) % 5 == 4]
+        assert np.isnan(grid[missing]).all() and np.isnan(grid[:, COL["mood"]]).sum() == len(missing)
+
+    order = list(range(len(logs)))
+    rng.shuffle(order)
+    series, r = next_day_r(X[order], [dates[i] for i in order])
+    expected = pearson(X[order][:-1, COL["mood"]], X[order][1:, COL["tasks_done"]])
+    assert not series.calendar and abs(r[("mood", "next_day_tasks_done")] - expected) < 1e-9
+    print(f"gaps ok: with every 5th day missing only the {len(pairs)} consecutive days pair up; "
+          f"shuffled logs fall back to list order")
+
+
+def check_planted(rng):
+    logs = unrelated_logs(120, rng)
+    for today, tomorrow in zip(logs, logs[1:]):
+        tomorrow["focus_mins"] = 40 + 80 * today["journaled"] + rng.randint(0, 30)
+    found = generate_insights([DailyLog(**log) for log in logs])["insights"]
+    assert "Journaling today tends to mean more focus tomorrow." in found, found
+    assert not any(s.startswith("Lately") for s in found), found
+
+    logs = unrelated_logs(300, rng)
+    for log in logs[-40:]:
+        log["tasks_done"] = log["mood"] + rng.randint(0, 2)
+    found = generate_insights([DailyLog(**log) for log in logs])["insights"]
+    assert "Lately, you get more done on days your mood is high." in found, found
+    print("planted patterns found: next-day focus, and a change in the last 40 days")
+
+
+def main():
+    rng = random.Random(0)
+    check_rolling(rng)
+    check_gaps(rng)
+    check_planted(rng)
+
+    print(f"{'days':>5} {'same-day ms':>12} {'+time series ms':>16}")
+    for n_days in DAYS:
+        logs = random_daily_logs(n_days, rng)
+        same_day = timed(generate_insights, logs, False, repeat=20)
+        full = timed(generate_insights, logs, True, repeat=20)
+        print(f"{n_days:>5} {same_day * 1000:>12.3f} {full * 1000:>16.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+"""Cost of the metrics and logging on the request path, and the /metrics output.
+
+  record   one Histogram.observe, one stage() block and one Counter.inc, per call
+  logging  a print to stdout (the old hot-path output) vs logger.debug with
+           the level at INFO (skipped) and logger.info (formatted and written)
+  render   /metrics with every route, status and stage filled in
+Then checks the text format: every sample line parses, buckets are
+cumulative, and _count equals the +Inf bucket, and that the micro-batcher's
+metrics agree with its /v1/stats numbers. With the CPU pool on (a second
+interpreter with CPU_POOL_WORKERS=1), predictions and insights computed in
+the pool still show up in the worker's /metrics stages and its /v1/stats
+prediction cache, and bulk insights share that one pool instead of
+forking their own. Compares the recording cost with a confident VADER
+answer, the cheapest request there is.
+Run:  python -m Benchmarks.bench_metrics
+"""
+import asyncio
+import contextlib
+import io
+import logging
+import os
+import re
+import subprocess
+import sys
+import time
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_habit_row, random_history
+
+from fastapi.testclient import TestClient  # noqa: E402
+from App import sentiment  # noqa: E402
+from App.log import TextFormatter, get_logger  # noqa: E402
+from App.metrics import (  # noqa: E402
+    Counter, Histogram, Registry, stage, registry, ROBERTA_BATCH_SIZE, ROBERTA_BATCHED_TEXTS, ROBERTA_BATCH_WAIT,
+    ROBERTA_BATCHES_IN_FLIGHT, ROBERTA_QUEUE_DEPTH,
+)
+from App.main import app  # noqa: E402
+
+HEADERS = {"x-api-secret": os.environ["API_SECRET"]}
+CALLS = 100_000
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_]+="([^"\\]|\\.)*",?)*\})? -?([0-9.e+-]+|\+Inf|NaN)$')
+
+
+def per_call_ns(fn, calls: int = CALLS) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def record_costs():
+    histogram = Histogram("bench_seconds", "Bench.", ("stage",))
+    counter = Counter("bench_total", "Bench.", ("outcome",))
+
+    def staged():
+        with stage("bench"):
+            pass
+
+    return {
+        "observe": per_call_ns(lambda: histogram.observe(0.003, "vader")),
+        "stage()": per_call_ns(staged),
+        "inc": per_call_ns(lambda: counter.inc("ok")),
+    }
+
+
+def logging_costs():
+    logger = get_logger("App.bench")
+    out = io.StringIO()
+    handler = logging.StreamHandler(out)
+    handler.setFormatter(TextFormatter())
+    handlers, logger.parent.handlers = logger.parent.handlers, [handler]
+    level = logger.parent.level
+    try:
+        logger.parent.setLevel(logging.INFO)
+        with contextlib.redirect_stdout(io.StringIO()):
+            old = per_call_ns(lambda: print(f"Vader -> {'positive'},{0.77:.2f}"), 20_000)
+        skipped = per_call_ns(lambda: logger.debug("VADER -> %s (%.2f)", "positive", 0.77))
+        written = per_call_ns(lambda: logger.info("VADER -> %s (%.2f)", "positive", 0.77), 20_000)
+    finally:
+        logger.parent.handlers = handlers
+        logger.parent.setLevel(level)
+    return {"print (before)": old, "debug at INFO": skipped, "info, written": written}
+
+
+def check_format(text: str):
+    lines = [line for line in text.splitlines() if line and not line.startswith("#")]
+    bad = [line for line in lines if not SAMPLE.match(line)]
+    assert not bad, f"unparseable sample lines: {bad[:3]}"
+
+    series = {}
+    for line in lines:
+        if "_bucket{" in line:
+            name, rest = line.split("{", 1)
+            labels = re.sub(r',?le="[^"]*"', "", rest.rsplit("}", 1)[0])
+            series.setdefault((name, labels), []).append(float(line.rsplit(" ", 1)[1]))
+    for (name, labels), counts in series.items():
+        assert counts == sorted(counts), f"{name}{{{labels}}} buckets are not cumulative"
+        count_line = f"{name[:-len('_bucket')]}_count" + (f"{{{labels}}}" if labels else "")
+        total = next(float(line.rsplit(" ", 1)[1]) for line in lines if line.startswith(count_line + " "))
+        assert total == counts[-1], f"{count_line} differs from its +Inf bucket"
+    return len(lines), len(series)
+
+
+class InstantBackend:
+    delay = 0.0
+
+    async def classify_batch_async(self, texts: list) -> list:
+        await asyncio.sleep(self.delay)
+        return [[{"label": "positive", "score": 1.0}]] * len(texts)
+
+
+def check_batcher():
+    batcher = sentiment.RobertaBatcher(InstantBackend(), window_ms=5, max_batch=16)
+    before = ROBERTA_BATCH_SIZE.count(), ROBERTA_BATCHED_TEXTS.value(), ROBERTA_BATCH_WAIT.value()
+
+    async def burst():
+        await asyncio.gather(*(batcher.classify(f"text {i}") for i in range(40)))
+
+    asyncio.run(burst())
+    stats = batcher.stats()
+    assert ROBERTA_QUEUE_DEPTH.value() == ROBERTA_BATCHES_IN_FLIGHT.value() == 0 and not batcher._tasks
+    assert ROBERTA_BATCH_SIZE.count() - before[0] == stats["batches"]
+    assert ROBERTA_BATCHED_TEXTS.value() - before[1] == stats["texts"] == 40
+    wait_ms = (ROBERTA_BATCH_WAIT.value() - before[2]) / stats["texts"] * 1000
+    assert abs(wait_ms - stats["avg_added_wait_ms"]) < 0.01
+    print(f"batcher ok: {stats['batches']} batches of {stats['texts']} texts in /metrics as in /v1/stats")
+
+    # While a slow batch is out: its task is held by the batcher and counted in flight, the next texts queue
+    slow = InstantBackend()
+    slow.delay = 0.05
+    batcher = sentiment.RobertaBatcher(slow, window_ms=1, max_batch=16)
+
+    async def in_flight():
+        first = asyncio.gather(*(batcher.classify(f"text {i}") for i in range(16)))
+        await asyncio.sleep(0.01)
+        queued = [asyncio.ensure_future(batcher.classify(f"late {i}")) for i in range(3)]
+        await asyncio.sleep(0)
+        seen = (len(batcher._tasks), ROBERTA_BATCHES_IN_FLIGHT.value(), ROBERTA_QUEUE_DEPTH.value())
+        await asyncio.gather(first, *queued)
+        return seen
+
+    tasks, gauge, depth = asyncio.run(in_flight())
+    assert (tasks, gauge, depth) == (1, 1, 3), (tasks, gauge, depth)
+    assert ROBERTA_QUEUE_DEPTH.value() == ROBERTA_BATCHES_IN_FLIGHT.value() == 0 and not batcher._tasks
+    print("batcher ok: in-flight batches are held until done; queue depth and batches in flight on /metrics")
+
+
+def main():
+    print(f"{'record':>16} {'ns/call':>8}")
+    for name, ns in record_costs().items():
+        print(f"{name:>16} {ns:>8.0f}")
+
+    print(f"{'logging':>16} {'ns/call':>8}")
+    for name, ns in logging_costs().items():
+        print(f"{name:>16} {ns:>8.0f}")
+
+    text = "I am so happy and excited about today, it was wonderful"
+    sentiment.get_vader()
+    vader_ns = per_call_ns(lambda: sentiment._analyze(text), 2_000)
+    # A VADER answer times two stages, counts one result and observes the request latency
+    costs = record_costs()
+    overhead_ns = 2 * costs["stage()"] + costs["inc"] + costs["observe"]
+    print(f"confident VADER request {vader_ns / 1000:.0f}us, metrics on it "
+          f"{overhead_ns / 1000:.2f}us ({overhead_ns / vader_ns:.2%})")
+
+    full = Registry()
+    routes = Histogram("bench_request_duration_seconds", "Bench.", ("method", "route", "status"))
+    full.register(routes)
+    for route in ("/v1/predict", "/v1/predict/batch", "/v1/analyze", "/v1/journal", "/v1/insights_weekly",
+                  "/v1/insights_weekly/bulk", "/v1/insights_weekly/stream", "/v1/goals/generate"):
+        for status in ("200", "400", "422", "500"):
+            routes.observe(0.01, "POST", route, status)
+    render_ms = per_call_ns(full.render, 200) / 1e6
+    samples, histograms = check_format(full.render())
+    print(f"render: {samples} samples from {histograms} histograms in {render_ms:.2f}ms, format ok")
+    check_batcher()
+
+    with TestClient(app) as client:
+        client.post("/v1/analyze", params={"data": text}, headers=HEADERS).raise_for_status()
+        client.get("/v1/health").raise_for_status()
+        response = client.get("/metrics")
+        response.raise_for_status()
+        assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+        check_format(response.text)
+        assert 'route="/v1/analyze",status="200"' in response.text
+        assert 'model_used="vader"' in response.text
+        assert 'rhythme_roberta_batch_size_bucket{le="16"}' in response.text
+        assert "# TYPE rhythme_roberta_queue_depth gauge" in response.text
+        print(f"HTTP ok: /metrics serves {len(registry.metrics)} metrics in valid text format")
+
+
+def check_pool():
+    """Run by check_pool_subprocess() in an interpreter started with the CPU pool on."""
+    import random
+    from App import serving, insight_engine
+    rng = random.Random(0)
+    rows = [random_habit_row(rng) for _ in range(3)]
+    with TestClient(app) as client:
+        assert serving._pool is not None, "CPU pool did not start"
+        # One fork per worker: bulk insights get the CPU pool, sized for INSIGHTS_WORKERS
+        assert insight_engine._pool is serving._pool and len(serving._pool._processes) == 2
+        users = [{"user_id": str(u), "logs": random_history(30, rng)} for u in range(4)]
+        bulk = client.post("/v1/insights_weekly/bulk", json={"users": users}, headers=HEADERS).json()
+        assert bulk["analyzed"] == 4 and all(r["error"] is None for r in bulk["results"]), bulk
+        for row in (rows[0], rows[0], rows[0], rows[1], rows[2]):
+            client.post("/v1/predict", json=row, headers=HEADERS).raise_for_status()
+        client.post("/v1/insights_weekly", json={"logs": random_history(30, rng)}, headers=HEADERS).raise_for_status()
+        cache = next(iter(client.get("/v1/stats", headers=HEADERS).json()["models"].values()))["prediction_cache"]
+        text = client.get("/metrics").text
+    counts = dict(re.findall(r'^rhythme_stage_duration_seconds_count\{stage="(\w+)"\} (\d+)$', text, re.M))
+    assert (cache["hits"], cache["misses"]) == (2, 3), cache
+    assert counts.get("predict") == "3", counts
+    assert counts.get("insights_same_day") == "1" and counts.get("insights_next_day") == "1", counts
+    assert insight_engine._pool is None, "shutdown left the bulk pool in use"
+    print("pool ok: one pool for bulk and CPU routes, 2 cache hits answered in the worker, "
+          "3 pool predictions and the pool's insights in /metrics")
+
+
+def check_pool_subprocess():
+    env = {**os.environ, "CPU_POOL_WORKERS": "1", "PREDICTION_CACHE_SIZE": "100",
+           "INSIGHTS_WORKERS": "2", "INSIGHTS_POOL_MIN_USERS": "1", "INSIGHTS_CHUNK_USERS": "2",
+           "MODEL_WATCH_INTERVAL": "0", "LOG_LEVEL": "ERROR"}
+    out = subprocess.run([sys.executable, "-W", "ignore", "-m", "Benchmarks.bench_metrics", "--pool"],
+                         capture_output=True, text=True, env=env)
+    if out.returncode != 0:
+        raise RuntimeError(f"pool check failed:\n{out.stderr[-2000:]}")
+    print(out.stdout.strip())
+
+
+if __name__ == "__main__":
+    if "--pool" in sys.argv[1:]:
+        check_pool()
+    else:
+        main()
+        check_pool_subprocess()
@@ -0,0 +1,37 @@
+"""Cold load time and worker RSS for the pickle vs memory-mapped flat artifact.
+
+Each format is loaded in a fresh interpreter, like a newly forked worker.
+Run:  python -m Benchmarks.bench_model_load
+"""
+import json
+import subprocess
+import sys
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+from Benchmarks import _common
+from App.model import HabitPredictor, resident_memory_mb
+predictor = HabitPredictor(model_format="{fmt}")
+predictor.load_model()
+print(json.dumps({{
+    "load_ms": predictor.load_seconds * 1000,
+    "boot_ms": (time.perf_counter() - start) * 1000,
+    "rss_mb": resident_memory_mb(),
+}}))
+"""
+
+
+def main():
+    print(f"{'format':>8} {'load ms':>9} {'import+load ms':>15} {'rss MB':>8}")
+    for fmt in ("pickle", "flat"):
+        out = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", PROBE.format(fmt=fmt)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{fmt:>8} {r['load_ms']:>9.1f} {r['boot_ms']:>15.1f} {r['rss_mb']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
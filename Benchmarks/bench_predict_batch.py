@@ -0,0 +1,34 @@
+"""Rows/sec of the single-row predict path vs predict_many.
+
+Run from the repo root:  python -m Benchmarks.bench_predict_batch
+"""
+import random
+import warnings
+from Benchmarks._common import random_habit_row, timed
+from App.model import HabitPredictor
+
+warnings.filterwarnings("ignore", category=UserWarning)
+
+BATCH_SIZES = [1, 100, 10_000]
+
+
+def main():
+    predictor = HabitPredictor()
+    predictor.load_model()
+    rng = random.Random(42)
+
+    print(f"{'batch':>8} {'single rows/s':>15} {'batch rows/s':>15} {'speedup':>9}")
+    for size in BATCH_SIZES:
+        rows = [random_habit_row(rng) for _ in range(size)]
+
+        # The single-row path is slow enough that 10k rows is sampled
+        sample = rows[:min(size, 500)]
+        single = timed(lambda: [predictor.predict(r) for r in sample], repeat=3) / len(sample)
+        batch = timed(predictor.predict_many, rows) / size
+
+        assert predictor.predict_many(sample) == [predictor.predict(r) for r in sample]
+        print(f"{size:>8} {1 / single:>15,.0f} {1 / batch:>15,.0f} {single / batch:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
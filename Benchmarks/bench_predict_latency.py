@@ -0,0 +1,57 @@
+"""Per-call latency of HabitPredictor.predict vs the old DataFrame path.
+
+The old path built a one-row DataFrame and ran the forest twice
+(predict + predict_proba). Run:  python -m Benchmarks.bench_predict_latency
+"""
+import pickle
+import random
+import time
+import numpy as np
+import pandas as pd
+from Benchmarks._common import random_habit_row
+from App.config import MODEL_PATH, FEATURE_NAMES
+from App.model import HabitPredictor, _format_result
+from App.schemas import Prediction
+
+CALLS = 2000
+
+
+def legacy_predict(model, input_data: dict, version: str = None) -> Prediction:
+    df = pd.DataFrame([{name: input_data[name] for name in FEATURE_NAMES}], columns=FEATURE_NAMES)
+    prediction = model.predict(df)[0]
+    probability = model.predict_proba(df)[0][1]
+    return _format_result(prediction, probability, version)
+
+
+def latencies(fn, rows) -> np.ndarray:
+    out = np.empty(len(rows))
+    for i, row in enumerate(rows):
+        start = time.perf_counter()
+        fn(row)
+        out[i] = time.perf_counter() - start
+    return out * 1000
+
+
+def main():
+    with open(MODEL_PATH, "rb") as f:
+        legacy_model = pickle.load(f)
+    predictor = HabitPredictor()
+    predictor.load_model()
+
+    rng = random.Random(7)
+    rows = [random_habit_row(rng) for _ in range(CALLS)]
+
+    for row in rows[:200]:
+        assert predictor.predict(row) == legacy_predict(legacy_model, row, predictor.version), row
+
+    old = latencies(lambda r: legacy_predict(legacy_model, r), rows)
+    new = latencies(predictor.predict, rows)
+
+    print(f"{'path':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, lat in (("legacy", old), ("fast", new)):
+        print(f"{name:>10} {np.percentile(lat, 50):>8.3f} {np.percentile(lat, 99):>8.3f}")
+    print(f"p50 gain: {np.percentile(old, 50) / np.percentile(new, 50):.2f}x")
+
+
+if __name__ == "__main__":
+    main()
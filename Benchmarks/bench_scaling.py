@@ -0,0 +1,146 @@
+"""Requests/sec of the CPU-bound routes under gunicorn, from 1 to N workers, and the memory they share.
+
+Starts the production setup (gunicorn.conf.py) on a local port for every
+worker count, each without and with the CPU pool (CPU_POOL_WORKERS=1),
+and drives /v1/predict and /v1/insights_weekly (90 days) over HTTP with
+LOADTEST_CONCURRENCY requests in flight, as in bench_endpoints. Memory is
+the summed PSS of the master, workers and pool processes: pages they
+share count once, split between them. The last run repeats the largest
+setup without the preload, every worker loading the App on its own.
+The load generator runs on the same machine, so it takes a share of the
+cores it measures; N defaults to the CPUs this process may use.
+Run:  python -m Benchmarks.bench_scaling [N]
+"""
+import asyncio
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_habit_row, random_history
+
+import httpx  # noqa: E402
+from App.serving import cpu_count  # noqa: E402
+from Benchmarks.bench_endpoints import drive  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+REQUESTS = int(os.getenv("LOADTEST_REQUESTS", "400"))
+SCENARIOS = {
+    "predict": ("/v1/predict", lambda rng: {"json": random_habit_row(rng)}),
+    "insights_weekly_90d": ("/v1/insights_weekly", lambda rng: {"json": {"logs": random_history(90, rng)}}),
+}
+# Same settings as gunicorn.conf.py, but every worker imports the App and loads the models itself
+NO_PRELOAD_CONF = f"""exec(open({str(ROOT / 'gunicorn.conf.py')!r}).read())
+preload_app = False
+def when_ready(server):
+    pass
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree(pid: int) -> list:
+    children = {}
+    for stat in Path("/proc").glob("[0-9]*/stat"):
+        try:
+            fields = stat.read_text().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        children.setdefault(int(fields[1]), []).append(int(stat.parent.name))
+    tree, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        tree.append(p)
+        todo += children.get(p, [])
+    return tree
+
+
+def memory_mb(pid: int) -> tuple[float, float]:
+    """Summed (PSS, RSS) of a process and its descendants, in MB."""
+    pss = rss = 0
+    for p in process_tree(pid):
+        try:
+            for line in Path(f"/proc/{p}/smaps_rollup").read_text().splitlines():
+                if line.startswith("Pss:"):
+                    pss += int(line.split()[1])
+                elif line.startswith("Rss:"):
+                    rss += int(line.split()[1])
+        except OSError:
+            continue
+    return pss / 1024, rss / 1024
+
+
+async def wait_ready(url: str, server: subprocess.Popen, timeout: float = 120):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {server.returncode}")
+            try:
+                if (await client.get("/v1/health")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+    raise RuntimeError("gunicorn did not come up")
+
+
+async def measure(url: str) -> dict:
+    results = {}
+    headers = {"x-api-secret": os.environ["API_SECRET"]}
+    async with httpx.AsyncClient(base_url=url, headers=headers, timeout=60) as client:
+        for seed, (name, (path, generate)) in enumerate(SCENARIOS.items()):
+            rng = random.Random(seed)
+            requests = [generate(rng) for _ in range(REQUESTS + 50)]
+            await drive(client, path, requests[:50])
+            results[name] = await drive(client, path, requests[50:])
+    return results
+
+
+def run(workers: int, pool: int, preload: bool = True) -> tuple[dict, tuple]:
+    port = free_port()
+    env = {
+        **os.environ, "PORT": str(port), "WEB_CONCURRENCY": str(workers), "CPU_POOL_WORKERS": str(pool),
+        "MODEL_WATCH_INTERVAL": "0", "LOG_LEVEL": "ERROR", "PYTHONWARNINGS": "ignore",
+    }
+    with tempfile.NamedTemporaryFile("w", suffix=".py") as conf:
+        conf.write(NO_PRELOAD_CONF)
+        conf.flush()
+        args = [sys.executable, "-m", "gunicorn", "App.main:app", "--log-level", "warning"]
+        if not preload:
+            args += ["-c", conf.name]
+        server = subprocess.Popen(args, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            asyncio.run(wait_ready(url, server))
+            results = asyncio.run(measure(url))
+            return results, memory_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait(timeout=60)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else cpu_count()
+    print(f"{cpu_count()} usable CPUs, 1-{n} workers, {REQUESTS} requests per endpoint")
+    print(f"{'workers':>7} {'pool':>5} {'preload':>8} {'endpoint':>20} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'PSS MB':>8} {'RSS MB':>8}")
+    setups = [(w, pool, True) for w in range(1, n + 1) for pool in (0, 1)] + [(n, 0, False)]
+    for workers, pool, preload in setups:
+        results, (pss, rss) = run(workers, pool, preload)
+        label = f"{workers:>7} {pool:>5} {'yes' if preload else 'no':>8}"
+        for i, (name, r) in enumerate(results.items()):
+            mem = f"{pss:>8.0f} {rss:>8.0f}" if i == 0 else ""
+            print(f"{label} {name:>20} {r['rps']:>8.1f} {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {mem}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Latency and accuracy of VADER vs the RoBERTa backends on a labelled journal corpus.
+
+The local backend is measured when its model directory and runtime are
+installed (python -m App.sentiment_backends download [export-onnx]); the
+API backend is left out so the benchmark never spends paid calls.
+Run:  python -m Benchmarks.bench_sentiment_backends
+"""
+import json
+import time
+from pathlib import Path
+import numpy as np
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from App import sentiment
+from App.config import CONFIDENCE_THRESHOLS
+from App.sentiment_backends import LocalRobertaBackend
+
+CORPUS = Path(__file__).parent / "fixtures" / "journal_corpus.jsonl"
+
+
+def load_corpus():
+    with open(CORPUS) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run(name, classify, corpus):
+    lat, correct = [], 0
+    for item in corpus:
+        start = time.perf_counter()
+        label = classify(item["text"])
+        lat.append((time.perf_counter() - start) * 1000)
+        correct += label == item["label"]
+    lat = np.array(lat)
+    print(f"{name:>16} {correct / len(corpus):>9.1%} {np.percentile(lat, 50):>8.2f} {np.percentile(lat, 99):>8.2f}")
+
+
+def main():
+    corpus = load_corpus()
+    print(f"{len(corpus)} texts, VADER confident on "
+          f"{sum(sentiment.vader_sentiment(c['text'])[1] >= CONFIDENCE_THRESHOLS for c in corpus)}")
+    print(f"{'backend':>16} {'accuracy':>9} {'p50 ms':>8} {'p99 ms':>8}")
+
+    run("vader", lambda t: sentiment.vader_sentiment(t)[0], corpus)
+
+    local = LocalRobertaBackend()
+    try:
+        local.load()
+    except (FileNotFoundError, ImportError) as e:
+        print(f"{'local':>16} skipped: {e}")
+        return
+
+    def local_label(text):
+        return sentiment.parse_roberta(local.classify(text))[0]
+
+    def hybrid_label(text):
+        label, conf = sentiment.vader_sentiment(text)
+        return label if conf >= CONFIDENCE_THRESHOLS else local_label(text)
+
+    local_label(corpus[0]["text"])  # warm up
+    run(f"local ({local.runtime})", local_label, corpus)
+    run("vader+local", hybrid_label, corpus)
+
+
+if __name__ == "__main__":
+    main()
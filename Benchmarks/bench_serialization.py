@@ -0,0 +1,162 @@
+"""Cost of turning a route's result into response bytes, by response size.
+
+  before  what FastAPI did with a plain return: validate the content against
+          the response_model, dump it to JSON-able data, json.dumps it
+          (fastapi.routing.serialize_response + JSONResponse)
+  after   batch and bulk results built from trusted parts go straight to
+          ORJSONResponse; single results are model_construct'ed, which
+          FastAPI's validation passes as is, and rendered by orjson
+Checks first that both give the same JSON for every size. Then compares
+the memory of PREDICTION_CACHE_SIZE cached predictions and
+SENTIMENT_CACHE_SIZE cached sentiment results as dicts and as slotted
+Prediction and Sentiment objects, and times /v1/predict/batch over HTTP.
+Batch and bulk items stay dicts: they live for one response, and orjson
+writes a dict faster than a dataclass.
+Run:  python -m Benchmarks.bench_serialization
+"""
+import asyncio
+import dataclasses
+import json
+import os
+import random
+import tracemalloc
+import orjson
+from Benchmarks import _common  # noqa: F401  (sets benchmark env)
+from Benchmarks._common import random_daily_log, random_habit_row, timed
+
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+from fastapi.routing import serialize_response  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from fastapi.utils import create_model_field  # noqa: E402
+from App.config import PREDICTION_CACHE_SIZE, SENTIMENT_CACHE_SIZE  # noqa: E402
+from App.insight_engine import generate_insights_bulk, pack_log_dicts  # noqa: E402
+from App.model import HabitPredictor  # noqa: E402
+from App.sentiment import build_result  # noqa: E402
+from App.schemas import BatchPredictionResponse, BulkInsightResponse, SentimentResult  # noqa: E402
+from App.main import app  # noqa: E402
+
+HEADERS = {"x-api-secret": os.environ["API_SECRET"]}
+BATCH_ROWS = (1, 100, 1_000, 10_000)
+BULK_USERS = (10, 100, 1_000)
+
+
+def before(model, content) -> bytes:
+    field = create_model_field(name="Response", type_=model, mode="serialization")
+    data = asyncio.run(serialize_response(field=field, response_content=content))
+    return JSONResponse(data).body
+
+
+def before_body(model, content) -> bytes:
+    # Same as before(), minus asyncio.run, for timing
+    field = create_model_field(name="Response", type_=model, mode="serialization")
+    coro = serialize_response(field=field, response_content=content)
+    try:
+        coro.send(None)
+    except StopIteration as done:
+        return JSONResponse(done.value).body
+
+
+def after(content) -> bytes:
+    return ORJSONResponse(content).body
+
+
+def as_dicts(content):
+    # The old routes held predictions as dicts
+    return json.loads(orjson.dumps(content))
+
+
+def batch_content(predictor, rows):
+    predictions = predictor.predict_many(rows)
+    return {
+        "results": [{"index": i, "result": p, "error": None} for i, p in enumerate(predictions)],
+        "predicted": len(rows),
+        "failed": 0,
+    }
+
+
+def bulk_content(users):
+    results = generate_insights_bulk([pack_log_dicts(logs)[0] for logs in users])
+    return {
+        "results": [{"index": i, "user_id": str(i), "result": r, "error": None} for i, r in enumerate(results)],
+        "analyzed": len(users),
+        "failed": 0,
+    }
+
+
+def report(label, model, content, legacy):
+    old_bytes, new_bytes = before(model, legacy), after(content)
+    assert json.loads(old_bytes) == orjson.loads(new_bytes), f"{label}: responses differ"
+    old = timed(before_body, model, legacy, repeat=5)
+    new = timed(after, content, repeat=5)
+    print(f"{label:>22} {len(new_bytes) / 1024:>9.1f} {old * 1000:>10.3f} {new * 1000:>10.3f} {old / new:>8.1f}x")
+
+
+def single_result():
+    result = {"sentiment": "positive", "confidence": 0.77, "model_used": "vader", "emotions": ["happy", "excited"]}
+    validated = lambda: before_body(SentimentResult, SentimentResult(**result))  # noqa: E731
+    field = create_model_field(name="Response", type_=SentimentResult, mode="serialization")
+
+    def constructed():
+        coro = serialize_response(field=field, response_content=SentimentResult.model_construct(**result))
+        try:
+            coro.send(None)
+        except StopIteration as done:
+            return ORJSONResponse(done.value).body
+
+    assert json.loads(validated()) == orjson.loads(constructed())
+    old, new = timed(validated, repeat=2000), timed(constructed, repeat=2000)
+    print(f"{'sentiment result':>22} {len(constructed()) / 1024:>9.1f} {old * 1000:>10.3f} {new * 1000:>10.3f} "
+          f"{old / new:>8.1f}x")
+
+
+def kept_mb(build, items) -> float:
+    tracemalloc.start()
+    kept = [build(item) for item in items]  # noqa: F841
+    size = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    return size
+
+
+def as_dict(item) -> dict:
+    # What the caches held before: a dict per entry, its list fields as lists
+    return {k: list(v) if isinstance(v, tuple) else v for k, v in dataclasses.asdict(item).items()}
+
+
+def cache_memory(predictor, rng):
+    n = PREDICTION_CACHE_SIZE or 10_000
+    predictions = predictor.predict_many([random_habit_row(rng) for _ in range(n)])
+    old, new = kept_mb(as_dict, predictions), kept_mb(dataclasses.replace, predictions)
+    print(f"{n:,} cached predictions: dicts {old:.2f}MB, slotted Prediction {new:.2f}MB")
+
+    n = SENTIMENT_CACHE_SIZE or 10_000
+    results = [build_result(text, "positive", rng.random(), "vader") for text in ("Had a great day",) * n]
+    old, new = kept_mb(as_dict, results), kept_mb(dataclasses.replace, results)
+    print(f"{n:,} cached sentiment results: dicts {old:.2f}MB, slotted Sentiment {new:.2f}MB")
+
+
+def main():
+    rng = random.Random(0)
+    predictor = HabitPredictor()
+    predictor.load_model()
+
+    print(f"{'response':>22} {'KB':>9} {'before ms':>10} {'after ms':>10} {'speedup':>9}")
+    single_result()
+    for n in BATCH_ROWS:
+        content = batch_content(predictor, [random_habit_row(rng) for _ in range(n)])
+        report(f"batch {n:,} rows", BatchPredictionResponse, content, as_dicts(content))
+    for n in BULK_USERS:
+        users = [[random_daily_log(rng) for _ in range(rng.randint(14, 90))] for _ in range(n)]
+        content = bulk_content(users)
+        report(f"bulk {n:,} users", BulkInsightResponse, content, content)
+
+    cache_memory(predictor, rng)
+
+    body = {"rows": [random_habit_row(rng) for _ in range(BATCH_ROWS[-1])]}
+    with TestClient(app) as client:
+        post = lambda: client.post("/v1/predict/batch", json=body, headers=HEADERS).raise_for_status()  # noqa: E731
+        post()
+        print(f"HTTP /v1/predict/batch, {BATCH_ROWS[-1]:,} rows: {timed(post, repeat=3) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""gunicorn settings for production. Start with:  gunicorn App.main:app
+
+gunicorn reads this file from the working directory. The App is imported
+and its models loaded once in the master, then the workers are forked
+and share those pages. Every setting can be overridden on the command
+line or with GUNICORN_CMD_ARGS.
+"""
+import os
+
+# One pool process per worker for /v1/predict and /v1/insights_weekly. Set before the
+# App's config is first imported, just below
+os.environ.setdefault("CPU_POOL_WORKERS", "1")
+
+from App.serving import cpu_count, preload, web_workers  # noqa: E402
+
+cpus = cpu_count()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = web_workers(cpus)
+preload_app = True
+# A worker whose event loop stops checking in for this long is restarted
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "30"))
+keepalive = 5
+
+
+def when_ready(server):
+    # The App is imported (preload_app) and no worker is forked yet
+    preload()
+    server.log.info("Models preloaded for %d workers on %d CPUs", server.cfg.workers, cpus)